@@ -0,0 +1,136 @@
+"""Benchmark of the recall and the memory of the compressed indexes."""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from cbir.retrieval.factory import IndexConfig
+from cbir.retrieval.indexer import Indexer
+
+CONFIGS: List[Tuple[str, IndexConfig]] = [
+    ("flat", IndexConfig(type="flat")),
+    ("sq8", IndexConfig(type="sq8")),
+    ("fp16", IndexConfig(type="fp16")),
+    ("pq", IndexConfig(type="pq", pq_m=16)),
+    ("pq + refine", IndexConfig(type="pq", pq_m=16, refine=10)),
+    ("sq8 + refine", IndexConfig(type="sq8", refine=4)),
+    ("ivf_pq + refine", IndexConfig(type="ivf_pq", nlist=256, pq_m=16, refine=10)),
+]
+
+
+def recall(reference: List[List[int]], labels: List[List[int]]) -> float:
+    """
+    Measure the fraction of the exact nearest neighbours found by an index.
+
+    Args:
+        reference (List[List[int]]): The exact nearest neighbours of each query.
+        labels (List[List[int]]): The neighbours found by the index.
+
+    Returns:
+        float: The mean fraction of the exact neighbours found.
+    """
+
+    return float(
+        np.mean(
+            [
+                len(set(expected) & set(found)) / len(expected)
+                for expected, found in zip(reference, labels)
+            ]
+        )
+    )
+
+
+def generate(size: int, n_features: int, n_queries: int) -> Tuple[np.ndarray, ...]:
+    """
+    Generate clustered vectors, closer to the features of a model than uniform ones.
+
+    Args:
+        size (int): The number of vectors.
+        n_features (int): Number of features of the vectors.
+        n_queries (int): The number of queries, drawn near the vectors.
+
+    Returns:
+        Tuple[np.ndarray, ...]: The vectors and the queries.
+    """
+
+    rng = np.random.default_rng(0)
+    centers = rng.random((100, n_features), dtype="float32")
+    noise = rng.normal(scale=0.1, size=(size, n_features)).astype("float32")
+    vectors = centers[rng.integers(100, size=size)] + noise
+
+    queries = vectors[rng.choice(size, n_queries, replace=False)]
+    queries += rng.normal(scale=0.05, size=queries.shape).astype("float32")
+
+    return vectors, queries
+
+
+def build(
+    data_path: str,
+    name: str,
+    config: IndexConfig,
+    vectors: np.ndarray,
+) -> Indexer:
+    """
+    Build an index of the given vectors.
+
+    Args:
+        data_path (str): The path to the base storage.
+        name (str): The name of the index.
+        config (IndexConfig): The configuration of the index.
+        vectors (np.ndarray): The vectors to index.
+
+    Returns:
+        Indexer: The indexer of the trained index.
+    """
+
+    config.write(os.path.join(data_path, "storage", f"{name}.json"))
+
+    indexer = Indexer(data_path, "storage", name, vectors.shape[1])
+    indexer.add(0, vectors)
+    if not indexer.trained:
+        indexer.train()
+
+    return indexer
+
+
+def main() -> None:
+    """Compare the recall, the memory and the latency of the compressed indexes."""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=100_000, help="vectors")
+    parser.add_argument("--features", type=int, default=128, help="dimension")
+    parser.add_argument("--queries", type=int, default=1000, help="queries")
+    parser.add_argument("--k", type=int, default=10, help="nearest neighbours")
+    args = parser.parse_args()
+
+    vectors, queries = generate(args.size, args.features, args.queries)
+
+    reference: List[List[int]] = []
+
+    with tempfile.TemporaryDirectory() as data_path:
+        os.makedirs(os.path.join(data_path, "storage"))
+
+        for position, (name, config) in enumerate(CONFIGS):
+            indexer = build(data_path, f"index{position}", config, vectors)
+
+            start = time.perf_counter()
+            results = indexer.search_batch(queries, args.k)
+            elapsed = (time.perf_counter() - start) * 1000 / args.queries
+
+            labels = [result[0] for result in results]
+            if not reference:
+                reference = labels
+
+            print(
+                f"{name:>16}: {indexer.nbytes / 2**20:7.1f} MB in memory, "
+                f"recall@{args.k} {recall(reference, labels):.3f}, "
+                f"{elapsed:.3f} ms per query"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Benchmark of the loading of an index by several search workers."""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict, Tuple
+
+import faiss
+import numpy as np
+
+from cbir.retrieval.factory import IndexConfig, create_index
+from cbir.retrieval.indexer import Indexer, IndexerOptions
+
+
+def memory() -> Dict[str, int]:
+    """
+    Get the memory used by the current process, on Linux.
+
+    Returns:
+        Dict[str, int]: The resident, proportional and private set sizes in
+            kilobytes.
+    """
+
+    sizes: Dict[str, int] = {}
+    with open("/proc/self/smaps_rollup", "r", encoding="utf-8") as file:
+        for line in file:
+            fields = line.split()
+            if fields[0] in ("Rss:", "Pss:", "Private_Clean:", "Private_Dirty:"):
+                sizes[fields[0][:-1]] = int(fields[1])
+
+    return {
+        "rss": sizes["Rss"],
+        "pss": sizes["Pss"],
+        "private": sizes["Private_Clean"] + sizes["Private_Dirty"],
+    }
+
+
+def create(data_path: str, config: IndexConfig, size: int, n_features: int) -> None:
+    """
+    Write an index of random vectors.
+
+    Args:
+        data_path (str): The path to the base storage.
+        config (IndexConfig): The configuration of the index.
+        size (int): The number of vectors.
+        n_features (int): Number of features of the vectors.
+    """
+
+    os.makedirs(os.path.join(data_path, "storage"))
+    index_path = os.path.join(data_path, "storage", "index")
+
+    vectors = np.random.default_rng(0).random((size, n_features), dtype="float32")
+    index = create_index(config, n_features)
+    if config.trainable:
+        index.train(vectors[: config.max_train_size])
+    index.add_with_ids(vectors, np.arange(size))
+
+    config.write(f"{index_path}.json")
+    faiss.write_index(index, index_path)
+
+
+def load(args: Tuple[str, int, bool]) -> Tuple[float, Dict[str, int]]:
+    """
+    Load the index in a fresh worker process and search it once.
+
+    Args:
+        args (Tuple[str, int, bool]): The path to the base storage, the number
+            of features and whether to map the index.
+
+    Returns:
+        Tuple[float, Dict[str, int]]: The loading time in milliseconds and the
+            memory added by the index, in kilobytes.
+    """
+
+    data_path, n_features, mmap = args
+    before = memory()
+
+    start = time.perf_counter()
+    indexer = Indexer(
+        data_path,
+        "storage",
+        "index",
+        n_features,
+        options=IndexerOptions(mmap=mmap),
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+
+    queries = np.random.default_rng().random((16, n_features), dtype="float32")
+    indexer.search_batch(queries, 10)
+
+    after = memory()
+
+    return elapsed, {key: value - before[key] for key, value in after.items()}
+
+
+def main() -> None:
+    """Compare the loading of an index copied into and mapped by the workers."""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--type", default="flat", choices=["flat", "ivf_flat"])
+    parser.add_argument("--size", type=int, default=200_000, help="vectors")
+    parser.add_argument("--features", type=int, default=128, help="dimension")
+    parser.add_argument("--workers", type=int, default=4, help="search workers")
+    args = parser.parse_args()
+
+    config = IndexConfig(type=args.type, nlist=256, nprobe=16)
+
+    with tempfile.TemporaryDirectory() as data_path:
+        create(data_path, config, args.size, args.features)
+        size = os.path.getsize(os.path.join(data_path, "storage", "index"))
+        print(f"{args.type} index of {args.size} vectors: {size / 2**20:.0f} MB")
+
+        context = multiprocessing.get_context("spawn")
+        for mmap in (False, True):
+            # Fresh processes hold the index at the same time, as the workers do
+            with context.Pool(args.workers) as pool:
+                results = pool.map(
+                    load,
+                    [(data_path, args.features, mmap)] * args.workers,
+                )
+
+            elapsed = np.mean([result[0] for result in results])
+            total = {
+                key: sum(result[1][key] for result in results) / 1024
+                for key in ("rss", "pss", "private")
+            }
+
+            print(
+                f"  {'mmap' if mmap else 'copy'}: {elapsed:7.1f} ms to load, "
+                f"{args.workers} workers use {total['rss']:6.0f} MB resident, "
+                f"{total['pss']:6.0f} MB proportional, "
+                f"{total['private']:6.0f} MB private"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark of the preprocessing of an image into the input of a model."""
+
+import argparse
+import timeit
+from io import BytesIO
+from typing import Callable
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from cbir.models.preprocessing import IMAGENET_MEAN, IMAGENET_STD, Preprocessor
+
+
+def create_image(size: int, image_format: str) -> bytes:
+    """
+    Encode a random tile.
+
+    Args:
+        size (int): The width and height of the tile.
+        image_format (str): The format of the encoded tile.
+
+    Returns:
+        bytes: The encoded tile.
+    """
+
+    pixels = np.random.default_rng(0).integers(0, 256, (size, size, 3), "uint8")
+
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format=image_format)
+
+    return buffer.getvalue()
+
+
+def legacy(image: bytes) -> torch.Tensor:
+    """Preprocess an image with the previous per-call transform."""
+
+    features_extraction = transforms.Compose(
+        [
+            transforms.Resize((224, 224)),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
+        ]
+    )
+
+    return features_extraction(Image.open(BytesIO(image)).convert("RGB"))
+
+
+def measure(function: Callable[[], object], number: int) -> float:
+    """
+    Measure the best mean time of a function over several runs.
+
+    Args:
+        function (Callable[[], object]): The function to measure.
+        number (int): The number of calls per run.
+
+    Returns:
+        float: The time per call in milliseconds.
+    """
+
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1000
+
+
+def main() -> None:
+    """Compare the previous and the current preprocessing."""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=2048, help="tile size")
+    parser.add_argument("--format", default="JPEG", help="tile format")
+    parser.add_argument("--number", type=int, default=20, help="calls per run")
+    args = parser.parse_args()
+
+    image = create_image(args.size, args.format)
+    preprocessor = Preprocessor()
+
+    before = measure(lambda: legacy(image), args.number)
+    after = measure(
+        lambda: preprocessor.normalize(preprocessor.decode(image).unsqueeze(0)),
+        args.number,
+    )
+
+    print(f"{args.format} {args.size}x{args.size}")
+    print(f"  before: {before:8.2f} ms/image")
+    print(f"  after:  {after:8.2f} ms/image ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
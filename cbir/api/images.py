@@ -1,6 +1,7 @@
 """Image API"""
 
 from pathlib import Path
+from typing import Dict, List, Optional
 
 from fastapi import (
     APIRouter,
@@ -12,21 +13,33 @@ from fastapi import (
 )
 from fastapi.responses import JSONResponse
 
-from cbir.api.utils.utils import get_retrieval
+from cbir.api.utils.models import Filenames
+from cbir.api.utils.utils import (
+    check_writable,
+    get_async_store,
+    get_batch_metadata,
+    get_metadata,
+    get_retrieval,
+    read_uploads,
+)
 from cbir.config import Settings, get_settings
+from cbir.retrieval.metadata import Metadata
 from cbir.retrieval.retrieval import ImageRetrieval
+from cbir.retrieval.store import AsyncStore
 
 router = APIRouter()
 
 
-@router.post("/images")
-async def index_image(
+@router.post("/images", dependencies=[Depends(check_writable)])
+async def index_image(  # pylint: disable=too-many-arguments
     request: Request,
     image: UploadFile,
     storage_name: str = Query(..., alias="storage"),
     index_name: str = Query(default="index", alias="index"),
     retrieval: ImageRetrieval = Depends(get_retrieval),
+    store: AsyncStore = Depends(get_async_store),
     settings: Settings = Depends(get_settings),
+    metadata: Optional[Metadata] = Depends(get_metadata),
 ) -> JSONResponse:
     """
     Index the given image into the specified storage and index.
@@ -37,7 +50,10 @@ async def index_image(
         storage_name (str): The name of the storage where the index is stored.
         index_name (str): The name of the index where the image features will be added.
         retrieval (ImageRetrieval): The image retrieval object.
+        store (AsyncStore): The asynchronous store of the index.
         settings (DatabaseSetting): The database settings.
+        metadata (Metadata, optional): The attributes of the image, to filter
+            the searches.
 
     Returns:
         JSONResponse: A JSON response containing the ID of the newly indexed image.
@@ -46,7 +62,7 @@ async def index_image(
     if image.filename is None:
         raise HTTPException(status_code=404, detail="Image filename not found!")
 
-    if retrieval.store.contains(image.filename):
+    if await store.contains(image.filename):
         raise HTTPException(status_code=409, detail="Image filename already exist!")
 
     if not storage_name:
@@ -62,9 +78,30 @@ async def index_image(
 
     content = await image.read()
 
-    model = request.app.state.model
+    # Reserve the ID and claim the filename without blocking the event loop,
+    # a concurrent request may have taken the filename since the check above
+    tag = await store.reserve(1)
+    if not (await store.claim([image.filename], [str(tag)]))[0]:
+        raise HTTPException(status_code=409, detail="Image filename already exist!")
 
-    ids = retrieval.index_image(model, content, image.filename)
+    ids: List[int] = []
+    try:
+        ids.append(
+            await request.app.state.executor.run(
+                retrieval.index_claimed,
+                request.app.state.extractor,
+                content,
+                tag,
+                metadata,
+            )
+        )
+    finally:
+        # Map the ID to the filename, or release the filename if not indexed
+        async with store.pipeline() as pipeline:
+            if ids:
+                await pipeline.set(str(tag), image.filename)
+            else:
+                await pipeline.remove(image.filename)
 
     return JSONResponse(
         content={
@@ -75,7 +112,64 @@ async def index_image(
     )
 
 
-@router.delete("/images/{filename}")
+@router.post("/images/batch", dependencies=[Depends(check_writable)])
+async def index_images(  # pylint: disable=too-many-arguments
+    request: Request,
+    images: List[UploadFile],
+    storage_name: str = Query(..., alias="storage"),
+    index_name: str = Query(default="index", alias="index"),
+    retrieval: ImageRetrieval = Depends(get_retrieval),
+    settings: Settings = Depends(get_settings),
+    metadata: Optional[Dict[str, Metadata]] = Depends(get_batch_metadata),
+) -> JSONResponse:
+    """
+    Index several images, or zip and tar archives of images, by batches.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        images (List[UploadFile]): The image or archive files to be indexed.
+        storage_name (str): The name of the storage where the index is stored.
+        index_name (str): The name of the index where the image features will be added.
+        retrieval (ImageRetrieval): The image retrieval object.
+        settings (Settings): The app settings.
+        metadata (Dict[str, Metadata], optional): The attributes of the images
+            by filename, to filter the searches.
+
+    Returns:
+        JSONResponse: A JSON response containing the ID or the error of each image.
+    """
+
+    if not storage_name:
+        raise HTTPException(status_code=404, detail="Storage is required")
+
+    storage_path = Path(settings.data_path) / storage_name
+    if not storage_path.is_dir():
+        raise HTTPException(
+            status_code=404,
+            detail=f"Storage '{storage_name}' not found.",
+        )
+
+    files = await read_uploads(images)
+
+    results = await request.app.state.executor.run(
+        retrieval.index_images,
+        request.app.state.extractor,
+        files,
+        settings.batch_size,
+        settings.decode_workers,
+        metadata,
+    )
+
+    return JSONResponse(
+        content={
+            "images": results,
+            "storage": storage_name,
+            "index": index_name,
+        }
+    )
+
+
+@router.delete("/images/{filename}", dependencies=[Depends(check_writable)])
 def remove_image(
     filename: str,
     storage_name: str = Query(..., alias="storage"),
@@ -107,3 +201,34 @@ def remove_image(
             "index": index_name,
         }
     )
+
+
+@router.delete("/images", dependencies=[Depends(check_writable)])
+def remove_images(
+    body: Filenames,
+    storage_name: str = Query(..., alias="storage"),
+    index_name: str = Query(default="index", alias="index"),
+    retrieval: ImageRetrieval = Depends(get_retrieval),
+) -> JSONResponse:
+    """
+    Remove several indexed images at once.
+
+    Args:
+        body (Filenames): The names of the images to be removed.
+        storage_name (str): The name of the storage where the index is stored.
+        index_name (str): The name of the index where the image features are stored.
+        retrieval (ImageRetrieval): The image retrieval object.
+
+    Returns:
+        JSONResponse: A JSON response containing the ID or the error of each image.
+    """
+
+    results = retrieval.remove_images(body.filenames)
+
+    return JSONResponse(
+        content={
+            "images": results,
+            "storage": storage_name,
+            "index": index_name,
+        }
+    )
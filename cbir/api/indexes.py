@@ -0,0 +1,134 @@
+"""Index API"""
+
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from cbir.api.utils.models import Index
+from cbir.api.utils.utils import check_writable
+from cbir.config import Settings, get_settings
+from cbir.retrieval.factory import IndexConfig, create_index
+
+router = APIRouter()
+
+
+def get_storage_path(name: str, settings: Settings) -> Path:
+    """
+    Get the path of an existing storage.
+
+    Args:
+        name (str): The name of the storage.
+        settings (Settings): The database settings.
+
+    Returns:
+        Path: The path to the storage.
+    """
+
+    storage_path = Path(settings.data_path) / name
+    if not storage_path.is_dir():
+        raise HTTPException(
+            status_code=404,
+            detail=f"Storage with name '{name}' not found.",
+        )
+
+    return storage_path
+
+
+def index_exists(index_path: Path) -> bool:
+    """
+    Check whether an index has been created or already contains images.
+
+    Args:
+        index_path (Path): The path to the index.
+
+    Returns:
+        bool: True if the index, its configuration or its log exists.
+    """
+
+    return any(
+        Path(f"{index_path}{suffix}").is_file() for suffix in ("", ".json", ".log")
+    )
+
+
+@router.post("/storages/{name}/indexes", dependencies=[Depends(check_writable)])
+def create_storage_index(
+    request: Request,
+    name: str,
+    body: Index,
+    settings: Settings = Depends(get_settings),
+) -> JSONResponse:
+    """
+    Create a new index in a storage with the given type and parameters.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        name (str): The name of the storage.
+        body (Index): The body of the request.
+        settings (Settings): The database settings.
+
+    Returns:
+        JSONResponse: A JSON response containing the message of the creation.
+    """
+
+    index_path = get_storage_path(name, settings) / body.name
+    if index_exists(index_path):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Index with name '{body.name}' already exists.",
+        )
+
+    config = IndexConfig(**body.model_dump(exclude={"name"}))
+
+    try:
+        create_index(config, request.app.state.model.n_features)
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid index configuration: {str(e)}",
+        ) from e
+
+    config.write(f"{index_path}.json")
+    request.app.state.indexers.discard(name, body.name)
+
+    return JSONResponse(content={"message": f"Created index with name: {body.name}"})
+
+
+@router.get("/storages/{name}/indexes/{index}")
+def get_storage_index(
+    request: Request,
+    name: str,
+    index: str,
+    settings: Settings = Depends(get_settings),
+) -> JSONResponse:
+    """
+    Get the configuration and the state of an index.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        name (str): The name of the storage.
+        index (str): The name of the index.
+        settings (Settings): The database settings.
+
+    Returns:
+        JSONResponse: A JSON response containing the index configuration, its
+            number of images and whether it is trained.
+    """
+
+    if not index_exists(get_storage_path(name, settings) / index):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Index with name '{index}' not found.",
+        )
+
+    indexer = request.app.state.indexers.get(name, index)
+
+    return JSONResponse(
+        content={
+            "name": index,
+            **indexer.config.model_dump(),
+            "size": indexer.size,
+            "removed": int(indexer.tombstones.shape[0]),
+            "trained": indexer.trained,
+        }
+    )
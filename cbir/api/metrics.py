@@ -0,0 +1,27 @@
+"""Metrics API"""
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics(request: Request) -> JSONResponse:
+    """
+    Get the runtime metrics of the server.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        JSONResponse: A JSON response containing the metrics.
+    """
+
+    metrics = {"inference": request.app.state.extractor.stats()}
+
+    cache = request.app.state.extractor.cache
+    if cache is not None:
+        metrics["cache"] = cache.stats()
+
+    return JSONResponse(content=metrics)
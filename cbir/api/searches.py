@@ -1,7 +1,12 @@
 """Search API"""
 
-from typing import List
+import asyncio
+import heapq
+import json
+from itertools import chain
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 from fastapi import (
     APIRouter,
     Depends,
@@ -10,22 +15,149 @@ from fastapi import (
     Request,
     UploadFile,
 )
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from cbir.api.utils.utils import get_retrievals
-from cbir.retrieval.retrieval import ImageRetrieval
+from cbir.api.utils.models import Vector
+from cbir.api.utils.utils import (
+    get_async_stores,
+    get_filter,
+    get_indexers,
+    read_uploads,
+)
+from cbir.config import Settings, get_settings
+from cbir.retrieval.indexer import Indexer
+from cbir.retrieval.metadata import Condition
+from cbir.retrieval.retrieval import extract_features, extract_features_batch
+from cbir.retrieval.store import AsyncStore
 
 router = APIRouter()
 
+Similarities = List[Tuple[str, float]]
+
+
+async def search_storage(
+    request: Request,
+    indexer: Indexer,
+    store: AsyncStore,
+    features: np.ndarray,
+    nrt_neigh: int,
+    conditions: Optional[List[Condition]] = None,
+) -> List[Similarities]:
+    """
+    Search for similar images in a storage.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        indexer (Indexer): The indexer of the storage.
+        store (AsyncStore): The asynchronous store of the storage.
+        features (np.ndarray): The features of the query images.
+        nrt_neigh (int): The number of nearest neighbors to retrieve.
+        conditions (List[Condition], optional): The filter on the attributes
+            of the images.
+
+    Returns:
+        List[Similarities]: The list of filename and score pairs of each query
+            image, distances or similarities depending on the index metric.
+    """
+
+    # FAISS releases the GIL, Redis is awaited on the event loop
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(
+        request.app.state.searchers,
+        indexer.search_batch,
+        features,
+        nrt_neigh,
+        conditions,
+    )
+
+    # Resolve the labels of all the queries in a single round trip
+    labels = [str(label) for row_labels, _ in results for label in row_labels]
+    filenames = iter(await store.get_many(labels))
+
+    return [
+        [(next(filenames) or "", distance) for distance in distances]
+        for _, distances in results
+    ]
+
+
+def check_metrics(indexers: Sequence[Indexer]) -> None:
+    """
+    Check that the scores of several indexes can be merged.
+
+    Args:
+        indexers (Sequence[Indexer]): The indexers of the storages.
+
+    Raises:
+        HTTPException: If the indexes do not use the same metric.
+    """
+
+    metrics = {indexer.config.metric for indexer in indexers}
+    if len(metrics) > 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"The indexes use different metrics: {', '.join(sorted(metrics))}.",
+        )
+
+
+async def search_storages(
+    request: Request,
+    indexers: Sequence[Indexer],
+    stores: Sequence[AsyncStore],
+    features: np.ndarray,
+    nrt_neigh: int,
+    conditions: Optional[List[Condition]] = None,
+) -> List[Similarities]:
+    """
+    Search for similar images in several storages and merge the results.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        indexers (Sequence[Indexer]): The indexers of the storages.
+        stores (Sequence[AsyncStore]): The asynchronous stores of the storages.
+        features (np.ndarray): The features of the query images.
+        nrt_neigh (int): The number of nearest neighbors to retrieve.
+        conditions (List[Condition], optional): The filter on the attributes
+            of the images.
+
+    Raises:
+        HTTPException: If the indexes do not use the same metric, their scores
+            cannot be merged.
+
+    Returns:
+        List[Similarities]: The nearest filename and score pairs over all the
+            storages, for each query image, the closest first.
+    """
+
+    check_metrics(indexers)
+
+    results = await asyncio.gather(
+        *(
+            search_storage(request, indexer, store, features, nrt_neigh, conditions)
+            for indexer, store in zip(indexers, stores)
+        )
+    )
+
+    # The distances are sorted in ascending order and the similarities in
+    # descending order
+    similarity = bool(indexers) and indexers[0].config.similarity
+    merge = heapq.nlargest if similarity else heapq.nsmallest
+
+    return [
+        merge(nrt_neigh, chain.from_iterable(rows), key=lambda x: x[1])
+        for rows in zip(*results)
+    ]
+
 
 @router.post("/search")
-async def retrieve_image(
+async def retrieve_image(  # pylint: disable=too-many-arguments
     request: Request,
     image: UploadFile,
     nrt_neigh: int = Query(...),
     storage_names: List[str] = Query(..., alias="storage"),
     index_name: str = Query(default="index", alias="index"),
-    retrievals: List[ImageRetrieval] = Depends(get_retrievals),
+    indexers: List[Indexer] = Depends(get_indexers),
+    stores: List[AsyncStore] = Depends(get_async_stores),
+    conditions: Optional[List[Condition]] = Depends(get_filter),
 ) -> JSONResponse:
     """
     Search for similar images from the index.
@@ -36,7 +168,10 @@ async def retrieve_image(
         nrt_neigh (int): The number of nearest neighbors to retrieve.
         storage_names (List[str]): The list of storage names.
         index_name (str): The name of the index where the image features will be added.
-        retrievals (List[ImageRetrieval]): The image retrieval object.
+        indexers (List[Indexer]): The indexers of the storages.
+        stores (List[AsyncStore]): The asynchronous stores of the storages.
+        conditions (List[Condition], optional): The filter on the attributes
+            of the searched images.
 
     Returns:
         JSONResponse: A JSON containing the list of similarities.
@@ -45,21 +180,248 @@ async def retrieve_image(
     if not storage_names:
         raise HTTPException(status_code=404, detail="Storage is required")
 
-    model = request.app.state.model
+    extractor = request.app.state.extractor
     content = await image.read()
 
-    similarities = [
-        result
-        for retrieval in retrievals
-        for result in retrieval.search(model, content, nrt_neigh)
-    ]
-    similarities = sorted(similarities, key=lambda x: x[1])[:nrt_neigh]
+    # Extract the features once and search all the storages in parallel
+    features = await request.app.state.executor.run(
+        extract_features,
+        extractor,
+        content,
+    )
+
+    similarities = await search_storages(
+        request,
+        indexers,
+        stores,
+        features,
+        nrt_neigh,
+        conditions,
+    )
 
     return JSONResponse(
         content={
             "query": image.filename,
             "storage": storage_names,
             "index": index_name,
-            "similarities": similarities,
+            "metric": indexers[0].config.metric,
+            "similarities": similarities[0],
+        }
+    )
+
+
+@router.post("/search/images/{filename:path}")
+async def retrieve_indexed_image(  # pylint: disable=too-many-arguments
+    request: Request,
+    filename: str,
+    nrt_neigh: int = Query(...),
+    storage_names: List[str] = Query(..., alias="storage"),
+    index_name: str = Query(default="index", alias="index"),
+    indexers: List[Indexer] = Depends(get_indexers),
+    stores: List[AsyncStore] = Depends(get_async_stores),
+    conditions: Optional[List[Condition]] = Depends(get_filter),
+) -> JSONResponse:
+    """
+    Search for similar images of an already indexed image, without running the
+    model again.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        filename (str): The name of the indexed image, in the first storage
+            containing it.
+        nrt_neigh (int): The number of nearest neighbors to retrieve.
+        storage_names (List[str]): The list of storage names.
+        index_name (str): The name of the index where the image features are stored.
+        indexers (List[Indexer]): The indexers of the storages.
+        stores (List[AsyncStore]): The asynchronous stores of the storages.
+        conditions (List[Condition], optional): The filter on the attributes
+            of the searched images.
+
+    Returns:
+        JSONResponse: A JSON containing the list of similarities.
+    """
+
+    if not storage_names:
+        raise HTTPException(status_code=404, detail="Storage is required")
+
+    labels = await asyncio.gather(*(store.get(filename) for store in stores))
+
+    # Reconstruct the stored features instead of extracting them again
+    loop = asyncio.get_running_loop()
+    features = None
+    for indexer, label in zip(indexers, labels):
+        if label is not None:
+            features = await loop.run_in_executor(
+                request.app.state.searchers,
+                indexer.reconstruct,
+                int(label),
+            )
+        if features is not None:
+            break
+
+    if features is None:
+        raise HTTPException(status_code=404, detail=f"{filename} not found")
+
+    similarities = await search_storages(
+        request,
+        indexers,
+        stores,
+        features,
+        nrt_neigh,
+        conditions,
+    )
+
+    return JSONResponse(
+        content={
+            "query": filename,
+            "storage": storage_names,
+            "index": index_name,
+            "metric": indexers[0].config.metric,
+            "similarities": similarities[0],
+        }
+    )
+
+
+@router.post("/search/vector")
+async def retrieve_vector(  # pylint: disable=too-many-arguments
+    request: Request,
+    body: Vector,
+    nrt_neigh: int = Query(...),
+    storage_names: List[str] = Query(..., alias="storage"),
+    index_name: str = Query(default="index", alias="index"),
+    indexers: List[Indexer] = Depends(get_indexers),
+    stores: List[AsyncStore] = Depends(get_async_stores),
+    conditions: Optional[List[Condition]] = Depends(get_filter),
+) -> JSONResponse:
+    """
+    Search for similar images of a feature vector, without running the model.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        body (Vector): The features as a list of floats or as base64 encoded
+            float32.
+        nrt_neigh (int): The number of nearest neighbors to retrieve.
+        storage_names (List[str]): The list of storage names.
+        index_name (str): The name of the index where the image features are stored.
+        indexers (List[Indexer]): The indexers of the storages.
+        stores (List[AsyncStore]): The asynchronous stores of the storages.
+        conditions (List[Condition], optional): The filter on the attributes
+            of the searched images.
+
+    Returns:
+        JSONResponse: A JSON containing the list of similarities.
+    """
+
+    if not storage_names:
+        raise HTTPException(status_code=404, detail="Storage is required")
+
+    n_features = request.app.state.model.n_features
+    try:
+        features = body.to_array()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid vector: {e}") from e
+
+    if features.shape[1] != n_features:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid vector: expected {n_features} features.",
+        )
+
+    similarities = await search_storages(
+        request,
+        indexers,
+        stores,
+        features,
+        nrt_neigh,
+        conditions,
+    )
+
+    return JSONResponse(
+        content={
+            "query": None,
+            "storage": storage_names,
+            "index": index_name,
+            "metric": indexers[0].config.metric,
+            "similarities": similarities[0],
         }
     )
+
+
+@router.post("/search/batch")
+async def retrieve_images(  # pylint: disable=too-many-arguments
+    request: Request,
+    images: List[UploadFile],
+    nrt_neigh: int = Query(...),
+    storage_names: List[str] = Query(..., alias="storage"),
+    indexers: List[Indexer] = Depends(get_indexers),
+    stores: List[AsyncStore] = Depends(get_async_stores),
+    settings: Settings = Depends(get_settings),
+    conditions: Optional[List[Condition]] = Depends(get_filter),
+) -> StreamingResponse:
+    """
+    Search for similar images of several query images, or zip and tar archives
+    of query images, by batches.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        images (List[UploadFile]): The query image or archive files.
+        nrt_neigh (int): The number of nearest neighbors to retrieve.
+        storage_names (List[str]): The list of storage names.
+        indexers (List[Indexer]): The indexers of the storages.
+        stores (List[AsyncStore]): The asynchronous stores of the storages.
+        settings (Settings): The app settings.
+        conditions (List[Condition], optional): The filter on the attributes
+            of the searched images.
+
+    Returns:
+        StreamingResponse: A stream of JSON lines containing the similarities or
+            the error of each query image, in order.
+    """
+
+    if not storage_names:
+        raise HTTPException(status_code=404, detail="Storage is required")
+
+    # Checked before the response starts, the errors are still reported as such
+    check_metrics(indexers)
+
+    files = await read_uploads(images)
+
+    async def stream() -> AsyncIterator[str]:
+        for start in range(0, len(files), settings.batch_size):
+            batch = files[start : start + settings.batch_size]
+
+            try:
+                features, errors = await request.app.state.executor.run(
+                    extract_features_batch,
+                    request.app.state.extractor,
+                    [content for _, content in batch],
+                    settings.decode_workers,
+                )
+            except HTTPException as e:
+                # The response has started, report the error for each query
+                features, errors = None, [e.detail] * len(batch)
+
+            similarities: List[Similarities] = []
+            if features is not None and features.shape[0] > 0:
+                similarities = await search_storages(
+                    request,
+                    indexers,
+                    stores,
+                    features,
+                    nrt_neigh,
+                    conditions,
+                )
+
+            valid = 0
+            for (filename, _), error in zip(batch, errors):
+                result: Dict[str, Any] = {"query": filename}
+                if error is None:
+                    result["metric"] = indexers[0].config.metric
+                    result["similarities"] = similarities[valid]
+                    valid += 1
+                else:
+                    result["error"] = error
+
+                yield json.dumps(result) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
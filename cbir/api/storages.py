@@ -3,7 +3,7 @@
 import shutil
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
 
 from cbir.api.utils.models import Storage
@@ -102,6 +102,7 @@ async def get_storage(
 
 @router.delete("/storages/{name}")
 async def delete_storage(
+    request: Request,
     name: str,
     settings: Settings = Depends(get_settings),
 ) -> JSONResponse:
@@ -109,6 +110,7 @@ async def delete_storage(
     Delete a specific storage and its content.
 
     Args:
+        request (Request): The incoming HTTP request.
         name (str): The name of the storage to delete.
         settings (Settings): The database settings.
 
@@ -133,4 +135,6 @@ async def delete_storage(
             detail=f"Failed to delete storage: {str(e)}",
         ) from e
 
+    request.app.state.indexers.discard(name)
+
     return JSONResponse(content={"message": f"Deleted storage with name: {name}"})
@@ -0,0 +1,72 @@
+"""Bounded executor running the blocking work off the event loop."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+
+class BoundedExecutor:
+    """Thread pool rejecting the work exceeding its queue depth."""
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queue: int,
+        name: str = "worker",
+    ) -> None:
+        """
+        Bounded executor initialisation.
+
+        Args:
+            max_workers (int): The number of threads running the work.
+            max_queue (int): The number of tasks allowed to wait for a thread.
+            name (str): The prefix of the thread names.
+        """
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=name,
+        )
+        self.capacity = max_workers + max_queue
+
+        # Only updated from the event loop, no lock is needed
+        self.pending = 0
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Run a blocking function in the thread pool.
+
+        Args:
+            func (Callable[..., T]): The function to run.
+            *args (Any): The arguments of the function.
+
+        Raises:
+            HTTPException: If the executor is already full.
+
+        Returns:
+            T: The value returned by the function.
+        """
+
+        if self.pending >= self.capacity:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry later.",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, partial(func, *args))
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        """Wait for the running tasks and release the threads."""
+
+        self.executor.shutdown(wait=True)
@@ -1,6 +1,12 @@
 """DTO Models"""
 
-from pydantic import BaseModel
+import base64
+from typing import List, Union
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from cbir.retrieval.factory import IndexConfig
 
 
 class Storage(BaseModel):
@@ -9,3 +15,45 @@ class Storage(BaseModel):
     """
 
     name: str
+
+
+class Index(IndexConfig):
+    """
+    Index model.
+    """
+
+    # A file name in the storage, without separators nor leading dot
+    name: str = Field(pattern=r"^[^/\\.][^/\\]*$")
+
+
+class Filenames(BaseModel):
+    """
+    Filenames model.
+    """
+
+    filenames: List[str]
+
+
+class Vector(BaseModel):
+    """
+    Feature vector model, as a list of floats or as base64 encoded float32.
+    """
+
+    vector: Union[List[float], str]
+
+    def to_array(self) -> np.ndarray:
+        """
+        Decode the feature vector.
+
+        Raises:
+            ValueError: If the base64 string is not a valid float32 array.
+
+        Returns:
+            np.ndarray: The features of shape (1, n_features).
+        """
+
+        if isinstance(self.vector, str):
+            data = base64.b64decode(self.vector, validate=True)
+            return np.frombuffer(data, dtype="<f4").astype("float32").reshape(1, -1)
+
+        return np.asarray(self.vector, dtype="float32").reshape(1, -1)
@@ -1,14 +1,25 @@
 """Utility functions for dependency injection."""
 
-from typing import List
-from fastapi import Depends, Query, Request
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Depends, Form, HTTPException, Query, Request, UploadFile
+from pydantic import TypeAdapter, ValidationError
 from redis import Redis  # type: ignore
+from redis import asyncio as aioredis  # type: ignore
 
 from cbir.config import Settings, get_settings
+from cbir.retrieval.archives import is_archive, read_archive
 from cbir.retrieval.indexer import Indexer
+from cbir.retrieval.metadata import (
+    Condition,
+    Metadata,
+    check_key,
+    parse_filter,
+)
 from cbir.retrieval.retrieval import ImageRetrieval
-from cbir.retrieval.store import Store
-from cbir.retrieval.utils import get_redis
+from cbir.retrieval.store import AsyncStore, Store
+from cbir.retrieval.utils import get_async_redis, get_redis
 
 
 def get_store(
@@ -49,60 +60,83 @@ def get_stores(
     return [Store(storage_name, redis, index_name) for storage_name in storage_names]
 
 
+def get_async_store(
+    storage_name: str = Query(..., alias="storage"),
+    index_name: str = Query(default="index", alias="index"),
+    redis: aioredis.Redis = Depends(get_async_redis),
+) -> AsyncStore:
+    """
+    Instantiate an AsyncStore object for the async handlers.
+
+    Args:
+        storage_name (str): The name of the storage.
+        index_name (str): The name of the index.
+        redis (aioredis.Redis): An instance of the asynchronous Redis client.
+
+    Returns:
+        AsyncStore: An instance of the AsyncStore.
+    """
+    return AsyncStore(storage_name, redis, index_name)
+
+
+def get_async_stores(
+    storage_names: List[str] = Query(..., alias="storage"),
+    index_name: str = Query(default="index", alias="index"),
+    redis: aioredis.Redis = Depends(get_async_redis),
+) -> List[AsyncStore]:
+    """
+    Instantiate a list of AsyncStore objects based on the provided storage names.
+
+    Args:
+        storage_names (List[str]): The names of the storages.
+        index_name (str): The name of the index.
+        redis (aioredis.Redis): An instance of the asynchronous Redis client.
+
+    Returns:
+        List[AsyncStore]: A list of AsyncStore instances.
+    """
+    return [
+        AsyncStore(storage_name, redis, index_name) for storage_name in storage_names
+    ]
+
+
 def get_indexer(
     request: Request,
     storage_name: str = Query(..., alias="storage"),
     index_name: str = Query(default="index", alias="index"),
-    settings: Settings = Depends(get_settings),
 ) -> Indexer:
     """
-    Instantiate an Indexer object.
+    Get the resident Indexer object of an index.
 
     Args:
+        request (Request): The incoming HTTP request.
         storage_name (str): The name of the storage.
         index_name (str): The name of the index.
-        settings (Settings): The app settings.
 
     Returns:
         Indexer: An instance of the Indexer.
     """
-    return Indexer(
-        settings.data_path,
-        storage_name,
-        index_name,
-        request.app.state.model.n_features,
-        settings.device.type == "cuda",
-    )
+    return request.app.state.indexers.get(storage_name, index_name)
 
 
 def get_indexers(
     request: Request,
     storage_names: List[str] = Query(..., alias="storage"),
     index_name: str = Query(default="index", alias="index"),
-    settings: Settings = Depends(get_settings),
 ) -> List[Indexer]:
     """
-    Instantiate a list of Indexer objects based on the provided storage names.
+    Get the resident Indexer objects based on the provided storage names.
 
     Args:
+        request (Request): The incoming HTTP request.
         storage_names (List[str]): The names of the storages.
         index_name (str): The name of the index.
-        settings (Settings): The app settings.
 
     Returns:
         List[Indexer]: A list of Indexer instances.
     """
-    device = settings.device.type == "cuda"
-    return [
-        Indexer(
-            settings.data_path,
-            storage_name,
-            index_name,
-            request.app.state.model.n_features,
-            device,
-        )
-        for storage_name in storage_names
-    ]
+    registry = request.app.state.indexers
+    return [registry.get(storage_name, index_name) for storage_name in storage_names]
 
 
 def get_retrieval(
@@ -137,3 +171,117 @@ def get_retrievals(
         List[ImageRetrieval]: A list of ImageRetrieval instances.
     """
     return [ImageRetrieval(store, indexer) for store, indexer in zip(stores, indexers)]
+
+
+def check_writable(settings: Settings = Depends(get_settings)) -> None:
+    """
+    Reject the mutations of the indexes on the search-only workers.
+
+    Args:
+        settings (Settings): The app settings.
+    """
+    if settings.index_mmap:
+        raise HTTPException(
+            status_code=403,
+            detail="The indexes are read-only on this worker.",
+        )
+
+
+def get_filter(
+    expression: Optional[str] = Query(default=None, alias="filter"),
+) -> Optional[List[Condition]]:
+    """
+    Parse the filter on the attributes of the searched images.
+
+    Args:
+        expression (str, optional): The filter expression, such as
+            "project=12|13,magnification=20".
+
+    Returns:
+        Optional[List[Condition]]: The conditions of the filter, or None to
+            search all the images.
+    """
+    if not expression:
+        return None
+
+    try:
+        return parse_filter(expression)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {e}") from e
+
+
+def parse_metadata(value: Optional[str], batch: bool) -> Any:
+    """
+    Validate the attributes of the images sent as a JSON form field.
+
+    Args:
+        value (str, optional): The JSON attributes.
+        batch (bool): Whether the attributes are given by filename.
+
+    Returns:
+        Any: The attributes, or None if not given.
+    """
+    if value is None:
+        return None
+
+    adapter: TypeAdapter = TypeAdapter(Dict[str, Metadata] if batch else Metadata)
+    try:
+        metadata = adapter.validate_json(value)
+        for attributes in metadata.values() if batch else [metadata]:
+            for key in attributes:
+                check_key(key)
+    except (ValidationError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid metadata: {e}") from e
+
+    return metadata
+
+
+def get_metadata(metadata: Optional[str] = Form(default=None)) -> Optional[Metadata]:
+    """
+    Get the attributes of an indexed image.
+
+    Args:
+        metadata (str, optional): The attributes as a JSON object, such as
+            {"project": 12, "magnification": 20}.
+
+    Returns:
+        Optional[Metadata]: The attributes of the image.
+    """
+    return parse_metadata(metadata, batch=False)
+
+
+def get_batch_metadata(
+    metadata: Optional[str] = Form(default=None),
+) -> Optional[Dict[str, Metadata]]:
+    """
+    Get the attributes of several indexed images.
+
+    Args:
+        metadata (str, optional): The attributes of the images by filename, as
+            a JSON object.
+
+    Returns:
+        Optional[Dict[str, Metadata]]: The attributes of the images by filename.
+    """
+    return parse_metadata(metadata, batch=True)
+
+
+async def read_uploads(files: List[UploadFile]) -> List[Tuple[str, bytes]]:
+    """
+    Read the uploaded images, expanding the zip and tar archives.
+
+    Args:
+        files (List[UploadFile]): The uploaded image or archive files.
+
+    Returns:
+        List[Tuple[str, bytes]]: The filenames and the contents of the images.
+    """
+    images: List[Tuple[str, bytes]] = []
+    for file in files:
+        # The archives are decompressed off the event loop
+        if await asyncio.to_thread(is_archive, file.file):
+            images.extend(await asyncio.to_thread(list, read_archive(file.file)))
+        else:
+            images.append((file.filename or "", await file.read()))
+
+    return images
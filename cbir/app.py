@@ -1,25 +1,150 @@
 """Content Based Image Retrieval API"""
 
+import asyncio
+import logging
 from collections.abc import AsyncGenerator
-from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
+from functools import partial
 
 from fastapi import FastAPI
 
 from cbir import __version__
-from cbir.api import images, searches, storages
+from cbir.api import images, indexes, metrics, searches, storages
+from cbir.api.utils.executor import BoundedExecutor
 from cbir.config import get_settings
-from cbir.models.utils import load_model
+from cbir.models.cache import DiskCache, EmbeddingCache
+from cbir.models.extractor import FeatureExtractor
+from cbir.models.utils import get_fingerprint, load_model
+from cbir.retrieval.indexer import Indexer, IndexerOptions
+from cbir.retrieval.registry import IndexerRegistry
+from cbir.retrieval.utils import create_async_redis_pool, create_redis_pool
+
+logger = logging.getLogger(__name__)
+
+
+async def flush_indexes(registry: IndexerRegistry, interval: float) -> None:
+    """Periodically persist the indexes whose pending mutations expired."""
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(registry.flush, True)
+        except Exception:  # pylint: disable=broad-exception-caught
+            # Keep persisting the indexes, the failed ones are retried next time
+            logger.exception("Failed to flush the indexes")
+
+
+async def maintain_indexes(registry: IndexerRegistry, interval: float) -> None:
+    """Periodically compact and promote the indexes which need it."""
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(registry.maintain)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Failed to maintain the indexes")
 
 
 @asynccontextmanager
 async def lifespan(local_app: FastAPI) -> AsyncGenerator[None, None]:
     """Lifespan of the app."""
 
+    settings = local_app.dependency_overrides.get(get_settings, get_settings)()
+
     # Initialisation
-    local_app.state.model = load_model(get_settings())
+    local_app.state.redis_pool = create_redis_pool(settings)
+    local_app.state.async_redis_pool = create_async_redis_pool(settings)
+    local_app.state.model = load_model(settings)
+    local_app.state.cache = None
+    if settings.cache_size > 0 or settings.cache_path:
+        disk = None
+        if settings.cache_path and settings.cache_disk_size > 0:
+            disk = DiskCache(
+                settings.cache_path,
+                local_app.state.model.n_features,
+                settings.cache_disk_size,
+            )
+        local_app.state.cache = EmbeddingCache(
+            get_fingerprint(settings),
+            max_items=settings.cache_size,
+            disk=disk,
+        )
+    local_app.state.extractor = FeatureExtractor(
+        local_app.state.model,
+        max_batch_size=settings.max_batch_size,
+        max_wait_ms=settings.max_wait_ms,
+        cache=local_app.state.cache,
+        decode_processes=settings.decode_processes,
+    )
+    options = IndexerOptions(
+        flush_every=settings.index_flush_every,
+        flush_interval=settings.index_flush_interval,
+        fsync=settings.index_log_fsync,
+        promote_size=settings.index_promote_size,
+        promote_type=settings.index_promote_type,
+        compact_ratio=settings.index_compact_ratio,
+        mmap=settings.index_mmap,
+    )
+    local_app.state.indexers = IndexerRegistry(
+        partial(
+            Indexer,
+            settings.data_path,
+            n_features=local_app.state.model.n_features,
+            gpu=settings.device.type == "cuda",
+            options=options,
+        ),
+        max_indexes=settings.index_cache_size,
+        max_memory=settings.index_cache_memory,
+    )
+
+    # Run the inference and the index work off the event loop
+    local_app.state.executor = BoundedExecutor(
+        settings.inference_workers,
+        settings.inference_queue_size,
+        name="inference",
+    )
+
+    # Fan out the searches over several storages, FAISS releases the GIL
+    local_app.state.searchers = ThreadPoolExecutor(
+        max_workers=settings.search_workers,
+        thread_name_prefix="search",
+    )
+
+    tasks = []
+    if settings.index_flush_interval > 0:
+        tasks.append(
+            asyncio.create_task(
+                flush_indexes(local_app.state.indexers, settings.index_flush_interval)
+            )
+        )
+    if settings.index_promote_size > 0 or settings.index_compact_ratio > 0:
+        tasks.append(
+            asyncio.create_task(
+                maintain_indexes(
+                    local_app.state.indexers,
+                    settings.index_maintenance_interval,
+                )
+            )
+        )
 
     yield
 
+    # Persist the pending mutations on shutdown
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    local_app.state.executor.shutdown()
+    local_app.state.extractor.close()
+    if local_app.state.cache is not None:
+        local_app.state.cache.close()
+    local_app.state.searchers.shutdown()
+    local_app.state.indexers.clear()
+    local_app.state.redis_pool.disconnect()
+    await local_app.state.async_redis_pool.disconnect()
+
 
 PREFIX = get_settings().api_base_path
 
@@ -35,5 +160,7 @@ app = FastAPI(
     },
 )
 app.include_router(router=images.router, prefix=PREFIX)
+app.include_router(router=indexes.router, prefix=PREFIX)
+app.include_router(router=metrics.router, prefix=PREFIX)
 app.include_router(router=searches.router, prefix=PREFIX)
 app.include_router(router=storages.router, prefix=PREFIX)
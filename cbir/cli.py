@@ -0,0 +1,528 @@
+"""Command line interface of the server."""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+import torch
+from redis import Redis  # type: ignore
+
+from cbir.config import Settings, get_settings
+from cbir.models.extractor import FeatureExtractor
+from cbir.models.model import Model
+from cbir.models.preprocessing import Preprocessor
+from cbir.models.utils import (
+    get_model_class,
+    load_model,
+    recall_at_k,
+    run_inference,
+)
+from cbir.retrieval.archives import is_image, read_archive
+from cbir.retrieval.indexer import Indexer, IndexerOptions
+from cbir.retrieval.retrieval import ImageRetrieval, decode_images
+from cbir.retrieval.store import Store
+from cbir.retrieval.utils import create_redis_pool
+
+Images = List[Tuple[str, bytes]]
+
+
+def list_images(directory: str) -> Iterator[str]:
+    """
+    List the images of a directory and its subdirectories, in a stable order.
+
+    Args:
+        directory (str): The path to the directory.
+
+    Yields:
+        str: The path of each image.
+    """
+
+    for root, directories, filenames in os.walk(directory):
+        directories.sort()
+        for filename in sorted(filenames):
+            if is_image(filename):
+                yield os.path.join(root, filename)
+
+
+def iter_images(source: str, start: int = 0) -> Iterator[Tuple[str, bytes]]:
+    """
+    Read the images of a directory, a zip or tar archive, or a single image.
+
+    Args:
+        source (str): The path to the directory, the archive or the image.
+        start (int): The number of images to skip without reading them.
+
+    Yields:
+        Tuple[str, bytes]: The path of the image relative to the source and
+            its content, in a stable order.
+    """
+
+    if os.path.isdir(source):
+        for path in islice(list_images(source), start, None):
+            with open(path, "rb") as file:
+                yield os.path.relpath(path, source), file.read()
+        return
+
+    if is_image(source):
+        if start == 0:
+            with open(source, "rb") as file:
+                yield os.path.basename(source), file.read()
+        return
+
+    with open(source, "rb") as file:
+        yield from read_archive(file, start)
+
+
+def iter_batches(
+    images: Iterator[Tuple[str, bytes]],
+    batch_size: int,
+) -> Iterator[Images]:
+    """
+    Group the images into batches.
+
+    Args:
+        images (Iterator[Tuple[str, bytes]]): The filenames and the images.
+        batch_size (int): The number of images per batch.
+
+    Yields:
+        Images: The filenames and the images of each batch.
+    """
+
+    while batch := list(islice(images, batch_size)):
+        yield batch
+
+
+class Checkpoint:
+    """Number of images of a source already ingested, to resume an ingestion."""
+
+    def __init__(self, path: str, source: str) -> None:
+        """
+        Checkpoint initialisation.
+
+        Args:
+            path (str): The path to the checkpoint file.
+            source (str): The path to the ingested source.
+        """
+
+        self.path = path
+        self.source = os.path.abspath(source)
+
+    def read(self) -> int:
+        """
+        Read the checkpoint.
+
+        Returns:
+            int: The number of images already ingested, 0 if the checkpoint is
+                missing or belongs to another source.
+        """
+
+        if not os.path.isfile(self.path):
+            return 0
+
+        with open(self.path, "r", encoding="utf-8") as file:
+            state = json.load(file)
+
+        return state["position"] if state.get("source") == self.source else 0
+
+    def write(self, position: int) -> None:
+        """
+        Atomically write the checkpoint.
+
+        Args:
+            position (int): The number of images already ingested.
+        """
+
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump({"source": self.source, "position": position}, file)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temporary, self.path)
+
+    def clear(self) -> None:
+        """Remove the checkpoint once the source is fully ingested."""
+
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+
+class _Batch(NamedTuple):
+    """Batch of images being decoded."""
+
+    images: Images
+    results: List[Dict[str, Any]]
+    pending: List[int]
+    decoded: "Future[List[Union[torch.Tensor, Exception]]]"
+
+
+class Ingestion:  # pylint: disable=too-many-instance-attributes
+    """Streaming pipeline reading, decoding, embedding and indexing images."""
+
+    def __init__(
+        self,
+        retrieval: ImageRetrieval,
+        extractor: FeatureExtractor,
+        checkpoint: Checkpoint,
+        workers: int = 4,
+    ) -> None:
+        """
+        Ingestion initialisation.
+
+        Args:
+            retrieval (ImageRetrieval): The retrieval of the target index.
+            extractor (FeatureExtractor): The feature extractor.
+            checkpoint (Checkpoint): The checkpoint of the source.
+            workers (int): The number of threads decoding the images.
+        """
+
+        self.retrieval = retrieval
+        self.extractor = extractor
+        self.checkpoint = checkpoint
+        self.workers = workers
+
+        self.position = 0
+        self.indexed = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+
+    def run(self, source: str, batch_size: int, queue_size: int) -> None:
+        """
+        Ingest the images of a source, resuming from the checkpoint.
+
+        Args:
+            source (str): The path to the directory, the archive or the image.
+            batch_size (int): The number of images per forward pass.
+            queue_size (int): The number of batches decoded ahead of the
+                forward passes.
+        """
+
+        self.position = self.checkpoint.read()
+        if self.position > 0:
+            print(f"Resuming after {self.position} images", file=sys.stderr)
+
+        # Decode the next batches while the current one runs through the model
+        batches: Deque[_Batch] = deque()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="decode") as pool:
+            for images in iter_batches(iter_images(source, self.position), batch_size):
+                batches.append(self._decode(pool, images))
+                if len(batches) > queue_size:
+                    self._index(batches.popleft())
+
+            while batches:
+                self._index(batches.popleft())
+
+        self.retrieval.indexer.flush()
+        self.checkpoint.clear()
+
+    def _decode(self, pool: ThreadPoolExecutor, images: Images) -> _Batch:
+        """
+        Skip the already indexed images of a batch and decode the others.
+
+        Args:
+            pool (ThreadPoolExecutor): The decoding thread.
+            images (Images): The filenames and the images of the batch.
+
+        Returns:
+            _Batch: The batch being decoded.
+        """
+
+        results: List[Dict[str, Any]] = [{"filename": name} for name, _ in images]
+        pending = self.retrieval.check_filenames([name for name, _ in images], results)
+
+        decoded = pool.submit(
+            decode_images,
+            self.extractor,
+            [images[i][1] for i in pending],
+            self.workers,
+        )
+
+        return _Batch(images, results, pending, decoded)
+
+    def _index(self, batch: _Batch) -> None:
+        """
+        Embed and index a decoded batch, then move the checkpoint past it.
+
+        Args:
+            batch (_Batch): The batch being decoded.
+        """
+
+        indices, tensors = [], []
+        for i, tensor in zip(batch.pending, batch.decoded.result()):
+            if isinstance(tensor, Exception):
+                batch.results[i]["error"] = f"Invalid image: {tensor}"
+            else:
+                indices.append(i)
+                tensors.append(tensor)
+
+        if tensors:
+            features = self.extractor.extract(torch.stack(tensors))
+            ids = self.retrieval.add_features(
+                [batch.images[i][0] for i in indices],
+                features,
+            )
+
+            # The images indexed meanwhile by another writer are skipped
+            for i, tag in zip(indices, ids):
+                if tag is None:
+                    batch.results[i]["error"] = "Image filename already exist!"
+            indices = [i for i, tag in zip(indices, ids) if tag is not None]
+
+        for result in batch.results:
+            if "error" in result:
+                print(f"{result['filename']}: {result['error']}", file=sys.stderr)
+
+        self.position += len(batch.images)
+        self.indexed += len(indices)
+        self.skipped += len(batch.images) - len(indices)
+        self.checkpoint.write(self.position)
+
+        print(self.report(), file=sys.stderr)
+
+    def report(self) -> str:
+        """
+        Report the progress of the ingestion.
+
+        Returns:
+            str: The number of indexed and skipped images and the throughput.
+        """
+
+        elapsed = time.monotonic() - self.started
+        rate = (self.indexed + self.skipped) / elapsed if elapsed > 0 else 0.0
+
+        return f"{self.indexed} indexed, {self.skipped} skipped, {rate:.1f} images/s"
+
+
+def ingest(args: argparse.Namespace, settings: Settings) -> None:
+    """
+    Index a directory, an archive or an image into an index of a storage.
+
+    Args:
+        args (argparse.Namespace): The arguments of the command.
+        settings (Settings): The environment settings.
+    """
+
+    os.makedirs(os.path.join(settings.data_path, args.storage), exist_ok=True)
+
+    model = load_model(settings)
+    extractor = FeatureExtractor(
+        model,
+        max_batch_size=max(settings.max_batch_size, args.batch_size),
+        max_wait_ms=0,
+        decode_processes=args.processes,
+    )
+    indexer = Indexer(
+        settings.data_path,
+        args.storage,
+        args.index,
+        n_features=model.n_features,
+        gpu=settings.device.type == "cuda",
+        options=IndexerOptions(
+            flush_every=settings.index_flush_every,
+            fsync=settings.index_log_fsync,
+        ),
+    )
+    pool = create_redis_pool(settings)
+    store = Store(args.storage, Redis(connection_pool=pool), args.index)
+
+    checkpoint = Checkpoint(
+        args.checkpoint
+        or os.path.join(settings.data_path, args.storage, f"{args.index}.ingest"),
+        args.source,
+    )
+    ingestion = Ingestion(
+        ImageRetrieval(store, indexer),
+        extractor,
+        checkpoint,
+        workers=args.workers,
+    )
+
+    try:
+        ingestion.run(args.source, args.batch_size, args.queue_size)
+    finally:
+        extractor.close()
+        indexer.flush()
+        pool.disconnect()
+
+    print(f"Done: {ingestion.report()}", file=sys.stderr)
+
+
+def embed(model: Model, inputs: List[torch.Tensor], batch_size: int) -> np.ndarray:
+    """
+    Extract the features of decoded images by batches.
+
+    Args:
+        model (Model): The model.
+        inputs (List[torch.Tensor]): The uint8 images.
+        batch_size (int): The number of images per forward pass.
+
+    Returns:
+        np.ndarray: The features of shape (N, n_features).
+    """
+
+    preprocessor = Preprocessor(model.preprocessing)
+
+    features = [
+        run_inference(
+            model,
+            preprocessor.normalize(
+                torch.stack(inputs[start : start + batch_size]).to(model.device)
+            ),
+        )
+        for start in range(0, len(inputs), batch_size)
+    ]
+
+    return np.concatenate(features)
+
+
+def check_precision(args: argparse.Namespace, settings: Settings) -> None:
+    """
+    Check that a reduced precision preserves the nearest neighbours of sample
+    images compared to fp32, exiting with an error beyond the tolerance.
+
+    Args:
+        args (argparse.Namespace): The arguments of the command.
+        settings (Settings): The environment settings.
+    """
+
+    # Decode the images once, both models share the same preprocessing
+    preprocessor = Preprocessor(get_model_class(settings.extractor).preprocessing)
+    inputs = []
+    for _, image in islice(iter_images(args.source), args.limit):
+        try:
+            inputs.append(preprocessor.decode(image))
+        except Exception:  # pylint: disable=broad-exception-caught
+            continue
+
+    reference = embed(
+        load_model(
+            settings.model_copy(
+                update={
+                    "precision": "fp32",
+                    "channels_last": False,
+                    "compile_model": False,
+                }
+            )
+        ),
+        inputs,
+        args.batch_size,
+    )
+    candidate = embed(
+        load_model(settings.model_copy(update={"precision": args.precision})),
+        inputs,
+        args.batch_size,
+    )
+
+    recall = recall_at_k(reference, candidate, args.k)
+    print(
+        f"recall@{args.k} of {args.precision} against fp32 "
+        f"on {len(inputs)} images: {recall:.4f}"
+    )
+
+    if recall < 1 - args.tolerance:
+        sys.exit(f"The recall is below the tolerance of {args.tolerance}.")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Run a command.
+
+    Args:
+        argv (List[str], optional): The command line arguments, the ones of the
+            process by default.
+    """
+
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(prog="cbir", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_ingest = commands.add_parser("ingest", help=ingest.__doc__)
+    parser_ingest.add_argument("source", help="directory, zip or tar archive, or image")
+    parser_ingest.add_argument("--storage", required=True, help="name of the storage")
+    parser_ingest.add_argument("--index", default="index", help="name of the index")
+    parser_ingest.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.batch_size,
+        help="number of images per forward pass",
+    )
+    parser_ingest.add_argument(
+        "--workers",
+        type=int,
+        default=settings.decode_workers,
+        help="number of threads decoding the images",
+    )
+    parser_ingest.add_argument(
+        "--processes",
+        type=int,
+        default=settings.decode_processes,
+        help="number of processes decoding the images, 0 to use threads",
+    )
+    parser_ingest.add_argument(
+        "--queue-size",
+        type=int,
+        default=2,
+        help="number of batches decoded ahead of the forward passes",
+    )
+    parser_ingest.add_argument(
+        "--checkpoint",
+        help="path to the checkpoint file, next to the index by default",
+    )
+    parser_ingest.set_defaults(handler=ingest)
+
+    parser_check = commands.add_parser(
+        "check-precision",
+        help="compare the features of a precision with the fp32 ones",
+    )
+    parser_check.add_argument("source", help="directory or archive of sample images")
+    parser_check.add_argument(
+        "--precision",
+        choices=["auto", "fp32", "fp16", "bf16", "int8"],
+        default=settings.precision,
+        help="precision to check",
+    )
+    parser_check.add_argument("--k", type=int, default=10, help="number of neighbours")
+    parser_check.add_argument(
+        "--tolerance",
+        type=float,
+        default=settings.precision_tolerance,
+        help="maximum loss of recall",
+    )
+    parser_check.add_argument(
+        "--limit",
+        type=int,
+        default=1000,
+        help="maximum number of sample images",
+    )
+    parser_check.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.batch_size,
+        help="number of images per forward pass",
+    )
+    parser_check.set_defaults(handler=check_precision)
+
+    args = parser.parse_args(argv)
+    args.handler(args, settings)
+
+
+if __name__ == "__main__":
+    main()
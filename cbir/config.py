@@ -14,6 +14,8 @@
 
 """Environment parameters"""
 
+from typing import Literal
+
 import torch
 from pydantic_settings import BaseSettings
 
@@ -27,16 +29,47 @@ class Settings(BaseSettings):
     # Faiss index
     filename: str = "db"
     data_path: str = "/data"
+    index_cache_size: int = 16
+    index_cache_memory: int = 0  # in bytes, 0 for no limit
+    index_flush_every: int = 100  # mutations, 1 to persist every mutation
+    index_flush_interval: float = 10.0  # in seconds, 0 to disable
+    index_log_fsync: bool = True
+    index_promote_size: int = 0  # vectors, 0 to keep the flat indexes
+    index_promote_type: Literal["ivf_flat", "ivf_pq"] = "ivf_flat"
+    index_compact_ratio: float = 0.1  # removed fraction, 0 to never compact
+    index_maintenance_interval: float = 60.0  # in seconds
+    index_mmap: bool = False  # map the indexes read-only, for search-only workers
+    search_workers: int = 8
 
     # Database
     host: str = "localhost"
     port: int = 6379
     db: int = 0
+    redis_max_connections: int = 64
+    redis_pool_timeout: float = 5.0  # in seconds, to wait for a free connection
+    redis_socket_timeout: float = 5.0  # in seconds
+    redis_health_check_interval: int = 30  # in seconds, 0 to disable
 
     # Deep learning model
     device: torch.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     extractor: str = "resnet"
     weights: str = f"/weights/{extractor}"
+    batch_size: int = 32
+    decode_workers: int = 4
+    decode_processes: int = 0  # 0 to decode in the threads of the server
+    inference_workers: int = 4
+    inference_queue_size: int = 16
+    max_batch_size: int = 32
+    max_wait_ms: float = 5.0
+    precision: Literal["auto", "fp32", "fp16", "bf16", "int8"] = "auto"
+    channels_last: bool = False
+    compile_model: bool = False
+    precision_tolerance: float = 0.05  # maximum loss of recall@k against fp32
+
+    # Embedding cache
+    cache_size: int = 10000  # features kept in memory, 0 to disable
+    cache_path: str = ""  # prefix of the on-disk tier files, empty to disable
+    cache_disk_size: int = 1_000_000  # features kept on disk
 
 
 def get_settings() -> Settings:
@@ -0,0 +1,320 @@
+"""Cache of the features keyed by the content of the images."""
+
+import fcntl
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+KEY_SIZE = 16
+
+
+class DiskCache:  # pylint: disable=too-many-instance-attributes
+    """
+    Fixed size tier of features stored in memory-mapped files, shared by the
+    processes using the same path.
+    """
+
+    def __init__(self, path: str, n_features: int, max_items: int) -> None:
+        """
+        Disk cache initialisation.
+
+        Args:
+            path (str): The path prefix of the memory-mapped files.
+            n_features (int): Number of features of the cached vectors.
+            max_items (int): The maximum number of cached vectors.
+        """
+
+        # The writers of all the processes are serialised by a file lock
+        self.lock_file = open(  # pylint: disable=consider-using-with
+            f"{path}.lock", "a", encoding="utf-8"
+        )
+
+        with self._locked(fcntl.LOCK_EX):
+            self.vectors = self._open(
+                f"{path}.vectors.npy", (max_items, n_features), "f4"
+            )
+            self.keys = self._open(f"{path}.keys.npy", (max_items, KEY_SIZE), "u1")
+            self.sequences = self._open(f"{path}.sequences.npy", (max_items,), "i8")
+
+            # The last sequence number and the next slot, shared by the processes:
+            # the slots are reused in insertion order, the oldest vector is evicted
+            self.state = self._open(f"{path}.state.npy", (2,), "i8")
+            if self.state[0] < self.sequences.max(initial=0):
+                self.state[0] = self.sequences.max()
+                self.state[1] = (int(self.sequences.argmax()) + 1) % max_items
+
+            # The slots of the keys as last seen by this process
+            self.slots: Dict[bytes, int] = {}
+            self.owners: Dict[int, bytes] = {}
+            self.sequence = 0
+            self._sync()
+
+    @staticmethod
+    def _open(path: str, shape: tuple, dtype: str) -> np.memmap:
+        """
+        Open a memory-mapped array, creating it if it is missing or mismatching.
+
+        Args:
+            path (str): The path to the array file.
+            shape (tuple): The expected shape of the array.
+            dtype (str): The expected data type of the array.
+
+        Returns:
+            np.memmap: The memory-mapped array.
+        """
+
+        if os.path.isfile(path):
+            array = np.lib.format.open_memmap(  # type: ignore[no-untyped-call]
+                path, mode="r+"
+            )
+            if array.shape == shape and array.dtype == np.dtype(dtype):
+                return array
+            del array
+
+        return np.lib.format.open_memmap(  # type: ignore[no-untyped-call]
+            path, mode="w+", dtype=dtype, shape=shape
+        )
+
+    @contextmanager
+    def _locked(self, operation: int) -> Iterator[None]:
+        """Hold the file lock shared by the processes."""
+
+        fcntl.flock(self.lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _sync(self) -> None:
+        """Pick up the slots written by the other processes since the last sync."""
+
+        sequence = int(self.state[0])
+        if sequence == self.sequence:
+            return
+
+        for slot in np.flatnonzero(self.sequences > self.sequence):
+            self._assign(int(slot), self.keys[slot].tobytes())
+        self.sequence = sequence
+
+    def _assign(self, slot: int, key: bytes) -> None:
+        """Record the key stored in a slot, forgetting the evicted one."""
+
+        evicted = self.owners.get(slot)
+        if evicted is not None:
+            self.slots.pop(evicted, None)
+
+        self.slots[key] = slot
+        self.owners[slot] = key
+
+    def _find(self, key: bytes) -> Optional[int]:
+        """Get the slot of a key, checking that no process has reused it."""
+
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+
+        if self.sequences[slot] == 0 or self.keys[slot].tobytes() != key:
+            del self.slots[key]
+            del self.owners[slot]
+            return None
+
+        return slot
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.sequences))
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """
+        Get the cached features of a key.
+
+        Args:
+            key (bytes): The key of the image.
+
+        Returns:
+            Optional[np.ndarray]: A copy of the features, or None if not cached.
+        """
+
+        with self._locked(fcntl.LOCK_SH):
+            slot = self._find(key)
+            if slot is None:
+                self._sync()
+                slot = self._find(key)
+
+            return None if slot is None else np.array(self.vectors[slot])
+
+    def put(self, key: bytes, features: np.ndarray) -> None:
+        """
+        Cache the features of a key, evicting the oldest ones if full.
+
+        Args:
+            key (bytes): The key of the image.
+            features (np.ndarray): The features of the image.
+        """
+
+        if self.vectors.shape[0] == 0:
+            return
+
+        with self._locked(fcntl.LOCK_EX):
+            self._sync()
+            if self._find(key) is not None:
+                return
+
+            sequence, slot = int(self.state[0]) + 1, int(self.state[1])
+
+            # Invalidate the slot first, a crash never leaves a key with wrong
+            # features
+            self.sequences[slot] = 0
+            self.vectors[slot] = features
+            self.keys[slot] = np.frombuffer(key, dtype="u1")
+            self.sequences[slot] = sequence
+            self.state[:] = (sequence, (slot + 1) % self.vectors.shape[0])
+
+            self._assign(slot, key)
+            self.sequence = sequence
+
+    def flush(self) -> None:
+        """Write the memory-mapped arrays to the disk."""
+
+        for array in (self.vectors, self.keys, self.sequences, self.state):
+            array.flush()
+
+    def close(self) -> None:
+        """Write the memory-mapped arrays to the disk and release the lock file."""
+
+        self.flush()
+        self.lock_file.close()
+
+
+class EmbeddingCache:  # pylint: disable=too-many-instance-attributes
+    """Two-tier cache of the features of the images keyed by their content."""
+
+    def __init__(
+        self,
+        namespace: str,
+        max_items: int = 10000,
+        disk: Optional[DiskCache] = None,
+    ) -> None:
+        """
+        Embedding cache initialisation.
+
+        Args:
+            namespace (str): The fingerprint of the model producing the features.
+            max_items (int): The maximum number of features kept in memory.
+            disk (DiskCache, optional): The on-disk tier, if any.
+        """
+
+        self.namespace = namespace.encode("utf-8")
+        self.max_items = max_items
+        self.disk = disk
+
+        self.lock = threading.Lock()
+        self.memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, image: bytes) -> bytes:
+        """
+        Get the key of an image.
+
+        Args:
+            image (bytes): The encoded image.
+
+        Returns:
+            bytes: The hash of the image and the model fingerprint.
+        """
+
+        digest = hashlib.blake2b(self.namespace, digest_size=KEY_SIZE)
+        digest.update(image)
+
+        return digest.digest()
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """
+        Get the cached features of an image.
+
+        Args:
+            key (bytes): The key of the image.
+
+        Returns:
+            Optional[np.ndarray]: The features of the image, or None if not cached.
+        """
+
+        with self.lock:
+            features = self.memory.get(key)
+            if features is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return features
+
+            features = self.disk.get(key) if self.disk is not None else None
+            if features is None:
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            self._remember(key, features)
+
+            return features
+
+    def put(self, key: bytes, features: np.ndarray) -> None:
+        """
+        Cache the features of an image in both tiers.
+
+        Args:
+            key (bytes): The key of the image.
+            features (np.ndarray): The features of the image.
+        """
+
+        # Do not keep the whole batch of outputs alive
+        features = features.copy()
+
+        with self.lock:
+            self._remember(key, features)
+            if self.disk is not None:
+                self.disk.put(key, features)
+
+    def _remember(self, key: bytes, features: np.ndarray) -> None:
+        """Keep the features in memory, evicting the least recently used ones."""
+
+        if self.max_items <= 0:
+            return
+
+        self.memory[key] = features
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the cache.
+
+        Returns:
+            Dict[str, Any]: The number of hits per tier and misses, the hit rate
+                and the number of cached features per tier.
+        """
+
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "size": len(self.memory),
+                "disk_size": len(self.disk) if self.disk is not None else 0,
+            }
+
+    def close(self) -> None:
+        """Write the on-disk tier to the disk."""
+
+        with self.lock:
+            if self.disk is not None:
+                self.disk.close()
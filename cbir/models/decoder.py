@@ -0,0 +1,129 @@
+"""Pool of processes decoding the images into shared memory."""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Union
+
+import numpy as np
+import torch
+
+from cbir.models.preprocessing import PreprocessingConfig, Preprocessor
+
+
+@lru_cache(maxsize=None)
+def _get_preprocessor(config: PreprocessingConfig) -> Preprocessor:
+    """Get the preprocessor of a worker process, built once per configuration."""
+
+    return Preprocessor(config)
+
+
+def _decode(
+    config: PreprocessingConfig,
+    name: str,
+    slot: int,
+    image: bytes,
+) -> Optional[str]:
+    """
+    Decode an image into its slot of a shared memory block.
+
+    Args:
+        config (PreprocessingConfig): The input expected by the model.
+        name (str): The name of the shared memory block.
+        slot (int): The position of the image in the block.
+        image (bytes): The encoded image.
+
+    Returns:
+        Optional[str]: The decoding error, or None if the image is valid.
+    """
+
+    try:
+        pixels = _get_preprocessor(config).decode_pixels(image)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        # Some decoding errors cannot be pickled, only send their message
+        return str(e)
+
+    block = SharedMemory(name=name)
+    try:
+        batch: np.ndarray = np.ndarray(
+            (slot + 1, *pixels.shape),
+            dtype=np.uint8,
+            buffer=block.buf,
+        )
+        batch[slot] = pixels
+        del batch
+    finally:
+        block.close()
+
+    return None
+
+
+class DecoderPool:
+    """Decode the images in worker processes, outside of the GIL of the server."""
+
+    def __init__(self, config: PreprocessingConfig, workers: int) -> None:
+        """
+        Decoder pool initialisation.
+
+        Args:
+            config (PreprocessingConfig): The input expected by the model.
+            workers (int): The number of decoding processes.
+        """
+
+        self.config = config
+
+        # Forking would copy the threads and the CUDA state of the server
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def decode(self, images: List[bytes]) -> List[Union[torch.Tensor, Exception]]:
+        """
+        Decode several images in parallel.
+
+        The workers write the pixels into a shared memory block instead of
+        pickling them back to the server.
+
+        Args:
+            images (List[bytes]): The encoded images.
+
+        Returns:
+            List[Union[torch.Tensor, Exception]]: The uint8 image tensor of
+                shape (3, height, width) or the decoding error of each image.
+        """
+
+        if not images:
+            return []
+
+        height, width = self.config.size
+        block = SharedMemory(create=True, size=len(images) * height * width * 3)
+
+        try:
+            futures = [
+                self.executor.submit(_decode, self.config, block.name, slot, image)
+                for slot, image in enumerate(images)
+            ]
+            errors = [future.result() for future in futures]
+
+            pixels: np.ndarray = np.ndarray(
+                (len(images), height, width, 3),
+                dtype=np.uint8,
+                buffer=block.buf,
+            )
+            batch = torch.from_numpy(pixels.copy()).permute(0, 3, 1, 2)
+            del pixels
+        finally:
+            block.close()
+            block.unlink()
+
+        return [
+            batch[slot] if error is None else ValueError(error)
+            for slot, error in enumerate(errors)
+        ]
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+
+        self.executor.shutdown()
@@ -0,0 +1,208 @@
+"""Feature extractor batching the concurrent forward passes."""
+
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import torch
+
+from cbir.models.cache import EmbeddingCache
+from cbir.models.decoder import DecoderPool
+from cbir.models.model import Model
+from cbir.models.preprocessing import Preprocessor
+from cbir.models.utils import run_inference
+
+
+class _Request(NamedTuple):
+    """Inputs waiting for a forward pass and the future of their features."""
+
+    inputs: torch.Tensor
+    future: "Future[np.ndarray]"
+
+
+class FeatureExtractor:  # pylint: disable=too-many-instance-attributes
+    """Extract features by grouping the concurrent requests into micro-batches."""
+
+    def __init__(
+        self,
+        model: Model,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        cache: Optional[EmbeddingCache] = None,
+        decode_processes: int = 0,
+    ) -> None:
+        """
+        Feature extractor initialisation.
+
+        Args:
+            model (Model): The model to extract features.
+            max_batch_size (int): The maximum number of images per forward pass.
+            max_wait_ms (float): The maximum time to wait for other requests
+                before running a forward pass, in milliseconds.
+            cache (EmbeddingCache, optional): The cache of the features of the
+                already seen images.
+            decode_processes (int): The number of processes decoding the images,
+                0 to decode them in the threads of the server.
+        """
+
+        self.model = model
+        self.cache = cache
+        self.preprocessor = Preprocessor(model.preprocessing)
+        self.decoder = (
+            DecoderPool(model.preprocessing, decode_processes)
+            if decode_processes > 0
+            else None
+        )
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self.requests: "queue.Queue[Optional[_Request]]" = queue.Queue()
+
+        self.lock = threading.Lock()
+        self.batch_sizes: Counter = Counter()
+
+        self.worker = threading.Thread(
+            target=self._work,
+            name="extractor",
+            daemon=True,
+        )
+        self.worker.start()
+
+    def extract(self, inputs: torch.Tensor) -> np.ndarray:
+        """
+        Extract the features of a batch of images.
+
+        Args:
+            inputs (torch.Tensor): The images of shape (N, C, H, W), either
+                decoded as uint8 by the preprocessor or already normalised.
+
+        Returns:
+            np.ndarray: The features of shape (N, n_features).
+        """
+
+        future: "Future[np.ndarray]" = Future()
+        self.requests.put(_Request(inputs, future))
+
+        return future.result()
+
+    def _collect(
+        self,
+        first: _Request,
+    ) -> Tuple[List[_Request], Optional[_Request]]:
+        """
+        Collect the requests to run in the same forward pass.
+
+        Args:
+            first (_Request): The oldest waiting request.
+
+        Returns:
+            Tuple[List[_Request], Optional[_Request]]: The requests of the
+                micro-batch and the request left for the next one.
+        """
+
+        batch = [first]
+        size = first.inputs.shape[0]
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            if request is None:
+                # Let the worker stop after this batch
+                self.requests.put(None)
+                break
+
+            if size + request.inputs.shape[0] > self.max_batch_size:
+                return batch, request
+
+            batch.append(request)
+            size += request.inputs.shape[0]
+
+        return batch, None
+
+    def _work(self) -> None:
+        """Run the forward passes of the waiting requests."""
+
+        carry: Optional[_Request] = None
+        while True:
+            first = carry if carry is not None else self.requests.get()
+            if first is None:
+                return
+
+            batch, carry = self._collect(first)
+
+            try:
+                inputs = torch.cat([request.inputs for request in batch])
+                outputs = run_inference(self.model, self._normalize(inputs))
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            with self.lock:
+                self.batch_sizes[inputs.shape[0]] += 1
+
+            start = 0
+            for request in batch:
+                end = start + request.inputs.shape[0]
+                request.future.set_result(outputs[start:end])
+                start = end
+
+    def _normalize(self, inputs: torch.Tensor) -> torch.Tensor:
+        """
+        Normalise the decoded images on the device of the model.
+
+        Args:
+            inputs (torch.Tensor): The images of shape (N, C, H, W).
+
+        Returns:
+            torch.Tensor: The normalised images.
+        """
+
+        if inputs.dtype != torch.uint8:
+            return inputs
+
+        # Transfer the compact uint8 images rather than the float ones
+        inputs = inputs.to(self.model.device, non_blocking=True)
+
+        return self.preprocessor.normalize(inputs)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the achieved batch sizes.
+
+        Returns:
+            Dict[str, Any]: The number of forward passes and images, the mean
+                batch size and the number of forward passes per batch size.
+        """
+
+        with self.lock:
+            batches = sum(self.batch_sizes.values())
+            images = sum(size * count for size, count in self.batch_sizes.items())
+
+            return {
+                "batches": batches,
+                "images": images,
+                "mean_batch_size": images / batches if batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            }
+
+    def close(self) -> None:
+        """Stop the worker once the waiting requests are processed."""
+
+        self.requests.put(None)
+        self.worker.join()
+
+        if self.decoder is not None:
+            self.decoder.close()
@@ -5,11 +5,18 @@ import torch
 from torch.nn.functional import normalize
 
 from cbir.models.model import Model
+from cbir.models.preprocessing import PreprocessingConfig
 
 
 class HOptimus(Model):
     """H-optimus-0 model"""
 
+    preprocessing = PreprocessingConfig(
+        mean=(0.707223, 0.578729, 0.703617),
+        std=(0.211883, 0.230117, 0.177517),
+        interpolation="bicubic",
+    )
+
     def __init__(
         self,
         n_features: int = 1536,
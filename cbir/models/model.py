@@ -15,14 +15,36 @@
 """Deep learning base model"""
 
 from abc import ABCMeta
+from dataclasses import dataclass
+from typing import Literal
 
 import torch
 from torch import nn
 
+from cbir.models.preprocessing import PreprocessingConfig
+
+Precision = Literal["auto", "fp32", "fp16", "bf16", "int8"]
+
+
+@dataclass(frozen=True)
+class InferenceOptions:
+    """Numerical precision and optimisations of the forward passes."""
+
+    # Floating point autocast or int8 dynamic quantization, "auto" for the
+    # default precision of the model on its device
+    precision: Precision = "auto"
+    # Store the activations of the convolutional networks as NHWC
+    channels_last: bool = False
+    # Compile the network with torch.compile
+    compile: bool = False
+
 
 class Model(nn.Module, metaclass=ABCMeta):
     """Base model"""
 
+    # Input expected by the model, built once per extractor
+    preprocessing = PreprocessingConfig()
+
     def __init__(
         self,
         n_features: int,
@@ -32,3 +54,4 @@ class Model(nn.Module, metaclass=ABCMeta):
 
         self.n_features = n_features
         self.device = device
+        self.inference = InferenceOptions()
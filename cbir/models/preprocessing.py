@@ -0,0 +1,104 @@
+"""Preprocessing of the images into the inputs of the models."""
+
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Literal, Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+Interpolation = Literal["nearest", "bilinear", "bicubic", "lanczos"]
+
+
+@dataclass(frozen=True)
+class PreprocessingConfig:
+    """Input expected by a model."""
+
+    # Height and width of the input images
+    size: Tuple[int, int] = (224, 224)
+    # Mean and standard deviation of each channel, in [0, 1]
+    mean: Tuple[float, float, float] = IMAGENET_MEAN
+    std: Tuple[float, float, float] = IMAGENET_STD
+    # Resampling filter used to resize the images
+    interpolation: Interpolation = "bilinear"
+    # Data type of the normalised images
+    dtype: torch.dtype = torch.float32
+
+
+class Preprocessor:
+    """Decode the images at the input size and normalise them by batches."""
+
+    def __init__(self, config: Optional[PreprocessingConfig] = None) -> None:
+        """
+        Preprocessor initialisation.
+
+        Args:
+            config (PreprocessingConfig, optional): The input expected by the
+                model, the ImageNet one at 224x224 by default.
+        """
+
+        self.config = config or PreprocessingConfig()
+        self.resample = Image.Resampling[self.config.interpolation.upper()]
+
+        # (x / 255 - mean) / std folded into a single multiply-add
+        std = torch.tensor(self.config.std, dtype=torch.float32).view(1, -1, 1, 1)
+        mean = torch.tensor(self.config.mean, dtype=torch.float32).view(1, -1, 1, 1)
+        self.scale = 1 / (255 * std)
+        self.shift = -mean / std
+
+    def decode_pixels(self, image: bytes) -> np.ndarray:
+        """
+        Decode an image and resize it to the input size of the model.
+
+        Args:
+            image (bytes): The encoded image.
+
+        Returns:
+            np.ndarray: The uint8 pixels of shape (height, width, 3).
+        """
+
+        height, width = self.config.size
+
+        with Image.open(BytesIO(image)) as file:
+            # Let the JPEG decoder downscale in the DCT domain, up to 8 times
+            file.draft("RGB", (width, height))
+
+            decoded = file if file.mode == "RGB" else file.convert("RGB")
+            if decoded.size != (width, height):
+                decoded = decoded.resize((width, height), self.resample)
+
+            return np.array(decoded)
+
+    def decode(self, image: bytes) -> torch.Tensor:
+        """
+        Decode an image into the uint8 input of the model.
+
+        Args:
+            image (bytes): The encoded image.
+
+        Returns:
+            torch.Tensor: The uint8 image tensor of shape (3, height, width).
+        """
+
+        return torch.from_numpy(self.decode_pixels(image)).permute(2, 0, 1)
+
+    def normalize(self, inputs: torch.Tensor) -> torch.Tensor:
+        """
+        Normalise a batch of decoded images, on the device of the batch.
+
+        Args:
+            inputs (torch.Tensor): The uint8 images of shape (N, 3, height, width).
+
+        Returns:
+            torch.Tensor: The normalised images of the same shape, in the data
+                type expected by the model.
+        """
+
+        scale = self.scale.to(inputs.device)
+        shift = self.shift.to(inputs.device)
+
+        return torch.addcmul(shift, inputs.float(), scale).to(self.config.dtype)
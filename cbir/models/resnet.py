@@ -20,11 +20,14 @@ from torch.nn.functional import normalize
 from torchvision.models import resnet50
 
 from cbir.models.model import Model
+from cbir.models.preprocessing import PreprocessingConfig
 
 
 class Resnet(Model):
     """Resnet50 model"""
 
+    preprocessing = PreprocessingConfig(size=(224, 224), interpolation="bilinear")
+
     def __init__(
         self,
         n_features: int = 128,
@@ -1,13 +1,17 @@
 """Utilities functions for the model."""
 
+import hashlib
 import os
 from contextlib import nullcontext
+from dataclasses import replace
+from typing import ContextManager, List, cast
 
+import numpy as np
 import torch
 
 from cbir.config import Settings
 from cbir.models.hoptimus import HOptimus
-from cbir.models.model import Model
+from cbir.models.model import InferenceOptions, Model, Precision
 from cbir.models.resnet import Resnet
 
 
@@ -25,61 +29,180 @@ def get_model_class(name: str) -> type[Model]:
         raise ValueError(f"Model {name} not found.") from exception
 
 
-def load_model(settings: Settings) -> Model:
-    """Load the model given by the settings."""
+def get_weights(settings: Settings) -> List[str]:
+    """Get the paths of the weights loaded into the model, in order."""
 
-    model_class = get_model_class(settings.extractor)
-    model = model_class(device=settings.device)
+    weights = []
 
     # Load the default weights
     if settings.extractor == "resnet":
-        state = torch.load("/app/weights/resnet", map_location=settings.device)
-        model.load_state_dict(state, strict=True)
+        weights.append("/app/weights/resnet")
 
     # Load the custom weights if provided
     if os.path.exists(settings.weights):
-        state = torch.load(settings.weights, map_location=settings.device)
+        weights.append(settings.weights)
+
+    return weights
+
+
+def get_fingerprint(settings: Settings) -> str:
+    """Get a fingerprint of the model, its inputs and its weights, without reading them."""
+
+    fingerprint = hashlib.sha256(settings.extractor.encode("utf-8"))
+    preprocessing = get_model_class(settings.extractor).preprocessing
+    fingerprint.update(repr(preprocessing).encode("utf-8"))
+    fingerprint.update(f"{settings.precision}:{settings.device.type}".encode("utf-8"))
+    for path in get_weights(settings):
+        stat = os.stat(path)
+        fingerprint.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+
+    return fingerprint.hexdigest()
+
+
+def load_model(settings: Settings) -> Model:
+    """Load the model given by the settings."""
+
+    model_class = get_model_class(settings.extractor)
+    model = model_class(device=settings.device)
+
+    for path in get_weights(settings):
+        state = torch.load(path, map_location=settings.device)
         model.load_state_dict(state, strict=True)
 
     model.to(settings.device)
 
+    options = InferenceOptions(
+        precision=settings.precision,
+        channels_last=settings.channels_last,
+        compile=settings.compile_model,
+    )
+
+    return optimize_model(model, options)
+
+
+def resolve_precision(model: Model, precision: Precision) -> Precision:
+    """
+    Resolve the precision of the forward passes of a model on its device.
+
+    Args:
+        model (Model): The model, on its device.
+        precision (Precision): The requested precision.
+
+    Returns:
+        Precision: The precision, "auto" being fp16 for H-Optimus on GPU and
+            fp32 otherwise.
+    """
+
+    cuda = model.device.type == "cuda"
+
+    if precision == "auto":
+        return "fp16" if isinstance(model, HOptimus) and cuda else "fp32"
+
+    if precision == "fp16" and not cuda:
+        raise ValueError("fp16 inference requires a GPU, use bf16 on CPU.")
+
+    if precision == "int8" and cuda:
+        raise ValueError("int8 dynamic quantization is only supported on CPU.")
+
+    return precision
+
+
+def optimize_model(model: Model, options: InferenceOptions) -> Model:
+    """
+    Apply the inference options to a model on its device.
+
+    Args:
+        model (Model): The model, on its device.
+        options (InferenceOptions): The precision and the optimisations.
+
+    Returns:
+        Model: The optimised model.
+    """
+
+    precision = resolve_precision(model, options.precision)
+
+    if precision == "int8":
+        model = torch.ao.quantization.quantize_dynamic(  # type: ignore[no-untyped-call]
+            model,
+            {torch.nn.Linear},
+            dtype=torch.qint8,
+            inplace=True,
+        )
+
+    if options.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+    # Compile the network only, the wrapper keeps its attributes
+    if options.compile:
+        network = cast(torch.nn.Module, model.model)
+        model.model = cast(torch.nn.Module, torch.compile(network))
+
+    model.inference = replace(options, precision=precision)
+
     return model
 
 
-def resnet_forward(model: Model, inputs: torch.Tensor) -> torch.Tensor:
-    """Forward pass for Resnet model."""
+def autocast(model: Model) -> ContextManager:
+    """
+    Get the autocast context of the floating point precision of a model.
 
-    with torch.no_grad():
-        outputs = model(inputs)
+    Args:
+        model (Model): The optimised model.
 
-    return outputs.cpu().numpy()
+    Returns:
+        ContextManager: The autocast context, or a null one in fp32 and int8.
+    """
 
+    dtypes = {"fp16": torch.float16, "bf16": torch.bfloat16}
 
-def hoptim_forward(model: Model, inputs: torch.Tensor) -> torch.Tensor:
-    """Forward pass for H-Optimus model."""
+    dtype = dtypes.get(model.inference.precision)
+    if dtype is None:
+        return nullcontext()
 
-    amp_context = (
-        torch.autocast(device_type="cuda", dtype=torch.float16)
-        if model.device.type == "cuda"
-        else nullcontext()
-    )
+    return torch.autocast(device_type=model.device.type, dtype=dtype)
+
+
+def run_inference(model: Model, inputs: torch.Tensor) -> np.ndarray:
+    """Run inference on the model with the given inputs."""
+
+    if model.inference.channels_last:
+        inputs = inputs.contiguous(memory_format=torch.channels_last)
 
-    with amp_context, torch.inference_mode():
+    with autocast(model), torch.inference_mode():
         outputs = model(inputs)
 
-    return outputs.cpu().numpy()
+    return outputs.float().cpu().numpy()
 
 
-def run_inference(model: Model, inputs: torch.Tensor) -> torch.Tensor:
-    """Run inference on the model with the given inputs."""
+def recall_at_k(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    """
+    Measure how well reduced precision features preserve the nearest neighbours.
 
-    forwards = {
-        HOptimus: hoptim_forward,
-        Resnet: resnet_forward,
-    }
+    Args:
+        reference (np.ndarray): The full precision features of shape (N, d).
+        candidate (np.ndarray): The features of the same images in the reduced
+            precision.
+        k (int): The number of neighbours of each image.
+
+    Returns:
+        float: The mean fraction of the k nearest neighbours of each image
+            among the reference features found among the candidate features.
+    """
+
+    k = min(k, reference.shape[0] - 1)
+    if k <= 0:
+        return 1.0
+
+    def neighbours(features: np.ndarray) -> np.ndarray:
+        features = features.astype("float32")
+        squares = (features**2).sum(axis=1)
+        distances = squares[:, None] + squares[None, :] - 2 * features @ features.T
+        np.fill_diagonal(distances, np.inf)
+        return np.argsort(distances, axis=1)[:, :k]
+
+    expected = neighbours(reference)
+    found = neighbours(candidate)
 
-    extractor = type(model)
-    if extractor not in forwards:
-        raise ValueError(f"Unsupported extractor: {extractor}")
+    hits = sum(len(set(a) & set(b)) for a, b in zip(expected, found))
 
-    return forwards[extractor](model, inputs)
+    return hits / (k * reference.shape[0])
@@ -0,0 +1,85 @@
+"""Reading of image archives."""
+
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, Iterator, Tuple
+
+from PIL import Image
+
+
+def is_image(filename: str) -> bool:
+    """
+    Check whether a filename has an image extension.
+
+    Args:
+        filename (str): The name of the file.
+
+    Returns:
+        bool: True if the file extension is supported by Pillow.
+    """
+
+    basename = os.path.basename(filename)
+    extension = os.path.splitext(basename)[1].lower()
+
+    return not basename.startswith(".") and extension in Image.registered_extensions()
+
+
+def is_archive(file: BinaryIO) -> bool:
+    """
+    Check whether a file is a zip or a tar archive.
+
+    Args:
+        file (BinaryIO): The file object, left at its initial position.
+
+    Returns:
+        bool: True if the file is a supported archive.
+    """
+
+    position = file.tell()
+    try:
+        if zipfile.is_zipfile(file):
+            return True
+
+        file.seek(position)
+        return tarfile.is_tarfile(file)
+    finally:
+        file.seek(position)
+
+
+def read_archive(file: BinaryIO, start: int = 0) -> Iterator[Tuple[str, bytes]]:
+    """
+    Read the images of a zip or a tar archive.
+
+    Args:
+        file (BinaryIO): The archive file object.
+        start (int): The number of images to skip without reading them.
+
+    Yields:
+        Tuple[str, bytes]: The path of the image in the archive and its content.
+    """
+
+    position = 0
+
+    if zipfile.is_zipfile(file):
+        file.seek(0)
+        with zipfile.ZipFile(file) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_image(info.filename):
+                    continue
+
+                position += 1
+                if position > start:
+                    yield info.filename, archive.read(info)
+        return
+
+    file.seek(0)
+    with tarfile.open(fileobj=file, mode="r:*") as archive:
+        for member in archive:
+            if not member.isfile() or not is_image(member.name):
+                continue
+
+            position += 1
+            content = archive.extractfile(member) if position > start else None
+            if content is not None:
+                yield member.name, content.read()
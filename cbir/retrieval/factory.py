@@ -0,0 +1,575 @@
+"""Creation of the FAISS indexes given their configuration."""
+
+import math
+import os
+from typing import Literal, Optional
+
+import faiss
+import numpy as np
+from pydantic import BaseModel, Field
+
+IndexType = Literal["flat", "hnsw", "ivf_flat", "ivf_pq", "sq8", "fp16", "pq"]
+Metric = Literal["l2", "ip", "cosine"]
+
+# Flat indexes storing compressed codes instead of the float32 vectors
+CODECS = {"sq8": "SQ8", "fp16": "SQfp16"}
+
+# The searches restricted by an ID selector appeared in FAISS 1.7.3, the
+# results of the older builds are filtered afterwards
+SELECTORS = all(
+    hasattr(faiss, name)
+    for name in (
+        "IDSelectorBitmap",
+        "IDSelectorNot",
+        "SearchParameters",
+        "SearchParametersIVF",
+        "SearchParametersHNSW",
+    )
+)
+
+
+class IndexConfig(BaseModel):
+    """Type and parameters of an index."""
+
+    type: IndexType = "flat"
+
+    # Squared L2 distance, inner product, or inner product of the normalised
+    # vectors, the indexes created by older versions use the L2 distance
+    metric: Metric = "l2"
+
+    # Inverted file indexes
+    nlist: int = Field(default=1024, gt=0)
+    nprobe: int = Field(default=16, gt=0)
+
+    # Product quantization
+    pq_m: int = Field(default=16, gt=0)
+    pq_bits: int = Field(default=8, gt=0, le=16)
+    opq: bool = False
+
+    # Hierarchical navigable small world graphs
+    m: int = Field(default=32, gt=0)
+    ef_construction: int = Field(default=40, gt=0)
+    ef_search: int = Field(default=64, gt=0)
+
+    # Number of vectors required to train the index, 0 for the default
+    train_size: int = Field(default=0, ge=0)
+
+    # Re-rank refine * k candidates with the full precision vectors kept on
+    # disk, 0 to disable
+    refine: int = Field(default=0, ge=0)
+
+    @property
+    def similarity(self) -> bool:
+        """Whether the scores are similarities, higher for closer vectors."""
+
+        return self.metric != "l2"
+
+    @property
+    def faiss_metric(self) -> int:
+        """The FAISS metric type of the index."""
+
+        return faiss.METRIC_L2 if self.metric == "l2" else faiss.METRIC_INNER_PRODUCT
+
+    @property
+    def inverted(self) -> bool:
+        """Whether the index is an inverted file index."""
+
+        return self.type in ("ivf_flat", "ivf_pq")
+
+    @property
+    def trainable(self) -> bool:
+        """Whether the index must be trained before use."""
+
+        return self.inverted or self.type in ("sq8", "pq")
+
+    @property
+    def removable(self) -> bool:
+        """Whether vectors can be removed from the index, HNSW graphs can not."""
+
+        return self.type != "hnsw"
+
+    @property
+    def min_train_size(self) -> int:
+        """The number of vectors required to train the index."""
+
+        if self.type == "sq8":
+            # The scalar quantizer only estimates the range of each feature
+            return self.train_size or 1000
+
+        # K-means needs at least one training point per centroid
+        centroids = self.nlist if self.inverted else 1
+        if self.type in ("ivf_pq", "pq"):
+            centroids = max(centroids, 2**self.pq_bits, 256 if self.opq else 0)
+
+        if self.train_size > 0:
+            return max(self.train_size, centroids)
+
+        # Faiss recommends at least 39 training points per centroid
+        return 39 * centroids
+
+    @property
+    def max_train_size(self) -> int:
+        """The number of vectors sampled to train the index."""
+
+        return max(self.min_train_size, 256 * self.nlist)
+
+    @classmethod
+    def read(cls, path: str) -> "IndexConfig":
+        """
+        Read the configuration of an index.
+
+        Args:
+            path (str): The path to the configuration file.
+
+        Returns:
+            IndexConfig: The configuration, or the default one if the file does
+                not exist.
+        """
+
+        if not os.path.isfile(path):
+            return cls()
+
+        with open(path, "r", encoding="utf-8") as file:
+            return cls.model_validate_json(file.read())
+
+    def write(self, path: str) -> None:
+        """
+        Write the configuration of an index.
+
+        Args:
+            path (str): The path to the configuration file.
+        """
+
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.model_dump_json(indent=2))
+
+
+def suggest_nlist(size: int) -> int:
+    """
+    Suggest the number of inverted lists for a given number of vectors.
+
+    Args:
+        size (int): The number of vectors in the index.
+
+    Returns:
+        int: A power of two close to 4 * sqrt(size), with enough vectors to
+            train the coarse quantizer.
+    """
+
+    nlist = max(1, min(4 * math.isqrt(size), size // 39))
+    return 1 << (nlist.bit_length() - 1)
+
+
+def promote_config(
+    index_type: IndexType,
+    size: int,
+    metric: Metric = "l2",
+) -> Optional[IndexConfig]:
+    """
+    Get the configuration of the index replacing a flat index which has grown.
+
+    Args:
+        index_type (IndexType): The type of the index to promote to.
+        size (int): The number of vectors in the flat index.
+        metric (Metric): The metric of the flat index, kept by the promoted one.
+
+    Returns:
+        Optional[IndexConfig]: The configuration of the promoted index, or None
+            if there are not enough vectors to train it.
+    """
+
+    config = IndexConfig(type=index_type, metric=metric, nlist=suggest_nlist(size))
+    config.nprobe = min(config.nprobe, config.nlist)
+
+    return config if size >= config.min_train_size else None
+
+
+def create_index(config: IndexConfig, n_features: int) -> faiss.Index:
+    """
+    Create an empty index.
+
+    Flat, compressed and HNSW indexes are wrapped into an ID map while inverted
+    file indexes store the IDs natively.
+
+    Args:
+        config (IndexConfig): The configuration of the index.
+        n_features (int): Number of features in the index.
+
+    Returns:
+        faiss.Index: The empty, possibly untrained, index.
+    """
+
+    metric = config.faiss_metric
+
+    # The second version of the ID map keeps a reverse map to reconstruct by ID
+    if config.type == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlat(n_features, metric))
+
+    if config.type == "hnsw":
+        index = faiss.IndexHNSWFlat(n_features, config.m, metric)
+        index.hnsw.efConstruction = config.ef_construction
+        return faiss.IndexIDMap2(index)
+
+    if config.type in CODECS:
+        description = f"IDMap2,{CODECS[config.type]}"
+        return faiss.index_factory(n_features, description, metric)
+
+    if config.type == "ivf_flat":
+        return faiss.index_factory(n_features, f"IVF{config.nlist},Flat", metric)
+
+    if n_features % config.pq_m != 0:
+        raise ValueError(
+            f"The number of features ({n_features}) must be a multiple of "
+            f"the number of sub-quantizers ({config.pq_m})."
+        )
+
+    description = f"PQ{config.pq_m}x{config.pq_bits}"
+    if config.type == "pq":
+        return faiss.index_factory(n_features, f"IDMap2,{description}", metric)
+
+    description = f"IVF{config.nlist},{description}"
+    if config.opq:
+        description = f"OPQ{config.pq_m},{description}"
+
+    return faiss.index_factory(n_features, description, metric)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Normalise vectors to unit L2 norm, for the cosine indexes.
+
+    Args:
+        vectors (np.ndarray): The vectors of shape (N, n_features).
+
+    Returns:
+        np.ndarray: A normalised float32 copy of the vectors.
+    """
+
+    normalized = np.array(vectors, dtype="float32", order="C")
+    faiss.normalize_L2(normalized)
+
+    return normalized
+
+
+def read_index(path: str, mmap: bool = False) -> faiss.Index:
+    """
+    Read an index file.
+
+    Args:
+        path (str): The path to the index file.
+        mmap (bool): Whether to map the vectors of the index read-only instead
+            of copying them, so that the processes share the page cache.
+
+    Returns:
+        faiss.Index: The index, immutable if memory-mapped.
+    """
+
+    if not mmap:
+        return faiss.read_index(path)
+
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+
+    # Flat codes can only be mapped by recent FAISS versions, and this flag
+    # is not supported by the inverted lists
+    flat_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    if flat_flag:
+        try:
+            return faiss.read_index(path, flags | flat_flag)
+        except RuntimeError:
+            pass
+
+    return faiss.read_index(path, flags)
+
+
+def train_index(
+    config: IndexConfig,
+    vectors: np.ndarray,
+    ids: np.ndarray,
+) -> faiss.Index:
+    """
+    Create an index, train it on a sample of the given vectors and add them.
+
+    Args:
+        config (IndexConfig): The configuration of the index.
+        vectors (np.ndarray): The vectors to add to the index.
+        ids (np.ndarray): The IDs of the vectors.
+
+    Returns:
+        faiss.Index: The trained index containing the vectors.
+    """
+
+    index = create_index(config, vectors.shape[1])
+
+    size = min(vectors.shape[0], config.max_train_size)
+    sample = np.random.default_rng().choice(vectors.shape[0], size, replace=False)
+    index.train(vectors[np.sort(sample)])
+    index.add_with_ids(vectors, ids)
+
+    return index
+
+
+def tune_index(index: faiss.Index, config: IndexConfig) -> None:
+    """
+    Apply the search parameters of the configuration to a built CPU index.
+
+    Args:
+        index (faiss.Index): The index, trained if the configuration requires it.
+        config (IndexConfig): The configuration of the index.
+    """
+
+    space = faiss.ParameterSpace()
+
+    if config.inverted:
+        space.set_index_parameter(index, "nprobe", config.nprobe)
+    elif config.type == "hnsw":
+        space.set_index_parameter(index, "efSearch", config.ef_search)
+
+
+def exclude_ids(ids: np.ndarray) -> Optional[faiss.IDSelector]:
+    """
+    Create a selector excluding the given IDs from the searches.
+
+    Args:
+        ids (np.ndarray): The IDs to be excluded.
+
+    Returns:
+        Optional[faiss.IDSelector]: The selector of all the other IDs, or None
+            if the FAISS build does not support selectors.
+    """
+
+    if not SELECTORS:
+        return None
+
+    # The Python wrappers take the array and keep a reference to it
+    batch = faiss.IDSelectorBatch(ids)  # pylint: disable=no-value-for-parameter
+
+    return faiss.IDSelectorNot(batch)
+
+
+def include_ids(ids: np.ndarray) -> Optional[faiss.IDSelector]:
+    """
+    Create a selector restricting the searches to the given IDs.
+
+    Args:
+        ids (np.ndarray): The sorted IDs to be searched.
+
+    Returns:
+        Optional[faiss.IDSelector]: A bitmap over the range of the IDs if they
+            are dense, or a hash set of the IDs, None if the FAISS build does
+            not support selectors.
+    """
+
+    if not SELECTORS:
+        return None
+
+    size = int(ids[-1]) + 1 if ids.shape[0] > 0 else 0
+
+    # A bit per possible ID against a hash set entry per ID
+    if ids.shape[0] * 64 < size:
+        return faiss.IDSelectorBatch(ids)  # pylint: disable=no-value-for-parameter
+
+    mask = np.zeros(size, dtype=bool)
+    mask[ids] = True
+
+    bitmap = np.packbits(mask, bitorder="little")
+
+    return faiss.IDSelectorBitmap(bitmap)  # pylint: disable=no-value-for-parameter
+
+
+def search_parameters(
+    config: IndexConfig,
+    selector: faiss.IDSelector,
+) -> faiss.SearchParameters:
+    """
+    Get the search parameters of a built index restricted to some IDs.
+
+    Args:
+        config (IndexConfig): The configuration of the index.
+        selector (faiss.IDSelector): The selector of the IDs to search.
+
+    Returns:
+        faiss.SearchParameters: The parameters, of the type expected by the
+            index, overriding the ones applied by tune_index.
+    """
+
+    params: faiss.SearchParameters
+    if config.inverted:
+        params = faiss.SearchParametersIVF()
+        params.nprobe = config.nprobe
+    elif config.type == "hnsw":
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = config.ef_search
+    else:
+        params = faiss.SearchParameters()
+
+    params.sel = selector
+
+    return params
+
+
+def remove_ids(index: faiss.Index, ids: np.ndarray) -> None:
+    """
+    Remove the given IDs from a CPU index.
+
+    Args:
+        index (faiss.Index): The CPU index.
+        ids (np.ndarray): The IDs to be removed.
+    """
+
+    ivf = get_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.Hashtable:
+        # The direct map only supports removing an explicit array of IDs
+        selector: faiss.IDSelector = faiss.IDSelectorArray(
+            ids.shape[0], faiss.swig_ptr(ids)
+        )
+    else:
+        selector = faiss.IDSelectorBatch(ids.shape[0], faiss.swig_ptr(ids))
+
+    index.remove_ids(selector)
+
+
+def reconstruct(index: faiss.Index, label: int) -> Optional[np.ndarray]:
+    """
+    Get the vector stored for an ID in a CPU index.
+
+    Args:
+        index (faiss.Index): The CPU index, with a direct map if it is an
+            inverted file index.
+        label (int): The ID of the vector.
+
+    Returns:
+        Optional[np.ndarray]: The vector of shape (n_features,), approximated by
+            quantized indexes, or None if the ID is not in the index.
+    """
+
+    ivf = get_ivf(index)
+    if ivf is None and not isinstance(index, faiss.IndexIDMap2):
+        # The ID maps created by older versions have no reverse map
+        positions = np.flatnonzero(faiss.vector_to_array(index.id_map) == label)
+        if positions.shape[0] == 0:
+            return None
+        return faiss.downcast_index(index.index).reconstruct(int(positions[0]))
+
+    try:
+        return index.reconstruct(label)
+    except RuntimeError:
+        return None
+
+
+def add_direct_map(index: faiss.Index) -> None:
+    """
+    Let an inverted file index reconstruct its vectors by ID.
+
+    The map is then maintained along with the index and saved with it.
+
+    Args:
+        index (faiss.Index): The CPU index.
+    """
+
+    ivf = get_ivf(index)
+    if ivf is not None and ivf.direct_map.no():
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+def get_ivf(index: faiss.Index) -> Optional[faiss.IndexIVF]:
+    """
+    Get the inverted file index of an index, if any.
+
+    Args:
+        index (faiss.Index): The index, possibly wrapping an inverted file index.
+
+    Returns:
+        Optional[faiss.IndexIVF]: The inverted file index or None.
+    """
+
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def is_trained(index: faiss.Index, config: IndexConfig) -> bool:
+    """
+    Check whether a CPU index is the configured one, or still the flat index
+    collecting the vectors until it can be trained.
+
+    Args:
+        index (faiss.Index): The CPU index.
+        config (IndexConfig): The configuration of the index.
+
+    Returns:
+        bool: True if the index does not need to be trained anymore.
+    """
+
+    if not config.trainable:
+        return True
+
+    if config.inverted:
+        return get_ivf(index) is not None
+
+    inner = faiss.downcast_index(getattr(index, "index", index))
+    return not isinstance(inner, faiss.IndexFlat)
+
+
+def get_ids(index: faiss.Index) -> np.ndarray:
+    """
+    Get the IDs of the vectors stored in a CPU index.
+
+    Args:
+        index (faiss.Index): The CPU index.
+
+    Returns:
+        np.ndarray: The IDs of the stored vectors.
+    """
+
+    ivf = get_ivf(index)
+    if ivf is None:
+        return faiss.vector_to_array(index.id_map)
+
+    invlists = ivf.invlists
+    ids = [
+        faiss.rev_swig_ptr(invlists.get_ids(i), invlists.list_size(i)).copy()
+        for i in range(ivf.nlist)
+        if invlists.list_size(i) > 0
+    ]
+
+    return np.concatenate(ids) if ids else np.empty(0, dtype="int64")
+
+
+def get_vectors(index: faiss.Index) -> np.ndarray:
+    """
+    Get the vectors stored in a CPU flat or HNSW index wrapped into an ID map.
+
+    Args:
+        index (faiss.Index): The CPU flat or HNSW index.
+
+    Returns:
+        np.ndarray: The vectors in the order of the ID map.
+    """
+
+    return faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+
+
+def code_size(index: faiss.Index, n_features: int) -> int:
+    """
+    Get the approximate memory used per vector by an index.
+
+    Args:
+        index (faiss.Index): The index.
+        n_features (int): Number of features in the index.
+
+    Returns:
+        int: The number of bytes per vector, including its ID.
+    """
+
+    ivf = get_ivf(index)
+    if ivf is not None:
+        return ivf.code_size + 8
+
+    inner = faiss.downcast_index(getattr(index, "index", index))
+    size = getattr(inner, "code_size", n_features * 4) + 8
+    if isinstance(inner, faiss.IndexHNSW):
+        # Links of the base level of the graph
+        size += inner.hnsw.nb_neighbors(0) * 4
+
+    return size
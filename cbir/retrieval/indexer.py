@@ -1,23 +1,74 @@
 """Indexer class for indexing images and their features."""
 
 import os
-from typing import List, Tuple
+import time
+from dataclasses import dataclass
+from typing import ContextManager, List, Optional, Tuple
 
 import faiss
 import numpy as np
-import torch
 
+from cbir.retrieval.factory import (
+    IndexConfig,
+    IndexType,
+    add_direct_map,
+    code_size,
+    create_index,
+    exclude_ids,
+    get_ids,
+    get_vectors,
+    include_ids,
+    is_trained,
+    normalize,
+    promote_config,
+    read_index,
+    reconstruct,
+    remove_ids,
+    search_parameters,
+    train_index,
+    tune_index,
+)
+from cbir.retrieval.journal import ADD, REMOVE, MutationLog
+from cbir.retrieval.locks import SharedLock
+from cbir.retrieval.metadata import Condition, Metadata, MetadataStore
+from cbir.retrieval.vectors import VectorStore
 
-class Indexer:
+# Operation code, IDs and vectors of a mutation
+Mutation = Tuple[bytes, np.ndarray, Optional[np.ndarray]]
+
+
+@dataclass
+class IndexerOptions:
+    """Options shared by the indexers of a process."""
+
+    # Persist the index after this many mutations
+    flush_every: int = 1
+    # Persist the index when its oldest pending mutation is older (in seconds)
+    flush_interval: float = 0.0
+    # Sync the mutation log to the disk on every mutation
+    fsync: bool = True
+    # Promote the flat indexes reaching this many vectors, 0 to disable
+    promote_size: int = 0
+    # The type of the promoted indexes
+    promote_type: IndexType = "ivf_flat"
+    # Compact the indexes once this fraction of their vectors is removed, 0 to
+    # disable
+    compact_ratio: float = 0.1
+    # Map the index files read-only, for the search-only workers
+    mmap: bool = False
+
+
+class Indexer:  # pylint: disable=too-many-instance-attributes
     """Indexer class for indexing images and their features."""
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments
         self,
         data_path: str,
         storage_name: str,
         index_name: str,
         n_features: int,
         gpu: bool = False,
+        options: Optional[IndexerOptions] = None,
     ) -> None:
         """
         Indexer initialisation.
@@ -28,44 +79,587 @@ class Indexer:
             storage_name (str): The name of the storage.
             index_name (str): The name of the index.
             gpu (bool): Whether to use GPU for indexing or not.
+            options (IndexerOptions, optional): The persistence options.
         """
 
         self.n_features = n_features
         self.gpu = gpu
+        self.options = options or IndexerOptions()
+
+        # The GPU indexes are copies, only the CPU ones can share the file
+        self.read_only = self.options.mmap and not gpu
 
+        self.storage_name = storage_name
+        self.index_name = index_name
         self.index_path = os.path.join(data_path, storage_name, index_name)
+        self.config = IndexConfig.read(f"{self.index_path}.json")
+        self.index = self._create()
+        # The CPU index, kept along with the GPU copy used by the searches
+        self.cpu_index = self.index
+        self.resources = faiss.StandardGpuResources() if gpu else None
+        self.trained = False
+
+        # IDs removed from the searches but still stored until the compaction
+        self.tombstones = np.empty(0, dtype="int64")
+        self.selector: Optional[faiss.IDSelector] = None
+
+        # Full precision copy of the vectors, to re-rank the compressed indexes
+        self.vectors = VectorStore(f"{self.index_path}.vectors", n_features)
+        # Attributes of the images, to filter the searches
+        self.metadata = MetadataStore(f"{self.index_path}.metadata")
 
+        # Mutations applied in memory but not yet written to the index file
+        self.log = MutationLog(
+            f"{self.index_path}.log",
+            n_features,
+            self.options.fsync,
+        )
+        self.log_size = 0
+        self.pending = 0
+        self.pending_since = time.monotonic()
+        self.mtime: Optional[Tuple[int, int]] = None
+
+        # Guard the index against concurrent mutations, the searches share it
+        self.lock = SharedLock()
+
+        # Mutations to apply to the index being rebuilt, None if not rebuilding
+        self.backlog: Optional[List[Mutation]] = None
+
+        self.load()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        """
+        Get the modification times of the index file and of its tombstones.
+
+        Returns:
+            Optional[Tuple[int, int]]: The modification times in nanoseconds, 0
+                for missing tombstones, or None if the index file does not exist.
+        """
+
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        try:
+            return mtime, os.stat(f"{self.index_path}.tombstones").st_mtime_ns
+        except FileNotFoundError:
+            return mtime, 0
+
+    @property
+    def size(self) -> int:
+        """Number of images in the index, excluding the removed ones."""
+
+        return self.index.ntotal - self.tombstones.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint of the index in bytes."""
+
+        return self.index.ntotal * code_size(self.cpu_index, self.n_features)
+
+    def load(self) -> None:
+        """Load the index file and replay the mutations logged since its last save."""
+
+        with self.lock:
+            # A mapped index only sees the mutations once the writers save it
+            if self.read_only:
+                self._load()
+                return
+
+            with self.log.locked():
+                self._load()
+
+    def _load(self) -> None:
+        """Load the index file, holding the lock of the log unless read-only."""
+
+        self.config = IndexConfig.read(f"{self.index_path}.json")
+        self.mtime = self._stat()
         if os.path.isfile(self.index_path):
-            self.index = faiss.read_index(self.index_path)
+            self.index = read_index(self.index_path, self.read_only)
+        else:
+            self.index = self._create()
+        self._read_tombstones()
+
+        self.log_size = 0
+        self.pending = 0
+
+        if not self.read_only:
+            # The log may overlap the index file if a crash happened between
+            # writing the index and truncating the log
+            self._replay(get_ids(self.index))
+
+        self.trained = is_trained(self.index, self.config)
+        if not self.read_only and self._should_train():
+            self.index = train_index(self.config, *self._collect(self.index))
+            self._clear_tombstones()
+            self.trained = True
+
+        self._place()
+
+    def _sync(self) -> None:
+        """
+        Catch up with the other processes, holding the lock of the log.
+
+        Once another process has saved the index, the log no longer holds the
+        mutations this indexer has not replayed yet, the index file does.
+        """
+
+        if self._stat() != self.mtime:
+            self._load()
         else:
-            self.index = faiss.IndexFlatL2(n_features)
-            self.index = faiss.IndexIDMap(self.index)
+            self._replay()
+
+    def _create(self) -> faiss.Index:
+        """
+        Create an empty index.
+
+        Returns:
+            faiss.Index: The configured index, or a flat index collecting the
+                vectors until the configured index can be trained.
+        """
+
+        config = self.config
+        if config.trainable:
+            config = IndexConfig(metric=config.metric)
+
+        return create_index(config, self.n_features)
+
+    def _place(self) -> None:
+        """Apply the search parameters and move the index to the GPU if needed."""
+
+        if self.trained:
+            tune_index(self.index, self.config)
+            add_direct_map(self.index)
+
+        self.cpu_index = self.index
 
         if self.gpu:
-            self.resources = faiss.StandardGpuResources()
-            self.index = faiss.index_cpu_to_gpu(self.resources, 0, self.index)
+            try:
+                self.index = faiss.index_cpu_to_gpu(self.resources, 0, self.index)
+            except RuntimeError:
+                # Some index types, such as HNSW, are only supported on the CPU
+                self.gpu = False
+
+    def _should_train(self) -> bool:
+        """Check whether enough vectors were collected to train the index."""
+
+        return not self.trained and self.index.ntotal >= self.config.min_train_size
+
+    def train(self) -> None:
+        """Train the configured index on the vectors collected so far."""
+
+        with self.lock, self.log.locked():
+            self._sync()
+            if self.trained:
+                return
+
+            self.index = train_index(self.config, *self._collect(self.cpu_index))
+            self._clear_tombstones()
+            self.trained = True
+            self._place()
+
+            self.save()
+
+    def _should_compact(self) -> bool:
+        """Check whether enough images have been removed to compact the index."""
+
+        removed = self.tombstones.shape[0]
+        return (
+            removed > 0
+            and self.options.compact_ratio > 0
+            and removed >= self.options.compact_ratio * self.index.ntotal
+        )
+
+    def compact(self) -> None:
+        """
+        Remove the vectors of the removed images from the index, in one pass.
+
+        The HNSW indexes, whose graph does not support removals, are rebuilt
+        without them instead.
+        """
+
+        self._check_writable()
+
+        if not self.config.removable:
+            # The graph is rebuilt from the vectors of the remaining images
+            self.rebuild(self.config)
+            return
+
+        with self.lock, self.log.locked():
+            self._sync()
+            if self.tombstones.shape[0] == 0:
+                return
+
+            # The GPU indexes are updated through the CPU one moved back
+            remove_ids(self.cpu_index, self.tombstones)
+
+            self.index = self.cpu_index
+            self._clear_tombstones()
+            self._place()
+
+            self.save()
+
+    def _collect(self, index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the vectors of a flat or HNSW CPU index, without the removed ones.
+
+        Args:
+            index (faiss.Index): The CPU flat or HNSW index.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The vectors and their IDs.
+        """
+
+        vectors, ids = get_vectors(index), get_ids(index)
+
+        kept = ~np.isin(ids, self.tombstones)
+        return vectors[kept], ids[kept]
+
+    def maintain(self) -> bool:
+        """
+        Compact the index once enough images have been removed, and promote it
+        to the configured index type once it has grown.
+
+        Returns:
+            bool: True if the index has been compacted or rebuilt.
+        """
+
+        with self.lock:
+            if self.read_only or self.backlog is not None:
+                return False
+
+            compact = self._should_compact()
+            if not compact and (
+                self.config.type != "flat"
+                or self.options.promote_size <= 0
+                or self.index.ntotal < self.options.promote_size
+            ):
+                return False
+
+        # Outside of the lock, the searches go on while an index is rebuilt
+        if compact:
+            self.compact()
+            return True
+
+        config = promote_config(
+            self.options.promote_type,
+            self.index.ntotal,
+            self.config.metric,
+        )
+
+        return config is not None and self.rebuild(config)
+
+    def rebuild(self, config: IndexConfig) -> bool:
+        """
+        Build an index with a new configuration and swap it with the current one.
+
+        The index is trained off to the side, the searches and the mutations
+        keep using the current index until the new one has caught up.
+
+        Args:
+            config (IndexConfig): The configuration of the new index.
+
+        Returns:
+            bool: True if the new index replaced the current one, False if the
+                index file has been replaced by another process meanwhile.
+        """
+
+        self._check_writable()
+
+        with self.lock:
+            vectors, ids = self._collect(self.cpu_index)
+            self.backlog = []
+
+        try:
+            index = train_index(config, vectors, ids)
+            if config.refine > 0:
+                self.vectors.write(ids, vectors)
+        except BaseException:
+            with self.lock:
+                self.backlog = None
+            raise
+
+        with self.lock:
+            backlog, self.backlog = self.backlog, None
+
+            with self.log.locked():
+                stale = self._stat() != self.mtime
+                if not stale:
+                    removed = np.empty(0, dtype="int64")
+                    for operation, mutation_ids, added in backlog:
+                        if operation == REMOVE:
+                            removed = np.union1d(removed, mutation_ids)
+                        elif added is not None:
+                            index.add_with_ids(added, mutation_ids)
+                    if config.removable and removed.shape[0] > 0:
+                        remove_ids(index, removed)
+                        removed = np.empty(0, dtype="int64")
+
+                    # Write the configuration first, a flat index file is still
+                    # trained on load if a crash happens before saving the index
+                    config.write(f"{self.index_path}.json")
+
+                    self.config = config
+                    self.index = index
+                    self._clear_tombstones()
+                    self._remove_ids(removed)
+                    self.trained = True
+                    self._place()
+
+                    self._replay()
+                    self.save()
+
+            if stale:
+                # The other process rebuilt or saved the index, its file wins
+                self.load()
+
+        return not stale
+
+    def _replay(self, known: Optional[np.ndarray] = None) -> None:
+        """
+        Apply the logged mutations this indexer has not seen yet.
+
+        Args:
+            known (np.ndarray, optional): The IDs already present in the index.
+        """
+
+        if self.log.size() == self.log_size:
+            return
+
+        for mutation in self.log.read(self.log_size):
+            ids, vectors = mutation.ids, mutation.vectors
+            if vectors is not None and known is not None:
+                missing = ~np.isin(ids, known)
+                ids, vectors = ids[missing], vectors[missing]
+            if ids.shape[0] > 0:
+                self._apply(mutation.operation, ids, vectors)
+
+            self.log_size = mutation.end
+            self._pend()
+
+        # Drop a record partially written before a crash
+        if self.log.size() > self.log_size:
+            self.log.truncate(self.log_size)
+
+    def is_stale(self) -> bool:
+        """
+        Check whether the index has been modified on disk since it was loaded.
+
+        Returns:
+            bool: True if the in-memory index no longer matches the index file
+                and the mutation log.
+        """
+
+        if self.read_only:
+            return self._stat() != self.mtime
+
+        return self._stat() != self.mtime or self.log.size() != self.log_size
+
+    def refresh(self) -> None:
+        """Bring the in-memory index up to date with the other processes."""
+
+        if not self.is_stale():
+            return
+
+        with self.lock:
+            if self.read_only:
+                self.load()
+                return
+
+            with self.log.locked():
+                self._sync()
 
     def save(self) -> None:
-        """Save the index to a file."""
+        """Save the index to a file, holding the lock of the log."""
+
+        with self.lock:
+            # Write to a temporary file first to never leave a corrupted index
+            path = f"{self.index_path}.tmp"
+            faiss.write_index(self.cpu_index, path)
+            os.replace(path, self.index_path)
 
-        index = faiss.index_gpu_to_cpu(self.index) if self.gpu else self.index
-        faiss.write_index(index, self.index_path)
+            # Written after the index, stale tombstones only list missing IDs
+            self._write_tombstones()
 
-    def add(self, last_id: int, images: torch.Tensor) -> List[int]:
+            self.log.truncate()
+            self.log_size = 0
+            self.mtime = self._stat()
+            self.pending = 0
+
+    def _pend(self) -> None:
+        """Count a mutation waiting to be persisted."""
+
+        if self.pending == 0:
+            self.pending_since = time.monotonic()
+        self.pending += 1
+
+    def _expired(self) -> bool:
+        """Check whether the pending mutations have waited for too long."""
+
+        return (
+            self.pending > 0
+            and self.options.flush_interval > 0
+            and time.monotonic() - self.pending_since >= self.options.flush_interval
+        )
+
+    def flush(self, expired_only: bool = False) -> None:
+        """
+        Persist the pending mutations to the index file.
+
+        Args:
+            expired_only (bool): Whether to persist the index only if its pending
+                mutations exceeded the flush interval.
+        """
+
+        with self.lock:
+            if self.pending == 0 or (expired_only and not self._expired()):
+                return
+
+            self._persist()
+
+    def _persist(self) -> None:
+        """Write the index file, including the mutations of the other processes."""
+
+        with self.log.locked():
+            self._sync()
+            self.save()
+
+    def _commit(
+        self,
+        operation: bytes,
+        ids: np.ndarray,
+        vectors: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Apply a mutation and persist it according to the persistence options.
+
+        Args:
+            operation (bytes): The operation code of the mutation.
+            ids (np.ndarray): The IDs affected by the mutation.
+            vectors (np.ndarray, optional): The added vectors.
+        """
+
+        with self.log.locked():
+            # Apply the mutations of the other processes first
+            self._sync()
+            self._apply(operation, ids, vectors)
+
+            if self.options.flush_every <= 1:
+                self.save()
+                return
+
+            self.log_size = self.log.append(operation, ids, vectors)
+
+            self._pend()
+            if self.pending >= self.options.flush_every or self._expired():
+                self.save()
+
+    def _apply(
+        self,
+        operation: bytes,
+        ids: np.ndarray,
+        vectors: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Apply a mutation to the in-memory index.
+
+        Args:
+            operation (bytes): The operation code of the mutation.
+            ids (np.ndarray): The IDs affected by the mutation.
+            vectors (np.ndarray, optional): The added vectors.
+        """
+
+        if operation == REMOVE:
+            self._remove_ids(ids)
+        elif vectors is not None:
+            if self.config.refine > 0:
+                self.vectors.write(ids, vectors)
+            self.index.add_with_ids(vectors, ids)
+            if self.gpu:
+                self.cpu_index.add_with_ids(vectors, ids)
+
+        # Let the index being rebuilt catch up with the mutation
+        if self.backlog is not None:
+            self.backlog.append((operation, ids, vectors))
+
+    def _remove_ids(self, ids: np.ndarray) -> None:
+        """
+        Exclude the given IDs from the searches until the index is compacted.
+
+        Args:
+            ids (np.ndarray): The IDs to be removed.
+        """
+
+        self.tombstones = np.union1d(self.tombstones, ids).astype("int64")
+        self.selector = None
+
+    def _clear_tombstones(self) -> None:
+        """Forget the removed IDs, once they are no longer in the index."""
+
+        self.tombstones = np.empty(0, dtype="int64")
+        self.selector = None
+
+    def _read_tombstones(self) -> None:
+        """Read the IDs removed from the index file but not yet compacted."""
+
+        path = f"{self.index_path}.tombstones"
+        if os.path.isfile(path):
+            self.tombstones = np.fromfile(path, dtype="<i8").astype("int64")
+        else:
+            self.tombstones = np.empty(0, dtype="int64")
+        self.selector = None
+
+    def _write_tombstones(self) -> None:
+        """Write the IDs removed from the index file but not yet compacted."""
+
+        path = f"{self.index_path}.tombstones"
+        if self.tombstones.shape[0] == 0 and not os.path.isfile(path):
+            return
+
+        self.tombstones.astype("<i8").tofile(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def _check_writable(self) -> None:
+        """Raise an error if the index is mapped read-only."""
+
+        if self.read_only:
+            raise PermissionError(f"The index {self.index_name} is read-only.")
+
+    def add(
+        self,
+        last_id: int,
+        images: np.ndarray,
+        metadata: Optional[List[Metadata]] = None,
+    ) -> List[int]:
         """
         Index the given images in the index.
 
         Args:
             last_id (int): The last ID in the index.
-            images (torch.Tensor): The images to be indexed.
+            images (np.ndarray): The features of the images to be indexed, of
+                shape (N, n_features).
+            metadata (List[Metadata], optional): The attributes of each image.
 
         Returns:
             List[int]: A list of IDs of the indexed images.
         """
 
+        self._check_writable()
+
+        if self.config.metric == "cosine":
+            images = normalize(images)
+
         ids = np.arange(last_id, last_id + images.shape[0])
-        self.index.add_with_ids(images, ids)
-        self.save()
+
+        # Written first, the searches never see an image without its attributes
+        if metadata is not None:
+            self.metadata.write(ids, metadata)
+        with self.lock:
+            self._commit(ADD, ids, images)
+
+            if self._should_train():
+                self.train()
 
         return ids.tolist()
 
@@ -77,18 +671,63 @@ class Indexer:
             label (int): The ID of the image to be removed.
         """
 
-        id_selector = faiss.IDSelectorRange(label, label + 1)
+        self.remove_batch([label])
+
+    def remove_batch(self, labels: List[int]) -> None:
+        """
+        Remove several images from the given index at once.
+
+        The images are excluded from the searches right away, their vectors are
+        removed from the index by the next compaction.
+
+        Args:
+            labels (List[int]): The IDs of the images to be removed.
+        """
+
+        self._check_writable()
 
-        index = faiss.index_gpu_to_cpu(self.index) if self.gpu else self.index
-        index.remove_ids(id_selector)
+        ids = np.unique(np.array(labels, dtype="int64"))
+        ids = ids[ids >= 0]
+        if ids.shape[0] == 0:
+            return
 
-        self.save()
+        with self.lock:
+            self._commit(REMOVE, ids)
+
+    def reconstruct(self, label: int) -> Optional[np.ndarray]:
+        """
+        Get the features stored for an image.
+
+        Args:
+            label (int): The ID of the image.
+
+        Returns:
+            Optional[np.ndarray]: The features of shape (1, n_features), or None
+                if the image is not in the index.
+        """
+
+        with self._searching():
+            if label in self.tombstones:
+                return None
+
+            vector = reconstruct(self.cpu_index, label)
+
+        if vector is None:
+            return None
+
+        if self.config.refine > 0:
+            # Prefer the full precision vector to the quantized one
+            exact = self.vectors.read(np.array([label]))
+            if not np.isnan(exact).any():
+                return exact
+
+        return vector.reshape(1, -1)
 
     def search(
         self,
         image: np.ndarray,
         nrt_neigh: int,
-    ) -> Tuple[List[str], List[float]]:
+    ) -> Tuple[List[int], List[float]]:
         """
         Search similar images given a query image.
 
@@ -97,17 +736,175 @@ class Indexer:
             nrt_neigh (int): The number of nearest neighbours to search.
 
         Returns:
-            Tuple[List[str], List[float]]: the list of image IDs and their distances
+            Tuple[List[int], List[float]]: the list of image IDs and their distances,
+                or their similarities if the index uses the inner product
         """
 
-        distances, labels = self.index.search(image, nrt_neigh)
-        distances, labels = distances.squeeze().tolist(), labels.squeeze().tolist()
+        return self.search_batch(image, nrt_neigh)[0]
+
+    def _searching(self) -> ContextManager:
+        """
+        Hold the lock of the index for a search.
+
+        Returns:
+            ContextManager: The lock shared with the other searches, as FAISS
+                searches a CPU index from several threads, exclusive for a GPU
+                index.
+        """
+
+        return self.lock if self.gpu else self.lock.shared()
+
+    def search_batch(
+        self,
+        images: np.ndarray,
+        nrt_neigh: int,
+        conditions: Optional[List[Condition]] = None,
+    ) -> List[Tuple[List[int], List[float]]]:
+        """
+        Search similar images for several query images at once.
+
+        Args:
+            images (np.ndarray): The query images of shape (N, n_features).
+            nrt_neigh (int): The number of nearest neighbours to search.
+            conditions (List[Condition], optional): The conditions on the
+                attributes of the images to search.
+
+        Returns:
+            List[Tuple[List[int], List[float]]]: The image IDs and their distances,
+                or their similarities if the index uses the inner product, for
+                each query image.
+        """
+
+        if self.config.metric == "cosine":
+            images = normalize(images)
+
+        allowed = self.metadata.select(conditions) if conditions else None
+
+        refine = self.config.refine
+        with self._searching():
+            distances, labels = self._search(
+                images,
+                nrt_neigh * refine if refine > 0 else nrt_neigh,
+                allowed,
+            )
 
-        if nrt_neigh == 1:
-            distances = [distances]
-            labels = [labels]
+        if refine > 0:
+            distances, labels = self._refine(images, distances, labels, nrt_neigh)
+
+        results = []
+        for row_labels, row_distances in zip(labels.tolist(), distances.tolist()):
+            # Return only valid results
+            stop = row_labels.index(-1) if -1 in row_labels else len(row_labels)
+            results.append((row_labels[:stop], row_distances[:stop]))
+
+        return results
+
+    def _search(
+        self,
+        images: np.ndarray,
+        k: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the index, skipping the removed images.
+
+        Args:
+            images (np.ndarray): The query images of shape (N, n_features).
+            k (int): The number of nearest neighbours to search.
+            allowed (np.ndarray, optional): The sorted IDs to search among, all
+                of them by default.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The scores and the IDs of the nearest
+                neighbours, -1 for missing ones.
+        """
+
+        selector: Optional[faiss.IDSelector]
+        if allowed is not None:
+            allowed = np.setdiff1d(allowed, self.tombstones, assume_unique=True)
+            if allowed.shape[0] == 0:
+                return (
+                    np.zeros((images.shape[0], k), dtype="float32"),
+                    np.full((images.shape[0], k), -1, dtype="int64"),
+                )
+
+            selector = include_ids(allowed)
+            excluded = max(self.index.ntotal - allowed.shape[0], 0)
+        elif self.tombstones.shape[0] > 0:
+            if self.selector is None:
+                self.selector = exclude_ids(self.tombstones)
+
+            selector = self.selector
+            excluded = self.tombstones.shape[0]
+        else:
+            return self.index.search(images, k)
+
+        if selector is not None:
+            # The flat index collecting the vectors is searched with its defaults
+            config = self.config if self.trained else IndexConfig()
+            try:
+                return self.index.search(
+                    images,
+                    k,
+                    params=search_parameters(config, selector),
+                )
+            except RuntimeError:
+                # Some indexes, such as PQ and GPU ones, do not support selectors
+                pass
+
+        # Search enough neighbours to drop the excluded ones afterwards
+        distances, labels = self.index.search(
+            images,
+            min(k + excluded, max(self.index.ntotal, k)),
+        )
+
+        if allowed is None:
+            dropped = np.isin(labels, self.tombstones)
+        else:
+            dropped = ~np.isin(labels, allowed)
+        labels[dropped] = -1
+
+        order = np.argsort(dropped, axis=1, kind="stable")[:, :k]
+        return (
+            np.take_along_axis(distances, order, axis=1),
+            np.take_along_axis(labels, order, axis=1),
+        )
+
+    def _refine(
+        self,
+        images: np.ndarray,
+        distances: np.ndarray,
+        labels: np.ndarray,
+        nrt_neigh: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Re-rank the candidates of a search with their full precision vectors.
+
+        Args:
+            images (np.ndarray): The query images of shape (N, n_features).
+            distances (np.ndarray): The approximate scores of the candidates.
+            labels (np.ndarray): The IDs of the candidates, -1 for missing ones.
+            nrt_neigh (int): The number of nearest neighbours to keep.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The exact scores and the IDs of the
+                nearest neighbours among the candidates.
+        """
+
+        vectors = self.vectors.read(labels.ravel()).reshape(*labels.shape, -1)
+        if self.config.similarity:
+            exact = np.einsum("nkd,nd->nk", vectors, images)
+        else:
+            exact = np.square(vectors - images[:, np.newaxis, :]).sum(axis=2)
 
-        # Return only valid results
-        stop = labels.index(-1) if -1 in labels else len(labels)
+        # The vectors added before enabling the refinement keep their score
+        exact = np.where(np.isnan(exact), distances, exact)
 
-        return labels[:stop], distances[:stop]
+        # Sort the most similar first, and the missing candidates last
+        keys = -exact if self.config.similarity else exact
+        keys[labels < 0] = np.inf
+        order = np.argsort(keys, axis=1, kind="stable")[:, :nrt_neigh]
+        return (
+            np.take_along_axis(exact, order, axis=1),
+            np.take_along_axis(labels, order, axis=1),
+        )
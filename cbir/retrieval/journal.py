@@ -0,0 +1,147 @@
+"""Append-only log of the mutations applied to an index."""
+
+import fcntl
+import os
+import struct
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+# Operation code and number of vectors of a record
+HEADER = struct.Struct("<cI")
+
+ADD = b"A"
+REMOVE = b"R"
+
+
+class Mutation(NamedTuple):
+    """A logged mutation and the position of the end of its record."""
+
+    operation: bytes
+    ids: np.ndarray
+    vectors: Optional[np.ndarray]
+    end: int
+
+
+class MutationLog:
+    """Append-only log of the mutations not yet persisted in the index file."""
+
+    def __init__(self, path: str, n_features: int, fsync: bool = True) -> None:
+        """
+        Mutation log initialisation.
+
+        Args:
+            path (str): The path to the log file.
+            n_features (int): Number of features of the logged vectors.
+            fsync (bool): Whether to sync every record to the disk or not.
+        """
+
+        self.path = path
+        self.n_features = n_features
+        self.fsync = fsync
+
+    def size(self) -> int:
+        """
+        Get the size of the log.
+
+        Returns:
+            int: The size of the log file in bytes, 0 if it does not exist.
+        """
+
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold an exclusive lock on the log shared by all the processes."""
+
+        with open(f"{self.path}.lock", "a", encoding="utf-8") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append(
+        self,
+        operation: bytes,
+        ids: np.ndarray,
+        vectors: Optional[np.ndarray] = None,
+    ) -> int:
+        """
+        Append a mutation to the log.
+
+        Args:
+            operation (bytes): The operation code, ADD or REMOVE.
+            ids (np.ndarray): The IDs affected by the mutation.
+            vectors (np.ndarray, optional): The added vectors.
+
+        Returns:
+            int: The size of the log after the append.
+        """
+
+        record = HEADER.pack(operation, ids.shape[0])
+        record += np.ascontiguousarray(ids, dtype="int64").tobytes()
+        if vectors is not None:
+            record += np.ascontiguousarray(vectors, dtype="float32").tobytes()
+
+        with open(self.path, "ab") as file:
+            file.write(record)
+            file.flush()
+            if self.fsync:
+                os.fsync(file.fileno())
+
+            return file.tell()
+
+    def read(self, offset: int = 0) -> Iterator[Mutation]:
+        """
+        Read the mutations of the log.
+
+        A truncated trailing record, left by a crash during an append, is ignored.
+
+        Args:
+            offset (int): The position in the log to start reading from.
+
+        Yields:
+            Mutation: The mutations following the given position.
+        """
+
+        if not os.path.isfile(self.path):
+            return
+
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+
+            while True:
+                header = file.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+
+                operation, count = HEADER.unpack(header)
+                ids = np.frombuffer(file.read(count * 8), dtype="int64")
+                if ids.shape[0] < count:
+                    return
+
+                vectors = None
+                if operation == ADD:
+                    size = count * self.n_features
+                    vectors = np.frombuffer(file.read(size * 4), dtype="float32")
+                    if vectors.shape[0] < size:
+                        return
+                    vectors = vectors.reshape(count, self.n_features)
+
+                yield Mutation(operation, ids, vectors, file.tell())
+
+    def truncate(self, size: int = 0) -> None:
+        """
+        Discard the mutations of the log following the given position.
+
+        Args:
+            size (int): The size to truncate the log to.
+        """
+
+        if os.path.isfile(self.path):
+            os.truncate(self.path, size)
@@ -0,0 +1,71 @@
+"""Lock letting the searches of an index run concurrently."""
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+
+class SharedLock:
+    """
+    Reentrant lock held exclusively by the mutations of an index, which can
+    also be held in shared mode by several searches at once.
+
+    The waiting mutations go first, the searches can not starve them.
+    """
+
+    def __init__(self) -> None:
+        """Shared lock initialisation."""
+
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._owner: Optional[int] = None
+        self._depth = 0
+        self._writers = 0
+        self._readers = 0
+
+    def __enter__(self) -> "SharedLock":
+        """Acquire the lock exclusively, once the searches are done."""
+
+        self._lock.acquire()
+        if self._owner != threading.get_ident():
+            self._writers += 1
+            try:
+                while self._readers > 0:
+                    self._changed.wait()
+            finally:
+                self._writers -= 1
+            self._owner = threading.get_ident()
+
+        self._depth += 1
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Release the exclusive lock."""
+
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+            self._changed.notify_all()
+
+        self._lock.release()
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        """Hold the lock in shared mode, along with the other searches."""
+
+        with self._lock:
+            # A thread holding the lock exclusively already excludes the others
+            if self._owner == threading.get_ident():
+                self._readers += 1
+            else:
+                while self._writers > 0:
+                    self._changed.wait()
+                self._readers += 1
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._changed.notify_all()
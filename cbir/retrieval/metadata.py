@@ -0,0 +1,239 @@
+"""Attributes of the indexed images, stored as dictionary-encoded columns."""
+
+import fcntl
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from cbir.retrieval.vectors import write_file
+
+# Attributes of an image, such as its project, slide or magnification
+Metadata = Dict[str, Union[str, int]]
+
+KEY_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+$")
+CONDITION_PATTERN = re.compile(r"^\s*([A-Za-z0-9_\-]+)\s*(!=|=)(.*)$")
+
+
+@dataclass(frozen=True)
+class Condition:
+    """Condition on an attribute of the images."""
+
+    key: str
+    # The attribute must be one of the values, or none of them if negated
+    values: Tuple[str, ...]
+    negated: bool = False
+
+
+def check_key(key: str) -> None:
+    """
+    Check that an attribute name can be used as a column name.
+
+    Args:
+        key (str): The name of the attribute.
+
+    Raises:
+        ValueError: If the name is not made of letters, digits, - and _.
+    """
+
+    if not KEY_PATTERN.match(key):
+        raise ValueError(f"Invalid attribute name: '{key}'.")
+
+
+def parse_filter(expression: str) -> List[Condition]:
+    """
+    Parse a filter expression, such as "project=12|13,magnification!=40".
+
+    The conditions separated by commas must all hold, the values separated by
+    vertical bars are alternatives.
+
+    Args:
+        expression (str): The filter expression.
+
+    Raises:
+        ValueError: If the expression is malformed.
+
+    Returns:
+        List[Condition]: The conditions of the filter.
+    """
+
+    conditions = []
+    for term in expression.split(","):
+        match = CONDITION_PATTERN.match(term)
+        if match is None:
+            raise ValueError(f"Invalid condition: '{term.strip()}'.")
+
+        key, operator, values = match.groups()
+        conditions.append(
+            Condition(
+                key=key,
+                values=tuple(value.strip() for value in values.split("|")),
+                negated=operator == "!=",
+            )
+        )
+
+    return conditions
+
+
+class MetadataStore:
+    """
+    Columns of attributes addressed by image ID, each value of a column stored
+    as its position in the dictionary of the column.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Metadata store initialisation.
+
+        Args:
+            path (str): The path prefix of the metadata files.
+        """
+
+        self.path = path
+
+        self.lock = threading.Lock()
+        self.mtime: Optional[int] = None
+        self.columns: Dict[str, List[str]] = {}
+        self._maps: Dict[str, np.ndarray] = {}
+
+    def _column_path(self, key: str) -> str:
+        """Get the path to the codes of a column."""
+
+        return f"{self.path}.{key}"
+
+    def _read_columns(self) -> None:
+        """Read the dictionaries of the columns, again if they changed."""
+
+        try:
+            mtime = os.stat(f"{self.path}.json").st_mtime_ns
+        except FileNotFoundError:
+            return
+
+        if mtime != self.mtime:
+            with open(f"{self.path}.json", "r", encoding="utf-8") as file:
+                self.columns = json.load(file)
+            self.mtime = mtime
+
+    def write(self, ids: np.ndarray, metadata: List[Metadata]) -> None:
+        """
+        Write the attributes of the given IDs.
+
+        Args:
+            ids (np.ndarray): The IDs of the images.
+            metadata (List[Metadata]): The attributes of each image.
+
+        Raises:
+            ValueError: If an attribute name is invalid.
+        """
+
+        for attributes in metadata:
+            for key in attributes:
+                check_key(key)
+
+        with self.lock, open(f"{self.path}.lock", "a", encoding="utf-8") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._write(ids, metadata)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write(self, ids: np.ndarray, metadata: List[Metadata]) -> None:
+        """Write the attributes, holding the lock of the store."""
+
+        self._read_columns()
+        lookups = {
+            key: {value: code for code, value in enumerate(dictionary, start=1)}
+            for key, dictionary in self.columns.items()
+        }
+
+        # Code 0 marks the images without the attribute
+        codes: Dict[str, np.ndarray] = {}
+        for position, attributes in enumerate(metadata):
+            for key, value in attributes.items():
+                dictionary = self.columns.setdefault(key, [])
+                lookup = lookups.setdefault(key, {})
+                if str(value) not in lookup:
+                    dictionary.append(str(value))
+                    lookup[str(value)] = len(dictionary)
+
+                column = codes.setdefault(key, np.zeros(ids.shape[0], dtype="<u4"))
+                column[position] = lookup[str(value)]
+
+        if not codes:
+            return
+
+        # The dictionaries are written first, the codes never refer to a
+        # missing value
+        path = f"{self.path}.json"
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(self.columns, file)
+        os.replace(f"{path}.tmp", path)
+
+        for key, column in codes.items():
+            write_file(self._column_path(key), ids, column)
+
+    def _codes(self, key: str) -> np.ndarray:
+        """Map the codes of a column, again if it has grown since it was mapped."""
+
+        try:
+            size = os.path.getsize(self._column_path(key)) // 4
+        except FileNotFoundError:
+            return np.zeros(0, dtype="<u4")
+
+        codes = self._maps.get(key)
+        if codes is None or codes.shape[0] != size:
+            codes = (
+                np.memmap(self._column_path(key), dtype="<u4", mode="r", shape=(size,))
+                if size > 0
+                else np.zeros(0, dtype="<u4")
+            )
+            self._maps[key] = codes
+
+        return codes
+
+    def select(self, conditions: List[Condition]) -> np.ndarray:
+        """
+        Select the IDs of the images matching all the conditions.
+
+        The images without an attribute match no condition on it, whether
+        negated or not.
+
+        Args:
+            conditions (List[Condition]): The conditions of the filter.
+
+        Returns:
+            np.ndarray: The sorted matching IDs.
+        """
+
+        mask: Optional[np.ndarray] = None
+
+        with self.lock:
+            self._read_columns()
+
+            for condition in conditions:
+                dictionary = self.columns.get(condition.key, [])
+                allowed = [
+                    code
+                    for code, value in enumerate(dictionary, start=1)
+                    if value in condition.values
+                ]
+
+                codes = self._codes(condition.key)
+                matches = np.isin(codes, allowed)
+                if condition.negated:
+                    matches = (codes > 0) & ~matches
+
+                # The IDs past the end of a column do not have the attribute
+                if mask is not None:
+                    size = min(mask.shape[0], matches.shape[0])
+                    matches = mask[:size] & matches[:size]
+                mask = matches
+
+        if mask is None:
+            return np.empty(0, dtype="int64")
+
+        return np.flatnonzero(mask)
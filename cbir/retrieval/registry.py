@@ -0,0 +1,178 @@
+"""Registry of the indexes kept in memory."""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cbir.retrieval.indexer import Indexer
+
+IndexKey = Tuple[str, str]
+
+logger = logging.getLogger(__name__)
+
+
+class IndexerRegistry:
+    """Process-wide cache of the loaded indexers."""
+
+    def __init__(
+        self,
+        loader: Callable[[str, str], Indexer],
+        max_indexes: int = 16,
+        max_memory: int = 0,
+    ) -> None:
+        """
+        Indexer registry initialisation.
+
+        Args:
+            loader (Callable[[str, str], Indexer]): Load the indexer given the
+                storage name and the index name.
+            max_indexes (int): The maximum number of indexes kept in memory.
+            max_memory (int): The memory budget of the indexes in bytes,
+                0 for no limit.
+        """
+
+        self.loader = loader
+        self.max_indexes = max_indexes
+        self.max_memory = max_memory
+
+        self._indexers: "OrderedDict[IndexKey, Indexer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[IndexKey, threading.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._indexers)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint of the loaded indexes in bytes."""
+
+        with self._lock:
+            return sum(indexer.nbytes for indexer in self._indexers.values())
+
+    def _loading_lock(self, key: IndexKey) -> threading.Lock:
+        """Get the lock serialising the loading of a given index."""
+
+        with self._lock:
+            return self._loading.setdefault(key, threading.Lock())
+
+    def get(self, storage_name: str, index_name: str) -> Indexer:
+        """
+        Get the indexer of an index, loading it from disk if needed.
+
+        Args:
+            storage_name (str): The name of the storage.
+            index_name (str): The name of the index.
+
+        Returns:
+            Indexer: The resident indexer of the index.
+        """
+
+        key = (storage_name, index_name)
+
+        # Only one request loads a given index, the others wait for it
+        with self._loading_lock(key):
+            with self._lock:
+                indexer = self._indexers.get(key)
+                if indexer is not None:
+                    self._indexers.move_to_end(key)
+
+            if indexer is not None:
+                indexer.refresh()
+                return indexer
+
+            indexer = self.loader(storage_name, index_name)
+
+            with self._lock:
+                self._indexers[key] = indexer
+                evicted = self._evict()
+
+        for old in evicted:
+            old.flush()
+
+        return indexer
+
+    def _evict(self) -> List[Indexer]:
+        """
+        Evict the least recently used indexes exceeding the cache limits.
+
+        Returns:
+            List[Indexer]: The evicted indexers.
+        """
+
+        def exceeded() -> bool:
+            if len(self._indexers) > self.max_indexes:
+                return True
+
+            if self.max_memory <= 0:
+                return False
+
+            total = sum(indexer.nbytes for indexer in self._indexers.values())
+            return total > self.max_memory
+
+        # Always keep the most recently used index
+        evicted = []
+        while len(self._indexers) > 1 and exceeded():
+            evicted.append(self._indexers.popitem(last=False)[1])
+
+        return evicted
+
+    def flush(self, expired_only: bool = False) -> None:
+        """
+        Persist the pending mutations of the loaded indexes.
+
+        Args:
+            expired_only (bool): Whether to persist only the indexes whose pending
+                mutations exceeded the flush interval.
+        """
+
+        with self._lock:
+            indexers = list(self._indexers.values())
+
+        for indexer in indexers:
+            indexer.flush(expired_only)
+
+    def maintain(self) -> int:
+        """
+        Compact the loaded indexes with many removed images and promote the
+        ones which have grown past the flat index limit.
+
+        Returns:
+            int: The number of compacted or rebuilt indexes.
+        """
+
+        with self._lock:
+            indexers = list(self._indexers.items())
+
+        maintained = 0
+        for key, indexer in indexers:
+            # An index failing to be maintained does not hold back the others
+            try:
+                maintained += indexer.maintain()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Failed to maintain the index %s/%s", *key)
+
+        return maintained
+
+    def discard(self, storage_name: str, index_name: Optional[str] = None) -> None:
+        """
+        Drop an index, or all the indexes of a storage, from the registry.
+
+        Args:
+            storage_name (str): The name of the storage.
+            index_name (str, optional): The name of the index, None for all the
+                indexes of the storage.
+        """
+
+        with self._lock:
+            for key in list(self._indexers):
+                if key[0] == storage_name and index_name in (None, key[1]):
+                    del self._indexers[key]
+
+    def clear(self) -> None:
+        """Persist and drop all the indexes from the registry."""
+
+        self.flush()
+
+        with self._lock:
+            self._indexers.clear()
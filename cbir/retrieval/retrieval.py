@@ -1,18 +1,169 @@
 """Image retrieval methods."""
 
-from io import BytesIO
-from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple, Union
 
+import numpy as np
 import torch
-from PIL import Image
-from torchvision import transforms
 
-from cbir.models.model import Model
-from cbir.models.utils import run_inference
+from cbir.models.extractor import FeatureExtractor
+from cbir.models.preprocessing import Preprocessor
 from cbir.retrieval.indexer import Indexer
+from cbir.retrieval.metadata import Metadata
 from cbir.retrieval.store import Store
 
 
+def try_load_image(
+    preprocessor: Preprocessor,
+    image: bytes,
+) -> Union[torch.Tensor, Exception]:
+    """
+    Decode an image, returning the error instead of raising it.
+
+    Args:
+        preprocessor (Preprocessor): The preprocessor of the model.
+        image (bytes): The encoded image.
+
+    Returns:
+        Union[torch.Tensor, Exception]: The uint8 image tensor or the decoding
+            error.
+    """
+
+    try:
+        return preprocessor.decode(image)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        return e
+
+
+def decode_images(
+    extractor: FeatureExtractor,
+    images: List[bytes],
+    workers: int = 4,
+) -> List[Union[torch.Tensor, Exception]]:
+    """
+    Decode several images, in the decoding processes of the extractor if any,
+    otherwise in threads if there are more than one.
+
+    Args:
+        extractor (FeatureExtractor): The feature extractor.
+        images (List[bytes]): The encoded images.
+        workers (int): The number of threads decoding the images.
+
+    Returns:
+        List[Union[torch.Tensor, Exception]]: The uint8 image tensor or the
+            decoding error of each image, in order.
+    """
+
+    if extractor.decoder is not None:
+        return extractor.decoder.decode(images)
+
+    load = partial(try_load_image, extractor.preprocessor)
+    if len(images) <= 1 or workers <= 1:
+        return [load(image) for image in images]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(load, images))
+
+
+def extract_images(
+    extractor: FeatureExtractor,
+    images: List[bytes],
+    workers: int = 4,
+) -> List[Union[np.ndarray, Exception]]:
+    """
+    Extract the features of several images in a single forward pass, skipping
+    the decoding and the inference of the images already in the cache.
+
+    Args:
+        extractor (FeatureExtractor): The feature extractor.
+        images (List[bytes]): The encoded images.
+        workers (int): The number of threads decoding the images.
+
+    Returns:
+        List[Union[np.ndarray, Exception]]: The features of shape (n_features,)
+            or the decoding error of each image, in order.
+    """
+
+    cache = extractor.cache
+    keys = [cache.key(image) for image in images] if cache is not None else []
+    results: List[Union[np.ndarray, Exception, None]] = (
+        [cache.get(key) for key in keys] if cache is not None else [None] * len(images)
+    )
+    misses = [i for i, result in enumerate(results) if result is None]
+
+    decoded = decode_images(extractor, [images[i] for i in misses], workers)
+
+    indices, tensors = [], []
+    for i, tensor in zip(misses, decoded):
+        if isinstance(tensor, Exception):
+            results[i] = tensor
+        else:
+            indices.append(i)
+            tensors.append(tensor)
+
+    if tensors:
+        outputs = extractor.extract(torch.stack(tensors))
+        for i, features in zip(indices, outputs):
+            results[i] = features
+            if cache is not None:
+                cache.put(keys[i], features)
+
+    return [result for result in results if result is not None]
+
+
+def extract_features(extractor: FeatureExtractor, image: bytes) -> np.ndarray:
+    """
+    Extract the features of a query image.
+
+    Args:
+        extractor (FeatureExtractor): The feature extractor.
+        image (bytes): The query image.
+
+    Returns:
+        np.ndarray: The features of shape (1, n_features).
+    """
+
+    features = extract_images(extractor, [image], workers=1)[0]
+    if isinstance(features, Exception):
+        raise features
+
+    return features[np.newaxis]
+
+
+def extract_features_batch(
+    extractor: FeatureExtractor,
+    images: List[bytes],
+    workers: int = 4,
+) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """
+    Extract the features of several query images in a single forward pass.
+
+    Args:
+        extractor (FeatureExtractor): The feature extractor.
+        images (List[bytes]): The query images.
+        workers (int): The number of threads decoding the images.
+
+    Returns:
+        Tuple[np.ndarray, List[Optional[str]]]: The features of the valid images
+            of shape (N, n_features), and the decoding error of each image or
+            None if it is valid.
+    """
+
+    results = extract_images(extractor, images, workers)
+
+    features = [result for result in results if not isinstance(result, Exception)]
+    errors = [
+        f"Invalid image: {result}" if isinstance(result, Exception) else None
+        for result in results
+    ]
+
+    if not features:
+        return np.empty((0, extractor.model.n_features), dtype="float32"), errors
+
+    return np.stack(features), errors
+
+
 class ImageRetrieval:
     """Image retrieval class."""
 
@@ -27,47 +178,234 @@ class ImageRetrieval:
         self.store = store
         self.indexer = indexer
 
-    def index_image(self, model: Model, image: bytes, filename: str) -> List[int]:
+    def index_image(
+        self,
+        extractor: FeatureExtractor,
+        image: bytes,
+        filename: str,
+        metadata: Optional[Metadata] = None,
+    ) -> List[Optional[int]]:
         """
         Index an image.
 
         Args:
-            model (Model): The model to extract features.
+            extractor (FeatureExtractor): The feature extractor.
             image (bytes): The image to be indexed.
             filename (str): The name of the image.
+            metadata (Metadata, optional): The attributes of the image.
 
         Returns:
-            List[int]: The IDs of the indexed images.
+            List[Optional[int]]: The ID of the indexed image, or None if the
+                filename has been taken by a concurrent writer.
         """
 
-        features_extraction = transforms.Compose(
-            [
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
-                ),
-            ]
+        return self.add_features(
+            [filename],
+            extract_features(extractor, image),
+            [metadata] if metadata is not None else None,
         )
 
-        # Create a dataset of one image
-        inputs = features_extraction(Image.open(BytesIO(image)).convert("RGB"))
-        inputs = torch.unsqueeze(inputs, dim=0)
+    def index_claimed(
+        self,
+        extractor: FeatureExtractor,
+        image: bytes,
+        tag: int,
+        metadata: Optional[Metadata] = None,
+    ) -> int:
+        """
+        Index an image under an ID whose filename has already been claimed.
 
-        outputs = run_inference(model, inputs)
+        The caller maps the ID to the filename once indexed, or releases the
+        filename if the image could not be indexed.
 
-        last_id = self.store.last()
-        ids = self.indexer.add(last_id, outputs)
+        Args:
+            extractor (FeatureExtractor): The feature extractor.
+            image (bytes): The image to be indexed.
+            tag (int): The ID reserved for the image.
+            metadata (Metadata, optional): The attributes of the image.
 
-        for tag in ids:
-            label = str(tag)
-            self.store.set(filename, label)
-            self.store.set(label, filename)
+        Returns:
+            int: The ID of the indexed image.
+        """
+
+        return self.indexer.add(
+            tag,
+            extract_features(extractor, image),
+            [metadata] if metadata is not None else None,
+        )[0]
+
+    def add_features(
+        self,
+        filenames: List[str],
+        features: np.ndarray,
+        metadata: Optional[List[Metadata]] = None,
+    ) -> List[Optional[int]]:
+        """
+        Add the features of images to the index and map their IDs to their names.
+
+        Args:
+            filenames (List[str]): The names of the images.
+            features (np.ndarray): The features of the images, in the same order.
+            metadata (List[Metadata], optional): The attributes of the images,
+                in the same order.
+
+        Returns:
+            List[Optional[int]]: The ID of each image, or None if the filename
+                has been taken by a concurrent writer.
+        """
+
+        # Reserve the IDs first so that concurrent writers never share an ID,
+        # then claim the filenames so that they never index the same image
+        first = self.store.reserve(len(filenames))
+        claimed = self.store.claim(
+            filenames,
+            [str(first + i) for i in range(len(filenames))],
+        )
 
-        self.store.set("last_id", str(ids[-1] + 1))
+        ids: List[Optional[int]] = [None] * len(filenames)
+        kept = [i for i, taken in enumerate(claimed) if taken]
+        try:
+            # The indexer adds consecutive IDs, the runs between the
+            # conflicting filenames are added separately
+            for run in np.split(kept, np.flatnonzero(np.diff(kept) != 1) + 1):
+                if run.shape[0] == 0:
+                    continue
+
+                added = self.indexer.add(
+                    first + int(run[0]),
+                    features[run],
+                    [metadata[i] for i in run] if metadata is not None else None,
+                )
+                for i, tag in zip(run.tolist(), added):
+                    ids[i] = tag
+        finally:
+            # Map the IDs of the indexed images to their names, and release the
+            # filenames of the images which could not be indexed
+            mapping = {
+                str(tag): filename
+                for filename, tag in zip(filenames, ids)
+                if tag is not None
+            }
+            with self.store.pipeline() as store:
+                if mapping:
+                    store.set_many(mapping)
+                for i in kept:
+                    if ids[i] is None:
+                        store.remove(filenames[i])
 
         return ids
 
+    def index_images(  # pylint: disable=too-many-arguments
+        self,
+        extractor: FeatureExtractor,
+        images: List[Tuple[str, bytes]],
+        batch_size: int = 32,
+        workers: int = 4,
+        metadata: Optional[Dict[str, Metadata]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Index several images by batches.
+
+        Args:
+            extractor (FeatureExtractor): The feature extractor.
+            images (List[Tuple[str, bytes]]): The filenames and the images.
+            batch_size (int): The number of images per forward pass.
+            workers (int): The number of threads decoding the images.
+            metadata (Dict[str, Metadata], optional): The attributes of the
+                images by filename.
+
+        Returns:
+            List[Dict[str, Any]]: The ID or the error of each image, in order.
+        """
+
+        results: List[Dict[str, Any]] = [{"filename": name} for name, _ in images]
+        pending = self.check_filenames([name for name, _ in images], results)
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start : start + batch_size]
+            self._index_batch(extractor, images, batch, results, workers, metadata)
+
+        return results
+
+    def _index_batch(  # pylint: disable=too-many-arguments
+        self,
+        extractor: FeatureExtractor,
+        images: List[Tuple[str, bytes]],
+        batch: List[int],
+        results: List[Dict[str, Any]],
+        workers: int,
+        metadata: Optional[Dict[str, Metadata]] = None,
+    ) -> None:
+        """
+        Index a batch of images in a single forward pass.
+
+        Args:
+            extractor (FeatureExtractor): The feature extractor.
+            images (List[Tuple[str, bytes]]): The filenames and the images.
+            batch (List[int]): The positions of the images to index.
+            results (List[Dict[str, Any]]): The results of the images, updated
+                with the IDs or the errors of the batch.
+            workers (int): The number of threads decoding the images.
+            metadata (Dict[str, Metadata], optional): The attributes of the
+                images by filename.
+        """
+
+        extracted = extract_images(extractor, [images[i][1] for i in batch], workers)
+
+        indices, features = [], []
+        for i, result in zip(batch, extracted):
+            if isinstance(result, Exception):
+                results[i]["error"] = f"Invalid image: {result}"
+            else:
+                indices.append(i)
+                features.append(result)
+
+        if not features:
+            return
+
+        filenames = [images[i][0] for i in indices]
+        ids = self.add_features(
+            filenames,
+            np.stack(features),
+            [metadata.get(name, {}) for name in filenames] if metadata else None,
+        )
+        for i, tag in zip(indices, ids):
+            if tag is None:
+                results[i]["error"] = "Image filename already exist!"
+            else:
+                results[i]["id"] = tag
+
+    def check_filenames(
+        self,
+        filenames: List[str],
+        results: List[Dict[str, Any]],
+    ) -> List[int]:
+        """
+        Skip the missing or duplicated filenames, within the batch or the store.
+
+        Args:
+            filenames (List[str]): The names of the images.
+            results (List[Dict[str, Any]]): The results of the images, updated
+                with the errors of the skipped ones.
+
+        Returns:
+            List[int]: The positions of the images to index.
+        """
+
+        pending = []
+        seen = set()
+        existing = self.store.get_many(filenames)
+        for i, filename in enumerate(filenames):
+            if not filename:
+                results[i]["error"] = "Image filename not found!"
+            elif filename in seen or existing[i] is not None:
+                results[i]["error"] = "Image filename already exist!"
+            else:
+                pending.append(i)
+            seen.add(filename)
+
+        return pending
+
     def remove_image(self, name: str) -> Optional[int]:
         """
         Remove an image.
@@ -79,16 +417,43 @@ class ImageRetrieval:
             Optional[int]: The ID of the removed image or None if it does not exist.
         """
 
-        label = int(self.store.get(name) or "-1")
+        return self.remove_images([name])[0].get("id")
+
+    def remove_images(self, names: List[str]) -> List[Dict[str, Any]]:
+        """
+        Remove several images at once.
+
+        Args:
+            names (List[str]): The names of the images to be removed.
+
+        Returns:
+            List[Dict[str, Any]]: The ID or the error of each image, in order.
+        """
+
+        results: List[Dict[str, Any]] = []
+        labels = self.store.get_many(names)
+        for name, label in zip(names, labels):
+            if label is None:
+                results.append({"filename": name, "error": f"{name} not found"})
+            else:
+                results.append({"filename": name, "id": int(label)})
 
-        self.indexer.remove(label)
-        self.store.remove(name)
+        removed = {name: label for name, label in zip(names, labels) if label}
+        if not removed:
+            return results
 
-        return label
+        self.indexer.remove_batch([int(label) for label in removed.values()])
+
+        with self.store.pipeline() as store:
+            for name, label in removed.items():
+                store.remove(name)
+                store.remove(label)
+
+        return results
 
     def search(
         self,
-        model: Model,
+        extractor: FeatureExtractor,
         image: bytes,
         nrt_neigh: int,
     ) -> List[Tuple[str, float]]:
@@ -96,7 +461,7 @@ class ImageRetrieval:
         Search for similar images.
 
         Args:
-            model (Model): The model to extract features.
+            extractor (FeatureExtractor): The feature extractor.
             image (bytes): The query image.
             nrt_neigh (int): The number of nearest neighbours to search.
 
@@ -104,23 +469,28 @@ class ImageRetrieval:
             List[Tuple[str, float]]: The list of filename and distance pairs.
         """
 
-        features_extraction = transforms.Compose(
-            [
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
-                ),
-            ]
-        )
+        return self.search_features(extract_features(extractor, image), nrt_neigh)
 
-        # Create a dataset of one image
-        inputs = features_extraction(Image.open(BytesIO(image)).convert("RGB"))
-        inputs = torch.unsqueeze(inputs, dim=0)
+    def search_features(
+        self,
+        features: np.ndarray,
+        nrt_neigh: int,
+    ) -> List[Tuple[str, float]]:
+        """
+        Search for similar images given the features of the query image.
 
-        outputs = run_inference(model, inputs)
+        Args:
+            features (np.ndarray): The features of the query image.
+            nrt_neigh (int): The number of nearest neighbours to search.
+
+        Returns:
+            List[Tuple[str, float]]: The list of filename and distance pairs.
+        """
 
-        labels, distances = self.indexer.search(outputs, nrt_neigh)
-        filenames = [self.store.get(str(l)) or "" for l in labels]
+        labels, distances = self.indexer.search(features, nrt_neigh)
+        filenames = self.store.get_many([str(label) for label in labels])
 
-        return list(zip(filenames, distances))
+        return [
+            (filename or "", distance)
+            for filename, distance in zip(filenames, distances)
+        ]
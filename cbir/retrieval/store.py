@@ -1,8 +1,10 @@
 """Store module"""
 
-from typing import Optional
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 
 from redis import Redis  # type: ignore
+from redis import asyncio as aioredis  # type: ignore
 
 
 class Store:
@@ -42,6 +44,24 @@ class Store:
         value = self.redis.get(f"{self.prefix}:{key}")
         return value.decode("UTF-8") if value is not None else None
 
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """
+        Retrieves the values associated with several keys in a single round trip.
+
+        Args:
+            keys (List[str]): The keys whose values are to be retrieved.
+
+        Returns:
+            List[Optional[str]]: The value for each key, or None if it does not exist.
+        """
+        if not keys:
+            return []
+
+        values = self.redis.mget([f"{self.prefix}:{key}" for key in keys])
+        return [
+            value.decode("UTF-8") if value is not None else None for value in values
+        ]
+
     def set(self, key: str, value: str) -> None:
         """
         Sets the value for the specified key in the Redis database.
@@ -52,6 +72,57 @@ class Store:
         """
         self.redis.set(f"{self.prefix}:{key}", value)
 
+    def set_many(self, mapping: Dict[str, str]) -> None:
+        """
+        Sets the values of several keys in a single round trip.
+
+        Args:
+            mapping (Dict[str, str]): The values to be set for each key.
+        """
+        self.redis.mset(
+            {f"{self.prefix}:{key}": value for key, value in mapping.items()}
+        )
+
+    def claim(self, keys: List[str], values: List[str]) -> List[bool]:
+        """
+        Sets the values of the keys which do not exist yet, in a single round trip.
+
+        Each key is set atomically, a key set by a concurrent caller is left as is.
+
+        Args:
+            keys (List[str]): The keys to be set.
+            values (List[str]): The value of each key.
+
+        Returns:
+            List[bool]: Whether each key has been set, False if it already existed.
+        """
+        if not keys:
+            return []
+
+        pipeline = self.redis.pipeline(transaction=False)
+        for key, value in zip(keys, values):
+            pipeline.set(f"{self.prefix}:{key}", value, nx=True)
+
+        return [bool(claimed) for claimed in pipeline.execute()]
+
+    @contextmanager
+    def pipeline(self, transaction: bool = True) -> Iterator["Store"]:
+        """
+        Queues the commands of the yielded store and sends them in a single round trip.
+
+        The commands are only sent if the block exits without error, the values
+        read from the yielded store are not available inside the block.
+
+        Args:
+            transaction (bool): Whether to run the commands atomically.
+
+        Yields:
+            Store: A store bound to the pipeline.
+        """
+        pipeline = self.redis.pipeline(transaction=transaction)
+        yield Store(self.storage_name, pipeline, self.index_name)
+        pipeline.execute()
+
     def last(self) -> int:
         """
         Retrieves the value of the key "last_id".
@@ -61,6 +132,18 @@ class Store:
         """
         return int(self.get("last_id") or "0")
 
+    def reserve(self, count: int) -> int:
+        """
+        Atomically reserves a range of IDs by incrementing the key "last_id".
+
+        Args:
+            count (int): The number of IDs to reserve.
+
+        Returns:
+            int: The first reserved ID, the range is not given to any other caller.
+        """
+        return int(self.redis.incrby(f"{self.prefix}:last_id", count)) - count
+
     def contains(self, key: str) -> bool:
         """
         Checks if a value exists for the given key.
@@ -81,3 +164,161 @@ class Store:
             key (str): The key to be deleted.
         """
         self.redis.delete(f"{self.prefix}:{key}")
+
+
+class AsyncStore:
+    """A class for managing key-value storage using the asynchronous Redis client."""
+
+    def __init__(
+        self,
+        storage_name: str,
+        redis: aioredis.Redis,
+        index_name: str = "index",
+    ) -> None:
+        """
+        Asynchronous store initialisation.
+
+        Args:
+            storage_name (str): The name of the storage.
+            redis (aioredis.Redis): An instance of the asynchronous Redis client.
+            index_name (str, optional): The name of the index.
+        """
+        self.storage_name = storage_name
+        self.index_name = index_name
+        self.redis = redis
+
+        self.prefix = f"{self.storage_name}:{self.index_name}"
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Retrieves the value associated with the given key.
+
+        Args:
+            key (str): The key whose value is to be retrieved.
+
+        Returns:
+            Optional[str]: The value for the given key, or None if it does not exist.
+        """
+        value = await self.redis.get(f"{self.prefix}:{key}")
+        return value.decode("UTF-8") if value is not None else None
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """
+        Retrieves the values associated with several keys in a single round trip.
+
+        Args:
+            keys (List[str]): The keys whose values are to be retrieved.
+
+        Returns:
+            List[Optional[str]]: The value for each key, or None if it does not exist.
+        """
+        if not keys:
+            return []
+
+        values = await self.redis.mget([f"{self.prefix}:{key}" for key in keys])
+        return [
+            value.decode("UTF-8") if value is not None else None for value in values
+        ]
+
+    async def set(self, key: str, value: str) -> None:
+        """
+        Sets the value for the specified key in the Redis database.
+
+        Args:
+            key (str): The key for which the value is to be set.
+            value (str): The value to be set for the specified key.
+        """
+        await self.redis.set(f"{self.prefix}:{key}", value)
+
+    async def set_many(self, mapping: Dict[str, str]) -> None:
+        """
+        Sets the values of several keys in a single round trip.
+
+        Args:
+            mapping (Dict[str, str]): The values to be set for each key.
+        """
+        await self.redis.mset(
+            {f"{self.prefix}:{key}": value for key, value in mapping.items()}
+        )
+
+    async def claim(self, keys: List[str], values: List[str]) -> List[bool]:
+        """
+        Sets the values of the keys which do not exist yet, in a single round trip.
+
+        Each key is set atomically, a key set by a concurrent caller is left as is.
+
+        Args:
+            keys (List[str]): The keys to be set.
+            values (List[str]): The value of each key.
+
+        Returns:
+            List[bool]: Whether each key has been set, False if it already existed.
+        """
+        if not keys:
+            return []
+
+        pipeline = self.redis.pipeline(transaction=False)
+        for key, value in zip(keys, values):
+            pipeline.set(f"{self.prefix}:{key}", value, nx=True)
+
+        return [bool(claimed) for claimed in await pipeline.execute()]
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = True) -> AsyncIterator["AsyncStore"]:
+        """
+        Queues the commands of the yielded store and sends them in a single round trip.
+
+        The commands are only sent if the block exits without error, the values
+        read from the yielded store are not available inside the block.
+
+        Args:
+            transaction (bool): Whether to run the commands atomically.
+
+        Yields:
+            AsyncStore: A store bound to the pipeline.
+        """
+        pipeline = self.redis.pipeline(transaction=transaction)
+        yield AsyncStore(self.storage_name, pipeline, self.index_name)
+        await pipeline.execute()
+
+    async def last(self) -> int:
+        """
+        Retrieves the value of the key "last_id".
+
+        Returns:
+            int: The value of the "last_id" key, or 0 if the key does not exist.
+        """
+        return int(await self.get("last_id") or "0")
+
+    async def reserve(self, count: int) -> int:
+        """
+        Atomically reserves a range of IDs by incrementing the key "last_id".
+
+        Args:
+            count (int): The number of IDs to reserve.
+
+        Returns:
+            int: The first reserved ID, the range is not given to any other caller.
+        """
+        return int(await self.redis.incrby(f"{self.prefix}:last_id", count)) - count
+
+    async def contains(self, key: str) -> bool:
+        """
+        Checks if a value exists for the given key.
+
+        Args:
+            key (str): The key to check for existence.
+
+        Returns:
+            bool: True if a value exists for the key, False otherwise.
+        """
+        return await self.get(key) is not None
+
+    async def remove(self, key: str) -> None:
+        """
+        Deletes the value associated with the specified key from the Redis database.
+
+        Args:
+            key (str): The key to be deleted.
+        """
+        await self.redis.delete(f"{self.prefix}:{key}")
@@ -1,23 +1,89 @@
 """Utility functions for the retrieval module."""
 
-from fastapi import Depends
-from redis import Redis  # type: ignore
+from typing import Any, Dict
 
-from cbir.config import Settings, get_settings
+from fastapi import Request
+from redis import BlockingConnectionPool, ConnectionPool, Redis  # type: ignore
+from redis import asyncio as aioredis  # type: ignore
+
+from cbir.config import Settings
 from cbir.retrieval.indexer import Indexer
 
 
-def get_redis(settings: Settings = Depends(get_settings)) -> Redis:
+def get_pool_options(settings: Settings) -> Dict[str, Any]:
+    """
+    Get the options of the Redis connection pools.
+
+    Args:
+        settings (Settings): The database settings.
+
+    Returns:
+        Dict[str, Any]: The keyword arguments of the connection pools.
+    """
+    return {
+        "host": settings.host,
+        "port": settings.port,
+        "db": settings.db,
+        "max_connections": settings.redis_max_connections,
+        "timeout": settings.redis_pool_timeout,
+        "socket_timeout": settings.redis_socket_timeout,
+        "socket_connect_timeout": settings.redis_socket_timeout,
+        "health_check_interval": settings.redis_health_check_interval,
+    }
+
+
+def create_redis_pool(settings: Settings) -> ConnectionPool:
     """
-    Get the Redis client.
+    Create the Redis connection pool shared by the requests.
 
     Args:
         settings (Settings): The database settings.
 
+    Returns:
+        ConnectionPool: The connection pool, waiting for a free connection
+            when all of them are in use.
+    """
+    return BlockingConnectionPool(**get_pool_options(settings))
+
+
+def create_async_redis_pool(settings: Settings) -> aioredis.ConnectionPool:
+    """
+    Create the asynchronous Redis connection pool shared by the async handlers.
+
+    Args:
+        settings (Settings): The database settings.
+
+    Returns:
+        aioredis.ConnectionPool: The connection pool, waiting for a free
+            connection when all of them are in use.
+    """
+    return aioredis.BlockingConnectionPool(**get_pool_options(settings))
+
+
+def get_redis(request: Request) -> Redis:
+    """
+    Get a Redis client using the connection pool of the application.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
     Returns:
         Redis: The Redis client.
     """
-    return Redis(host=settings.host, port=settings.port, db=settings.db)
+    return Redis(connection_pool=request.app.state.redis_pool)
+
+
+def get_async_redis(request: Request) -> aioredis.Redis:
+    """
+    Get an asynchronous Redis client using the connection pool of the application.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        aioredis.Redis: The asynchronous Redis client.
+    """
+    return aioredis.Redis(connection_pool=request.app.state.async_redis_pool)
 
 
 def get_indexer(
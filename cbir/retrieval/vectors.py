@@ -0,0 +1,132 @@
+"""Full precision vectors kept on disk to re-rank the compressed indexes."""
+
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+def write_rows(fd: int, ids: np.ndarray, rows: np.ndarray) -> None:
+    """
+    Write rows of fixed size at the positions of their IDs in a file.
+
+    Args:
+        fd (int): The file descriptor.
+        ids (np.ndarray): The IDs of the rows.
+        rows (np.ndarray): The contiguous rows, one per ID.
+    """
+
+    row_size = rows.nbytes // max(rows.shape[0], 1)
+
+    # The IDs of a batch are consecutive, write them at once
+    start = 0
+    while start < ids.shape[0]:
+        end = start + 1
+        while end < ids.shape[0] and ids[end] == ids[end - 1] + 1:
+            end += 1
+
+        os.pwrite(fd, rows[start:end].tobytes(), int(ids[start]) * row_size)
+        start = end
+
+
+def write_file(path: str, ids: np.ndarray, rows: np.ndarray) -> None:
+    """
+    Write rows of fixed size at the positions of their IDs in a file, creating
+    it if needed.
+
+    The file is not opened in append mode, which would make the positional
+    writes land at its end.
+
+    Args:
+        path (str): The path to the file.
+        ids (np.ndarray): The IDs of the rows.
+        rows (np.ndarray): The contiguous rows, one per ID.
+    """
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        write_rows(fd, ids, rows)
+    finally:
+        os.close(fd)
+
+
+class VectorStore:
+    """File of float32 vectors addressed by ID, read through a memory map."""
+
+    def __init__(self, path: str, n_features: int) -> None:
+        """
+        Vector store initialisation.
+
+        Args:
+            path (str): The path to the vector file.
+            n_features (int): Number of features of the vectors.
+        """
+
+        self.path = path
+        self.n_features = n_features
+        self.row_size = n_features * 4
+
+        self.lock = threading.Lock()
+        self._map: Optional[np.ndarray] = None
+
+    def write(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        """
+        Write the vectors of the given IDs, growing the file if needed.
+
+        Args:
+            ids (np.ndarray): The IDs of the vectors.
+            vectors (np.ndarray): The vectors of shape (N, n_features).
+        """
+
+        vectors = np.ascontiguousarray(vectors, dtype="<f4")
+
+        with self.lock:
+            write_file(self.path, ids, vectors)
+            self._map = None
+
+    def read(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Read the vectors of the given IDs.
+
+        Args:
+            ids (np.ndarray): The IDs of the vectors, -1 for missing ones.
+
+        Returns:
+            np.ndarray: The vectors of shape (N, n_features), NaN for the IDs
+                past the end of the file.
+        """
+
+        vectors = np.full((ids.shape[0], self.n_features), np.nan, dtype="float32")
+
+        rows = self._rows()
+        if rows is None:
+            return vectors
+
+        valid = (ids >= 0) & (ids < rows.shape[0])
+        vectors[valid] = rows[ids[valid]]
+
+        return vectors
+
+    def _rows(self) -> Optional[np.ndarray]:
+        """Map the vector file, again if it has grown since it was mapped."""
+
+        with self.lock:
+            try:
+                size = os.path.getsize(self.path) // self.row_size
+            except FileNotFoundError:
+                return None
+
+            if self._map is None or self._map.shape[0] != size:
+                self._map = (
+                    np.memmap(
+                        self.path,
+                        dtype="<f4",
+                        mode="r",
+                        shape=(size, self.n_features),
+                    )
+                    if size > 0
+                    else None
+                )
+
+            return self._map
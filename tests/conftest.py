@@ -70,20 +70,23 @@ def app(test_directory: str) -> FastAPI:
         test_directory
     )
 
-    main.app.state.model = main.load_model(get_settings(test_directory))
-
     return main.app
 
 
 @pytest.fixture
-def client(app: FastAPI) -> TestClient:
+def client(app: FastAPI) -> Generator[TestClient, None, None]:
     """
     Provide a test client for the FastAPI application.
 
+    The client runs the lifespan of the application so that the model and the
+    indexer registry are initialised with the test settings.
+
     Args:
         app (FastAPI): The FastAPI application instance to be tested.
 
-    Returns:
+    Yields:
         TestClient: An instance of `TestClient`.
     """
-    return TestClient(app)
+
+    with TestClient(app) as test_client:
+        yield test_client
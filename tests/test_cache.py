@@ -0,0 +1,100 @@
+"""Embedding cache tests"""
+
+import os
+
+import numpy as np
+
+from cbir.models.cache import DiskCache, EmbeddingCache
+
+
+def test_memory_eviction() -> None:
+    """Test that the least recently used features are evicted from memory."""
+
+    cache = EmbeddingCache("model", max_items=2)
+    keys = [cache.key(image) for image in (b"a", b"b", b"c")]
+
+    cache.put(keys[0], np.zeros(4, dtype="float32"))
+    cache.put(keys[1], np.ones(4, dtype="float32"))
+    assert cache.get(keys[0]) is not None
+
+    cache.put(keys[2], np.full(4, 2, dtype="float32"))
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["size"] == 2
+
+
+def test_key_namespace() -> None:
+    """Test that the same image has a different key for another model."""
+
+    assert EmbeddingCache("a").key(b"image") != EmbeddingCache("b").key(b"image")
+    assert EmbeddingCache("a").key(b"image") == EmbeddingCache("a").key(b"image")
+
+
+def test_disk_persistence(test_directory: str) -> None:
+    """
+    Test that the on-disk tier is reloaded and evicts the oldest features.
+
+    Args:
+        test_directory (str): The path to the test directory.
+    """
+
+    path = os.path.join(test_directory, "cache")
+    cache = EmbeddingCache("model", max_items=0, disk=DiskCache(path, 4, 2))
+    keys = [cache.key(image) for image in (b"a", b"b", b"c")]
+
+    for i, key in enumerate(keys):
+        cache.put(key, np.full(4, i, dtype="float32"))
+    cache.close()
+
+    cache = EmbeddingCache("model", max_items=0, disk=DiskCache(path, 4, 2))
+
+    assert cache.get(keys[0]) is None
+    features = cache.get(keys[2])
+    assert features is not None
+    np.testing.assert_array_equal(features, np.full(4, 2))
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.stats()["disk_size"] == 2
+
+    # The next feature replaces the oldest remaining one
+    cache.put(keys[0], np.zeros(4, dtype="float32"))
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+
+
+def test_disk_shared_by_processes(test_directory: str) -> None:
+    """
+    Test that the on-disk tier opened by several processes shares its slots,
+    and never returns the features of another image.
+
+    Args:
+        test_directory (str): The path to the test directory.
+    """
+
+    path = os.path.join(test_directory, "cache")
+    first, second = DiskCache(path, 4, 2), DiskCache(path, 4, 2)
+    keys = [EmbeddingCache("model").key(image) for image in (b"a", b"b", b"c")]
+
+    first.put(keys[0], np.zeros(4, dtype="float32"))
+    second.put(keys[1], np.ones(4, dtype="float32"))
+    assert first.get(keys[0]) is not None
+
+    # The slot of the oldest features is reused, whichever process wrote them
+    second.put(keys[2], np.full(4, 2, dtype="float32"))
+
+    assert first.get(keys[0]) is None
+    features = first.get(keys[1])
+    assert features is not None
+    np.testing.assert_array_equal(features, np.ones(4))
+    features = first.get(keys[2])
+    assert features is not None
+    np.testing.assert_array_equal(features, np.full(4, 2))
+    assert len(first) == 2
+
+    first.close()
+    second.close()
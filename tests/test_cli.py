@@ -0,0 +1,68 @@
+"""Command line interface tests"""
+
+import os
+import zipfile
+
+from cbir.cli import Checkpoint, iter_batches, iter_images
+
+
+def test_iter_directory(test_directory: str) -> None:
+    """
+    Test that the images of a directory are read in order from a position.
+
+    Args:
+        test_directory (str): The path to the test directory.
+    """
+
+    os.makedirs(os.path.join(test_directory, "b"))
+    for name in ("c.png", "a.png", "b/a.png", "notes.txt"):
+        with open(os.path.join(test_directory, name), "wb") as file:
+            file.write(name.encode())
+
+    names = [name for name, _ in iter_images(test_directory)]
+    assert names == ["a.png", "c.png", os.path.join("b", "a.png")]
+
+    images = list(iter_images(test_directory, start=2))
+    assert images == [(os.path.join("b", "a.png"), b"b/a.png")]
+
+
+def test_iter_archive(test_directory: str) -> None:
+    """
+    Test that the images of an archive are read from a position.
+
+    Args:
+        test_directory (str): The path to the test directory.
+    """
+
+    path = os.path.join(test_directory, "tiles.zip")
+    with zipfile.ZipFile(path, "w") as archive:
+        for i in range(5):
+            archive.writestr(f"tile{i}.png", str(i))
+
+    images = iter_images(path, start=3)
+    assert list(iter_batches(images, 1)) == [
+        [("tile3.png", b"3")],
+        [("tile4.png", b"4")],
+    ]
+    assert not list(iter_images(path, start=5))
+
+
+def test_checkpoint(test_directory: str) -> None:
+    """
+    Test that a checkpoint only resumes the ingestion of its source.
+
+    Args:
+        test_directory (str): The path to the test directory.
+    """
+
+    path = os.path.join(test_directory, "index.ingest")
+    checkpoint = Checkpoint(path, "tiles.zip")
+
+    assert checkpoint.read() == 0
+
+    checkpoint.write(64)
+    assert checkpoint.read() == 64
+    assert Checkpoint(path, "other.zip").read() == 0
+
+    checkpoint.clear()
+    assert checkpoint.read() == 0
@@ -0,0 +1,31 @@
+"""Bounded executor tests"""
+
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from cbir.api.utils.executor import BoundedExecutor
+
+
+def test_reject_when_full() -> None:
+    """Test that the work exceeding the queue depth is rejected."""
+
+    executor = BoundedExecutor(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def submit() -> None:
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as error:
+            await executor.run(release.wait)
+        assert error.value.status_code == 503
+
+        release.set()
+        assert await asyncio.gather(*running) == [True, True]
+        assert executor.pending == 0
+
+    asyncio.run(submit())
+    executor.shutdown()
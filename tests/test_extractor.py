@@ -0,0 +1,88 @@
+"""Feature extractor tests"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from cbir.models.extractor import FeatureExtractor
+from cbir.models.utils import recall_at_k
+
+
+def test_extract_micro_batches(app: FastAPI, client: TestClient) -> None:
+    """
+    Test that concurrent requests are grouped into micro-batches.
+
+    Args:
+        app (FastAPI): The FastAPI application instance to be tested.
+        client: A test client instance running the lifespan of the application.
+    """
+
+    assert client.app is app
+    model = app.state.model
+    extractor = FeatureExtractor(model, max_batch_size=4, max_wait_ms=500)
+
+    inputs = torch.rand(1, 3, 224, 224)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        outputs = list(executor.map(extractor.extract, [inputs] * 4))
+    extractor.close()
+
+    assert all(output.shape == (1, model.n_features) for output in outputs)
+
+    stats = extractor.stats()
+    assert stats["images"] == 4
+    assert stats["batches"] < 4
+
+
+def test_get_metrics(client: TestClient) -> None:
+    """
+    Test 'GET /api/metrics' endpoint.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    response = client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.json()["inference"]["batches"] == 0
+
+
+def test_cache_search_image(client: TestClient) -> None:
+    """
+    Test that searching the same image twice only runs the model once.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storage_name = "test_storage"
+
+    response = client.post("/api/storages", json={"name": storage_name})
+    assert response.status_code == 200
+
+    for _ in range(2):
+        with open("tests/data/image.png", "rb") as image:
+            response = client.post(
+                "/api/search",
+                files={"image": image},
+                params={"nrt_neigh": "1", "storage": storage_name},
+            )
+        assert response.status_code == 200
+
+    metrics = client.get("/api/metrics").json()
+
+    assert metrics["inference"]["images"] == 1
+    assert metrics["cache"]["hits"] == 1
+
+
+def test_recall_at_k() -> None:
+    """Test the recall of the neighbours of reduced precision features."""
+
+    features = np.random.default_rng(0).random((32, 8), dtype="float32")
+
+    assert recall_at_k(features, features, k=5) == 1.0
+    assert recall_at_k(features, features.astype("float16"), k=5) > 0.9
+    assert recall_at_k(features, features[::-1], k=5) < 0.5
@@ -0,0 +1,516 @@
+"""Indexer tests"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import faiss
+import numpy as np
+import pytest
+
+from cbir.retrieval import factory
+from cbir.retrieval.factory import IndexConfig, get_ids
+from cbir.retrieval.indexer import Indexer, IndexerOptions
+from cbir.retrieval.metadata import (
+    Condition,
+    Metadata,
+    MetadataStore,
+    parse_filter,
+)
+
+
+def test_reconstruct(test_directory: str) -> None:
+    """
+    Test that the stored features of an image are reconstructed by ID.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    vectors = np.random.rand(3, 4).astype("float32")
+
+    indexer = Indexer(test_directory, "storage", "index", 4)
+    indexer.add(10, vectors)
+    indexer.remove(11)
+
+    features = indexer.reconstruct(12)
+    assert features is not None
+    np.testing.assert_array_equal(features, vectors[2:])
+    assert indexer.reconstruct(11) is None
+
+
+def test_reconstruct_legacy_index(test_directory: str) -> None:
+    """
+    Test that the features are reconstructed from an ID map without reverse map.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    vectors = np.random.rand(3, 4).astype("float32")
+
+    index = faiss.index_factory(4, "IDMap,Flat")
+    index.add_with_ids(vectors, np.arange(10, 13))
+    faiss.write_index(index, os.path.join(test_directory, "storage", "index"))
+
+    indexer = Indexer(test_directory, "storage", "index", 4)
+
+    features = indexer.reconstruct(11)
+    assert features is not None
+    np.testing.assert_array_equal(features, vectors[1:2])
+    assert indexer.reconstruct(13) is None
+
+
+def test_reconstruct_ivf_index(test_directory: str) -> None:
+    """
+    Test that the features are reconstructed from an inverted file index.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    index_path = os.path.join(test_directory, "storage", "index")
+    IndexConfig(type="ivf_flat", nlist=2, train_size=10).write(f"{index_path}.json")
+    vectors = np.random.rand(20, 4).astype("float32")
+
+    indexer = Indexer(test_directory, "storage", "index", 4)
+    indexer.add(0, vectors)
+    assert indexer.trained
+
+    # Built once trained, the searches must not update the index
+    ivf = factory.get_ivf(indexer.cpu_index)
+    assert ivf is not None and not ivf.direct_map.no()
+
+    features = indexer.reconstruct(5)
+    assert features is not None
+    np.testing.assert_array_equal(features, vectors[5:6])
+
+    indexer.remove(5)
+    assert indexer.reconstruct(5) is None
+    assert indexer.size == 19
+
+
+@pytest.mark.parametrize("flush_every", [1, 3])
+def test_interleaved_writers(test_directory: str, flush_every: int) -> None:
+    """
+    Test that an indexer reloads the index saved by another one before
+    writing, so that the mutations it had not replayed yet are not lost.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+        flush_every (int): The number of mutations between two saves.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    vectors = np.random.rand(5, 4).astype("float32")
+
+    options = IndexerOptions(flush_every=flush_every)
+    first = Indexer(test_directory, "storage", "index", 4, options=options)
+    second = Indexer(test_directory, "storage", "index", 4, options=options)
+
+    first.add(0, vectors[0:1])
+    second.add(1, vectors[1:2])
+    # Replays the second mutation and saves the index, truncating the log
+    first.add(2, vectors[2:3])
+
+    second.add(3, vectors[3:4])
+    second.add(4, vectors[4:5])
+    second.flush()
+
+    reloaded = Indexer(test_directory, "storage", "index", 4)
+    assert sorted(get_ids(reloaded.index).tolist()) == [0, 1, 2, 3, 4]
+
+    first.remove(1)
+    second.remove(2)
+    second.flush()
+
+    reloaded.refresh()
+    assert reloaded.tombstones.tolist() == [1, 2]
+
+
+def test_mmap_index(test_directory: str) -> None:
+    """
+    Test that a memory-mapped index is searched and reloaded once saved.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    index_path = os.path.join(test_directory, "storage", "index")
+    IndexConfig(type="ivf_flat", nlist=2, train_size=10).write(f"{index_path}.json")
+    vectors = np.random.rand(20, 4).astype("float32")
+
+    writer = Indexer(test_directory, "storage", "index", 4)
+    writer.add(0, vectors)
+
+    reader = Indexer(
+        test_directory,
+        "storage",
+        "index",
+        4,
+        options=IndexerOptions(mmap=True),
+    )
+    assert reader.read_only
+    assert reader.search(vectors[3:4], 1)[0] == [3]
+
+    with pytest.raises(PermissionError):
+        reader.add(20, vectors[:1])
+
+    writer.remove(3)
+    assert reader.is_stale()
+
+    reader.refresh()
+    assert reader.size == 19
+
+
+@pytest.mark.parametrize("index_type", ["sq8", "pq"])
+def test_refine_compressed_index(test_directory: str, index_type: str) -> None:
+    """
+    Test that a compressed index re-ranks its candidates with the exact vectors.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+        index_type (str): The type of the compressed index.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    index_path = os.path.join(test_directory, "storage", "index")
+    config = IndexConfig(
+        type=index_type,
+        pq_m=2,
+        pq_bits=4,
+        train_size=300,
+        refine=4,
+    )
+    config.write(f"{index_path}.json")
+    vectors = np.random.rand(300, 4).astype("float32")
+
+    indexer = Indexer(test_directory, "storage", "index", 4)
+    indexer.add(0, vectors)
+    assert indexer.trained
+
+    labels, distances = indexer.search(vectors[7:8], 1)
+    assert labels == [7]
+    assert distances == [0.0]
+
+    features = indexer.reconstruct(7)
+    assert features is not None
+    np.testing.assert_array_equal(features, vectors[7:8])
+
+    reloaded = Indexer(test_directory, "storage", "index", 4)
+    assert reloaded.trained
+    assert reloaded.search(vectors[7:8], 1)[0] == [7]
+
+
+def test_refine_vectors_replay(test_directory: str) -> None:
+    """
+    Test that the exact vectors are written at the rows of their IDs, also when
+    the IDs are not contiguous and the log is replayed by another indexer.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    index_path = os.path.join(test_directory, "storage", "index")
+    IndexConfig(type="fp16", refine=4).write(f"{index_path}.json")
+    vectors = np.random.rand(8, 4).astype("float32")
+
+    options = IndexerOptions(flush_every=100)
+    indexer = Indexer(test_directory, "storage", "index", 4, options=options)
+    indexer.add(10, vectors[:4])
+    indexer.add(20, vectors[4:])
+
+    # The log is not flushed yet, the new indexer replays all of it
+    replayed = Indexer(test_directory, "storage", "index", 4, options=options)
+    assert replayed.index.ntotal == 8
+
+    ids = np.array([10, 11, 12, 13, 20, 21, 22, 23])
+    assert os.path.getsize(f"{index_path}.vectors") == 24 * 4 * 4
+    np.testing.assert_array_equal(replayed.vectors.read(ids), vectors)
+    assert np.isnan(replayed.vectors.read(np.array([24, -1]))).all()
+
+    features = replayed.reconstruct(21)
+    assert features is not None
+    np.testing.assert_array_equal(features, vectors[5:6])
+
+
+@pytest.mark.parametrize("refine", [0, 4])
+def test_inner_product_index(test_directory: str, refine: int) -> None:
+    """
+    Test that an inner product index returns the most similar vectors first.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+        refine (int): The re-ranking factor of the index.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    index_path = os.path.join(test_directory, "storage", "index")
+    IndexConfig(metric="cosine", refine=refine).write(f"{index_path}.json")
+    vectors = np.random.rand(50, 4).astype("float32")
+
+    indexer = Indexer(test_directory, "storage", "index", 4)
+    indexer.add(0, vectors)
+
+    labels, scores = indexer.search(vectors[7:8] * 3, 5)
+    assert labels[0] == 7
+    assert scores[0] == pytest.approx(1.0, abs=1e-5)
+    assert scores == sorted(scores, reverse=True)
+
+
+@pytest.mark.parametrize("index_type", ["flat", "pq"])
+def test_remove_batch(test_directory: str, index_type: str) -> None:
+    """
+    Test that the removed images are skipped by the searches until the index is
+    compacted, also after a reload.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+        index_type (str): The type of the index, PQ ones do not support selectors.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    index_path = os.path.join(test_directory, "storage", "index")
+    IndexConfig(type=index_type, pq_m=2, pq_bits=4, train_size=100).write(
+        f"{index_path}.json"
+    )
+    vectors = np.random.rand(100, 4).astype("float32")
+
+    indexer = Indexer(
+        test_directory,
+        "storage",
+        "index",
+        4,
+        options=IndexerOptions(compact_ratio=0.5),
+    )
+    indexer.add(0, vectors)
+    indexer.remove_batch(list(range(0, 40)))
+
+    labels, _ = indexer.search(vectors[:1], 100)
+    assert sorted(labels) == list(range(40, 100))
+    assert indexer.size == 60
+    assert indexer.index.ntotal == 100
+
+    reloaded = Indexer(test_directory, "storage", "index", 4)
+    assert reloaded.reconstruct(3) is None
+    assert reloaded.search(vectors[:1], 1)[0][0] >= 40
+
+    assert not indexer.maintain()
+    indexer.remove_batch(list(range(40, 50)))
+    assert indexer.maintain()
+    assert indexer.index.ntotal == 50
+    assert indexer.tombstones.shape[0] == 0
+
+    reloaded.refresh()
+    assert reloaded.index.ntotal == 50
+    assert sorted(reloaded.search(vectors[:1], 100)[0]) == list(range(50, 100))
+
+
+def test_concurrent_searches(test_directory: str) -> None:
+    """
+    Test that the searches run along with each other and with the mutations.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    vectors = np.random.rand(400, 4).astype("float32")
+
+    indexer = Indexer(test_directory, "storage", "index", 4)
+    indexer.add(0, vectors[:200])
+
+    def search(position: int) -> List[int]:
+        if position % 10 == 0:
+            indexer.add(200 + position, vectors[200 + position : 210 + position])
+        return indexer.search(vectors[position : position + 1], 1)[0]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        labels = list(executor.map(search, range(200)))
+
+    assert labels == [[position] for position in range(200)]
+    assert indexer.index.ntotal == 400
+
+
+def test_remove_without_selectors(
+    test_directory: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    Test that the removed images are filtered out of the results when the FAISS
+    build does not support selectors.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+        monkeypatch (pytest.MonkeyPatch): The fixture disabling the selectors.
+    """
+
+    monkeypatch.setattr(factory, "SELECTORS", False)
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    vectors = np.random.rand(20, 4).astype("float32")
+
+    indexer = Indexer(test_directory, "storage", "index", 4)
+    indexer.add(0, vectors)
+    indexer.remove_batch(list(range(0, 20, 2)))
+
+    assert indexer.selector is None
+    labels, _ = indexer.search(vectors[:1], 20)
+    assert sorted(labels) == list(range(1, 20, 2))
+    assert indexer.search(vectors[4:5], 1)[0] != [4]
+
+
+def test_compact_hnsw_index(test_directory: str) -> None:
+    """
+    Test that an HNSW index, which can not remove vectors, is compacted by
+    rebuilding its graph without the removed images.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    index_path = os.path.join(test_directory, "storage", "index")
+    IndexConfig(type="hnsw").write(f"{index_path}.json")
+    vectors = np.random.rand(50, 4).astype("float32")
+
+    indexer = Indexer(
+        test_directory,
+        "storage",
+        "index",
+        4,
+        options=IndexerOptions(compact_ratio=0.2),
+    )
+    indexer.add(0, vectors)
+    indexer.remove_batch(list(range(0, 20)))
+
+    assert indexer.maintain()
+    assert indexer.config.type == "hnsw"
+    assert indexer.index.ntotal == 30
+    assert indexer.tombstones.shape[0] == 0
+    assert sorted(indexer.search(vectors[:1], 50)[0]) == list(range(20, 50))
+
+    reloaded = Indexer(test_directory, "storage", "index", 4)
+    assert reloaded.index.ntotal == 30
+    assert reloaded.search(vectors[25:26], 1)[0] == [25]
+
+
+@pytest.mark.parametrize(
+    "index_type, selectors",
+    [("flat", True), ("pq", True), ("flat", False)],
+)
+def test_filtered_search(
+    test_directory: str,
+    monkeypatch: pytest.MonkeyPatch,
+    index_type: str,
+    selectors: bool,
+) -> None:
+    """
+    Test that the searches only return the images whose attributes match the
+    filter, the removed ones excluded.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+        monkeypatch (pytest.MonkeyPatch): The fixture disabling the selectors.
+        index_type (str): The type of the index, PQ ones do not support selectors.
+        selectors (bool): Whether the FAISS build supports selectors.
+    """
+
+    monkeypatch.setattr(factory, "SELECTORS", selectors)
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    index_path = os.path.join(test_directory, "storage", "index")
+    IndexConfig(type=index_type, pq_m=2, pq_bits=4, train_size=100).write(
+        f"{index_path}.json"
+    )
+    vectors = np.random.rand(100, 4).astype("float32")
+    metadata: List[Metadata] = [
+        {"project": i % 3, "slide": f"slide{i // 10}"} if i < 90 else {}
+        for i in range(100)
+    ]
+
+    indexer = Indexer(test_directory, "storage", "index", 4)
+    indexer.add(0, vectors, metadata)
+    indexer.remove(0)
+
+    conditions = parse_filter("project=0|1, slide!=slide1")
+    expected = [
+        i
+        for i in range(1, 90)
+        if metadata[i]["project"] in (0, 1) and metadata[i]["slide"] != "slide1"
+    ]
+
+    labels, _ = indexer.search_batch(vectors[:1], 100, conditions)[0]
+    assert sorted(labels) == expected
+
+    reloaded = Indexer(test_directory, "storage", "index", 4)
+    labels, _ = reloaded.search_batch(vectors[:1], 5, conditions)[0]
+    assert len(labels) == 5
+    assert set(labels) <= set(expected)
+
+    labels, _ = indexer.search_batch(vectors[:1], 10, parse_filter("project=7"))[0]
+    assert labels == []
+
+
+def test_metadata_store(test_directory: str) -> None:
+    """
+    Test that the attributes are stored at the rows of their IDs, also when the
+    first IDs have no attributes and the IDs are not contiguous.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    store = MetadataStore(os.path.join(test_directory, "metadata"))
+    store.write(np.array([5]), [{"project": "X"}])
+    store.write(np.array([9, 10, 20]), [{"project": "Y"}, {}, {"project": "X"}])
+    store.write(np.array([7, 8]), [{"slide": "A"}, {"project": "Y", "slide": "B"}])
+
+    assert store.select(parse_filter("project=X")).tolist() == [5, 20]
+    assert store.select(parse_filter("project=Y")).tolist() == [8, 9]
+    assert store.select(parse_filter("project!=Y")).tolist() == [5, 20]
+    assert store.select(parse_filter("project=Y,slide=B")).tolist() == [8]
+    assert store.select(parse_filter("slide=A|B")).tolist() == [7, 8]
+
+    reopened = MetadataStore(os.path.join(test_directory, "metadata"))
+    assert reopened.select(parse_filter("project=X")).tolist() == [5, 20]
+
+
+def test_filtered_search_after_unfiltered_images(test_directory: str) -> None:
+    """
+    Test that the filter finds an image whose ID is not the first one with
+    attributes.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    vectors = np.random.rand(6, 4).astype("float32")
+
+    indexer = Indexer(test_directory, "storage", "index", 4)
+    indexer.add(0, vectors[:5])
+    indexer.add(5, vectors[5:], [{"project": "X"}])
+
+    results = indexer.search_batch(vectors[:1], 6, parse_filter("project=X"))
+    assert results[0][0] == [5]
+
+
+def test_parse_filter() -> None:
+    """Test the parsing of the filter expressions."""
+
+    assert parse_filter("project=12|13,magnification!=40") == [
+        Condition("project", ("12", "13")),
+        Condition("magnification", ("40",), negated=True),
+    ]
+
+    with pytest.raises(ValueError):
+        parse_filter("project")
+
+    with pytest.raises(ValueError):
+        parse_filter("project=1,,slide=2")
@@ -0,0 +1,129 @@
+"""Index tests"""
+
+from fastapi.testclient import TestClient
+
+
+def test_create_index(client: TestClient) -> None:
+    """
+    Test 'POST /api/storages/{name}/indexes' endpoint with a trained index type.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storage_name = "test_storage"
+    index_name = "test_index"
+
+    response = client.post("/api/storages", json={"name": storage_name})
+    assert response.status_code == 200
+
+    response = client.post(
+        f"/api/storages/{storage_name}/indexes",
+        json={"name": index_name, "type": "ivf_flat", "nlist": 1, "train_size": 2},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"message": f"Created index with name: {index_name}"}
+
+    response = client.get(f"/api/storages/{storage_name}/indexes/{index_name}")
+    assert response.status_code == 200
+    assert response.json()["type"] == "ivf_flat"
+    assert response.json()["trained"] is False
+
+    with open("tests/data/image.png", "rb") as image:
+        content = image.read()
+
+    response = client.post(
+        "/api/images/batch",
+        files=[("images", (f"image{i}.png", content)) for i in range(3)],
+        params={"storage": storage_name, "index": index_name},
+    )
+    assert response.status_code == 200
+
+    response = client.get(f"/api/storages/{storage_name}/indexes/{index_name}")
+    assert response.status_code == 200
+    assert response.json()["size"] == 3
+    assert response.json()["trained"] is True
+
+    response = client.post(
+        "/api/search",
+        files={"image": content},
+        params={"nrt_neigh": 2, "storage": storage_name, "index": index_name},
+    )
+    assert response.status_code == 200
+    assert len(response.json()["similarities"]) == 2
+
+
+def test_create_existing_index(client: TestClient) -> None:
+    """
+    Test 'POST /api/storages/{name}/indexes' endpoint for an existing index.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storage_name = "test_storage"
+    index_name = "test_index"
+
+    response = client.post("/api/storages", json={"name": storage_name})
+    assert response.status_code == 200
+
+    response = client.post(
+        f"/api/storages/{storage_name}/indexes",
+        json={"name": index_name, "type": "hnsw"},
+    )
+    assert response.status_code == 200
+
+    response = client.post(
+        f"/api/storages/{storage_name}/indexes",
+        json={"name": index_name},
+    )
+    assert response.status_code == 409
+    assert response.json() == {
+        "detail": f"Index with name '{index_name}' already exists."
+    }
+
+
+def test_create_invalid_index(client: TestClient) -> None:
+    """
+    Test 'POST /api/storages/{name}/indexes' endpoint with invalid parameters.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storage_name = "test_storage"
+
+    response = client.post("/api/storages", json={"name": storage_name})
+    assert response.status_code == 200
+
+    response = client.post(
+        f"/api/storages/{storage_name}/indexes",
+        json={"name": "test_index", "type": "ivf_pq", "pq_m": 7},
+    )
+    assert response.status_code == 400
+
+    for index_name in ["../test_index", "test/index", "..", ""]:
+        response = client.post(
+            f"/api/storages/{storage_name}/indexes",
+            json={"name": index_name},
+        )
+        assert response.status_code == 422
+
+
+def test_get_index_not_found(client: TestClient) -> None:
+    """
+    Test 'GET /api/storages/{name}/indexes/{index}' for a non-existent index.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storage_name = "test_storage"
+    index_name = "non_existent_index"
+
+    response = client.post("/api/storages", json={"name": storage_name})
+    assert response.status_code == 200
+
+    response = client.get(f"/api/storages/{storage_name}/indexes/{index_name}")
+    assert response.status_code == 404
+    assert response.json() == {"detail": f"Index with name '{index_name}' not found."}
@@ -0,0 +1,85 @@
+"""Shared lock tests"""
+
+import threading
+import time
+
+from cbir.retrieval.locks import SharedLock
+
+
+def test_shared_readers() -> None:
+    """Test that several readers hold the lock at once and exclude a writer."""
+
+    lock = SharedLock()
+    inside = threading.Barrier(2, timeout=5)
+    written = threading.Event()
+
+    def read() -> None:
+        with lock.shared():
+            # Both readers must be inside to pass the barrier
+            inside.wait()
+            assert not written.is_set()
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    with lock:
+        for reader in readers:
+            reader.start()
+
+    def write() -> None:
+        with lock:
+            written.set()
+
+    for reader in readers:
+        reader.join()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    writer.join()
+    assert written.is_set()
+
+
+def test_writer_first() -> None:
+    """Test that a waiting writer goes before the new readers."""
+
+    lock = SharedLock()
+    order = []
+
+    def write() -> None:
+        with lock:
+            order.append("write")
+
+    def read() -> None:
+        with lock.shared():
+            order.append("read")
+
+    with lock.shared():
+        writer = threading.Thread(target=write)
+        writer.start()
+        while not lock._writers:  # pylint: disable=protected-access
+            time.sleep(0.01)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        time.sleep(0.1)
+        assert not order
+
+    writer.join()
+    reader.join()
+    assert order == ["write", "read"]
+
+
+def test_reentrant() -> None:
+    """Test that the writer can take the lock again, also in shared mode."""
+
+    lock = SharedLock()
+
+    with lock:
+        with lock:
+            with lock.shared():
+                pass
+
+    with lock.shared():
+        with lock.shared():
+            pass
+
+    with lock:
+        pass
@@ -0,0 +1,63 @@
+"""Preprocessing tests"""
+
+import torch
+
+from cbir.models.decoder import DecoderPool
+from cbir.models.preprocessing import (
+    IMAGENET_MEAN,
+    IMAGENET_STD,
+    PreprocessingConfig,
+    Preprocessor,
+)
+
+
+def test_decode() -> None:
+    """Test that an image is decoded as uint8 at the input size."""
+
+    preprocessor = Preprocessor(PreprocessingConfig(size=(224, 112)))
+
+    with open("tests/data/image.png", "rb") as file:
+        inputs = preprocessor.decode(file.read())
+
+    assert inputs.dtype == torch.uint8
+    assert inputs.shape == (3, 224, 112)
+
+
+def test_normalize() -> None:
+    """Test that the fused normalisation matches the reference one."""
+
+    preprocessor = Preprocessor()
+    inputs = torch.randint(0, 256, (2, 3, 8, 8), dtype=torch.uint8)
+
+    mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
+    expected = (inputs.float() / 255 - mean) / std
+
+    assert torch.allclose(preprocessor.normalize(inputs), expected, atol=1e-5)
+
+
+def test_normalize_dtype() -> None:
+    """Test that the images are normalised in the data type of the model."""
+
+    config = PreprocessingConfig(mean=(0.5,) * 3, std=(0.5,) * 3, dtype=torch.float16)
+    inputs = torch.full((1, 3, 4, 4), 255, dtype=torch.uint8)
+
+    outputs = Preprocessor(config).normalize(inputs)
+
+    assert outputs.dtype == torch.float16
+    assert torch.all(outputs == 1)
+
+
+def test_decoder_pool() -> None:
+    """Test that the images are decoded by worker processes."""
+
+    pool = DecoderPool(PreprocessingConfig(size=(32, 16)), workers=2)
+
+    with open("tests/data/image.png", "rb") as file:
+        decoded = pool.decode([file.read(), b"invalid"])
+    pool.close()
+
+    assert isinstance(decoded[0], torch.Tensor)
+    assert decoded[0].dtype == torch.uint8
+    assert decoded[0].shape == (3, 32, 16)
+    assert isinstance(decoded[1], Exception)
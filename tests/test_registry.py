@@ -0,0 +1,145 @@
+"""Indexer registry tests"""
+
+import os
+from functools import partial
+from typing import Any
+from unittest.mock import patch
+
+import faiss
+import numpy as np
+
+from cbir.retrieval.factory import train_index
+from cbir.retrieval.indexer import Indexer, IndexerOptions
+from cbir.retrieval.registry import IndexerRegistry
+
+
+def test_get_resident_indexer(test_directory: str) -> None:
+    """
+    Test that the same indexer is returned while its index is unchanged.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    registry = IndexerRegistry(partial(Indexer, test_directory, n_features=4))
+
+    indexer = registry.get("storage", "index")
+    indexer.add(0, np.random.rand(2, 4).astype("float32"))
+
+    assert registry.get("storage", "index") is indexer
+    assert len(registry) == 1
+
+
+def test_get_modified_indexer(test_directory: str) -> None:
+    """
+    Test that an indexer is refreshed when its index file changes on disk.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    registry = IndexerRegistry(partial(Indexer, test_directory, n_features=4))
+    other = IndexerRegistry(partial(Indexer, test_directory, n_features=4))
+
+    indexer = registry.get("storage", "index")
+    indexer.add(0, np.random.rand(2, 4).astype("float32"))
+
+    other_indexer = other.get("storage", "index")
+    other_indexer.add(2, np.random.rand(3, 4).astype("float32"))
+    os.utime(indexer.index_path, ns=(0, 0))
+
+    assert registry.get("storage", "index") is indexer
+    assert indexer.index.ntotal == 5
+
+
+def test_evict_least_recently_used(test_directory: str) -> None:
+    """
+    Test that the least recently used indexers are evicted.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    registry = IndexerRegistry(
+        partial(Indexer, test_directory, n_features=4),
+        max_indexes=2,
+    )
+
+    first = registry.get("storage", "first")
+    registry.get("storage", "second")
+    registry.get("storage", "first")
+    registry.get("storage", "third")
+
+    assert len(registry) == 2
+    assert registry.get("storage", "first") is first
+
+
+def test_flush_pending_mutations(test_directory: str) -> None:
+    """
+    Test that the mutations are logged and persisted in batches.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    options = IndexerOptions(flush_every=10)
+    registry = IndexerRegistry(
+        partial(Indexer, test_directory, n_features=4, options=options)
+    )
+
+    indexer = registry.get("storage", "index")
+    indexer.add(0, np.random.rand(2, 4).astype("float32"))
+    indexer.add(2, np.random.rand(2, 4).astype("float32"))
+    indexer.remove(0)
+
+    assert not os.path.isfile(indexer.index_path)
+
+    # Replay the log as if the process had crashed
+    recovered = Indexer(test_directory, "storage", "index", 4, options=options)
+    assert recovered.size == 3
+
+    registry.flush()
+    assert os.path.isfile(indexer.index_path)
+    assert indexer.log.size() == 0
+
+
+def test_promote_grown_index(test_directory: str) -> None:
+    """
+    Test that a grown flat index is promoted without losing concurrent mutations.
+
+    Args:
+        test_directory (str): The path to the temporary directory.
+    """
+
+    os.mkdir(os.path.join(test_directory, "storage"))
+    options = IndexerOptions(promote_size=100)
+    registry = IndexerRegistry(
+        partial(Indexer, test_directory, n_features=4, options=options)
+    )
+
+    indexer = registry.get("storage", "index")
+    indexer.add(0, np.random.rand(50, 4).astype("float32"))
+    assert registry.maintain() == 0
+
+    indexer.add(50, np.random.rand(150, 4).astype("float32"))
+
+    def train_concurrently(*args: Any) -> faiss.Index:
+        # Mutate the current index while the new one is being built
+        indexer.add(200, np.random.rand(10, 4).astype("float32"))
+        indexer.remove(0)
+        return train_index(*args)
+
+    with patch("cbir.retrieval.indexer.train_index", train_concurrently):
+        assert registry.maintain() == 1
+
+    assert indexer.config.type == "ivf_flat"
+    assert indexer.trained
+    assert indexer.index.ntotal == 209
+
+    reloaded = Indexer(test_directory, "storage", "index", 4, options=options)
+    assert reloaded.config == indexer.config
+    assert reloaded.index.ntotal == 209
@@ -1,5 +1,9 @@
 """API tests"""
 
+import io
+import zipfile
+from unittest.mock import ANY
+
 from fastapi.testclient import TestClient
 
 
@@ -145,3 +149,107 @@ def test_remove_image(client: TestClient) -> None:
         "storage": storage_name,
         "index": index_name,
     }
+
+
+def test_index_images(client: TestClient) -> None:
+    """
+    Test 'POST /api/images/batch' endpoint with images and an archive.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storage_name = "test_storage"
+    index_name = "test_index"
+
+    response = client.post("/api/storages", json={"name": storage_name})
+    assert response.status_code == 200
+
+    with open("tests/data/image.png", "rb") as image:
+        content = image.read()
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as file:
+        file.writestr("tiles/tile.png", content)
+        file.writestr("tiles/notes.txt", "not an image")
+
+    response = client.post(
+        "/api/images/batch",
+        files=[
+            ("images", ("first.png", content)),
+            ("images", ("second.png", content)),
+            ("images", ("first.png", content)),
+            ("images", ("invalid.png", b"not an image")),
+            ("images", ("tiles.zip", archive.getvalue())),
+        ],
+        params={"storage": storage_name, "index": index_name},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "images": [
+            {"filename": "first.png", "id": 0},
+            {"filename": "second.png", "id": 1},
+            {"filename": "first.png", "error": "Image filename already exist!"},
+            {"filename": "invalid.png", "error": ANY},
+            {"filename": "tiles/tile.png", "id": 2},
+        ],
+        "storage": storage_name,
+        "index": index_name,
+    }
+
+
+def test_remove_images(client: TestClient) -> None:
+    """
+    Test 'DELETE /api/images' endpoint removing several images at once.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storage_name = "test_storage"
+    index_name = "test_index"
+
+    response = client.post("/api/storages", json={"name": storage_name})
+    assert response.status_code == 200
+
+    with open("tests/data/image.png", "rb") as image:
+        content = image.read()
+
+    response = client.post(
+        "/api/images/batch",
+        files=[
+            ("images", ("first.png", content)),
+            ("images", ("second.png", content)),
+            ("images", ("third.png", content)),
+        ],
+        params={"storage": storage_name, "index": index_name},
+    )
+    assert response.status_code == 200
+
+    params = {"storage": storage_name, "index": index_name}
+    response = client.request(
+        "DELETE",
+        "/api/images",
+        json={"filenames": ["first.png", "third.png", "missing.png"]},
+        params=params,
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "images": [
+            {"filename": "first.png", "id": 0},
+            {"filename": "third.png", "id": 2},
+            {"filename": "missing.png", "error": "missing.png not found"},
+        ],
+        "storage": storage_name,
+        "index": index_name,
+    }
+
+    response = client.post(
+        "/api/search",
+        files={"image": ("image.png", content)},
+        params={"nrt_neigh": "3", **params},
+    )
+    assert response.status_code == 200
+    assert [name for name, _ in response.json()["similarities"]] == ["second.png"]
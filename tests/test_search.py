@@ -1,5 +1,10 @@
 """Search tests"""
 
+import base64
+import json
+
+import numpy as np
+from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
 
@@ -42,6 +47,7 @@ def test_search_one_image(client: TestClient) -> None:
     assert "similarities" in data
     assert isinstance(data["similarities"], list)
     assert len(data["similarities"]) == 1
+    assert data["metric"] == "l2"
 
 
 def test_search_one_image_with_storages(client: TestClient) -> None:
@@ -84,6 +90,7 @@ def test_search_one_image_with_storages(client: TestClient) -> None:
     assert "similarities" in data
     assert isinstance(data["similarities"], list)
     assert len(data["similarities"]) == 1
+    assert data["metric"] == "l2"
 
 
 def test_search_images(client: TestClient) -> None:
@@ -113,3 +120,287 @@ def test_search_images(client: TestClient) -> None:
     assert response.status_code == 200
     assert "similarities" in data
     assert isinstance(data["similarities"], list)
+
+
+def test_search_images_with_storages(client: TestClient) -> None:
+    """
+    Test 'POST /api/search' merges the neighbours of several storages.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storages = ["test_storage1", "test_storage2"]
+    index_name = "test_index"
+
+    for storage in storages:
+        response = client.post("/api/storages", json={"name": storage})
+        assert response.status_code == 200
+
+        with open("tests/data/image.png", "rb") as file:
+            response = client.post(
+                "/api/images",
+                files={"image": (f"{storage}.png", file)},
+                params={"storage": storage, "index": index_name},
+            )
+        assert response.status_code == 200
+
+    with open("tests/data/image.png", "rb") as image:
+        response = client.post(
+            "/api/search",
+            files={"image": image},
+            params={
+                "nrt_neigh": "3",
+                "storage": storages,
+                "index": index_name,
+            },
+        )
+
+    data = response.json()
+
+    assert response.status_code == 200
+    assert sorted(name for name, _ in data["similarities"]) == [
+        "test_storage1.png",
+        "test_storage2.png",
+    ]
+
+
+def test_search_images_batch(client: TestClient) -> None:
+    """
+    Test 'POST /api/search/batch' streams the neighbours of each query image.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storage_name = "test_storage"
+    index_name = "test_index"
+
+    response = client.post("/api/storages", json={"name": storage_name})
+    assert response.status_code == 200
+
+    with open("tests/data/image.png", "rb") as file:
+        content = file.read()
+
+    response = client.post(
+        "/api/images/batch",
+        files=[("images", (f"image{i}.png", content)) for i in range(2)],
+        params={"storage": storage_name, "index": index_name},
+    )
+    assert response.status_code == 200
+
+    response = client.post(
+        "/api/search/batch",
+        files=[
+            ("images", ("query1.png", content)),
+            ("images", ("invalid.png", b"not an image")),
+            ("images", ("query2.png", content)),
+        ],
+        params={"nrt_neigh": "2", "storage": storage_name, "index": index_name},
+    )
+    assert response.status_code == 200
+
+    results = [json.loads(line) for line in response.iter_lines()]
+    assert [result["query"] for result in results] == [
+        "query1.png",
+        "invalid.png",
+        "query2.png",
+    ]
+    assert "error" in results[1]
+    for result in (results[0], results[2]):
+        assert result["metric"] == "l2"
+        assert sorted(name for name, _ in result["similarities"]) == [
+            "image0.png",
+            "image1.png",
+        ]
+
+
+def test_search_indexed_image(client: TestClient) -> None:
+    """
+    Test 'POST /api/search/images/{filename}' for an already indexed image.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storage_name = "test_storage"
+    index_name = "test_index"
+
+    response = client.post("/api/storages", json={"name": storage_name})
+    assert response.status_code == 200
+
+    with open("tests/data/image.png", "rb") as file:
+        response = client.post(
+            "/api/images",
+            files={"image": ("image.png", file)},
+            params={"storage": storage_name, "index": index_name},
+        )
+    assert response.status_code == 200
+
+    params = {"nrt_neigh": "1", "storage": storage_name, "index": index_name}
+
+    response = client.post("/api/search/images/image.png", params=params)
+    assert response.status_code == 200
+    assert response.json()["query"] == "image.png"
+    assert response.json()["similarities"][0][0] == "image.png"
+
+    response = client.post("/api/search/images/missing.png", params=params)
+    assert response.status_code == 404
+
+
+def test_search_vector(app: FastAPI, client: TestClient) -> None:
+    """
+    Test 'POST /api/search/vector' with a list of floats and a base64 string.
+
+    Args:
+        app (FastAPI): The FastAPI application instance to be tested.
+        client: A test client instance used to send requests to the application.
+    """
+
+    storage_name = "test_storage"
+    index_name = "test_index"
+
+    response = client.post("/api/storages", json={"name": storage_name})
+    assert response.status_code == 200
+
+    with open("tests/data/image.png", "rb") as file:
+        response = client.post(
+            "/api/images",
+            files={"image": ("image.png", file)},
+            params={"storage": storage_name, "index": index_name},
+        )
+    assert response.status_code == 200
+
+    params = {"nrt_neigh": "1", "storage": storage_name, "index": index_name}
+    vector = np.zeros(app.state.model.n_features, dtype="float32")
+
+    response = client.post(
+        "/api/search/vector",
+        json={"vector": vector.tolist()},
+        params=params,
+    )
+    assert response.status_code == 200
+    assert response.json()["similarities"][0][0] == "image.png"
+
+    response = client.post(
+        "/api/search/vector",
+        json={"vector": base64.b64encode(vector.tobytes()).decode()},
+        params=params,
+    )
+    assert response.status_code == 200
+    assert response.json()["similarities"][0][0] == "image.png"
+
+    response = client.post(
+        "/api/search/vector",
+        json={"vector": [0.0, 1.0]},
+        params=params,
+    )
+    assert response.status_code == 400
+
+
+def test_search_cosine_indexes(client: TestClient) -> None:
+    """
+    Test 'POST /api/search' returns similarities, the highest first, for the
+    cosine indexes and the searches reject the storages with different metrics.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storages = ["test_storage1", "test_storage2"]
+    index_name = "test_index"
+
+    for storage in storages:
+        response = client.post("/api/storages", json={"name": storage})
+        assert response.status_code == 200
+
+        response = client.post(
+            f"/api/storages/{storage}/indexes",
+            json={"name": index_name, "metric": "cosine"},
+        )
+        assert response.status_code == 200
+
+        for filename in ("image.png", "other.png"):
+            with open("tests/data/image.png", "rb") as file:
+                response = client.post(
+                    "/api/images",
+                    files={"image": (f"{storage}-{filename}", file)},
+                    params={"storage": storage, "index": index_name},
+                )
+            assert response.status_code == 200
+
+    params = {"nrt_neigh": "4", "storage": storages, "index": index_name}
+    with open("tests/data/image.png", "rb") as image:
+        response = client.post("/api/search", files={"image": image}, params=params)
+
+    assert response.status_code == 200
+    assert response.json()["metric"] == "cosine"
+    scores = [score for _, score in response.json()["similarities"]]
+    assert len(scores) == 4
+    assert scores == sorted(scores, reverse=True)
+    assert np.allclose(scores, 1.0, atol=1e-4)
+
+    response = client.post("/api/storages", json={"name": "test_storage3"})
+    assert response.status_code == 200
+
+    params["storage"] = [*storages, "test_storage3"]
+    with open("tests/data/image.png", "rb") as image:
+        response = client.post("/api/search", files={"image": image}, params=params)
+
+    assert response.status_code == 400
+
+    # Rejected before the stream of the batch search starts
+    with open("tests/data/image.png", "rb") as image:
+        response = client.post(
+            "/api/search/batch",
+            files=[("images", ("query.png", image))],
+            params=params,
+        )
+
+    assert response.status_code == 400
+
+
+def test_search_with_filter(client: TestClient) -> None:
+    """
+    Test 'POST /api/search' only returns the images matching the filter on their
+    attributes and rejects the malformed filters.
+
+    Args:
+        client: A test client instance used to send requests to the application.
+    """
+
+    storage_name = "test_storage"
+    index_name = "test_index"
+
+    response = client.post("/api/storages", json={"name": storage_name})
+    assert response.status_code == 200
+
+    for filename, project in (("image1.png", 1), ("image2.png", 2)):
+        with open("tests/data/image.png", "rb") as file:
+            response = client.post(
+                "/api/images",
+                files={"image": (filename, file)},
+                data={"metadata": json.dumps({"project": project})},
+                params={"storage": storage_name, "index": index_name},
+            )
+        assert response.status_code == 200
+
+    params = {"nrt_neigh": "2", "storage": storage_name, "index": index_name}
+    with open("tests/data/image.png", "rb") as image:
+        response = client.post(
+            "/api/search",
+            files={"image": image},
+            params={**params, "filter": "project=2"},
+        )
+
+    assert response.status_code == 200
+    assert [name for name, _ in response.json()["similarities"]] == ["image2.png"]
+
+    with open("tests/data/image.png", "rb") as image:
+        response = client.post(
+            "/api/search",
+            files={"image": image},
+            params={**params, "filter": "project"},
+        )
+
+    assert response.status_code == 400
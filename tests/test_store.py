@@ -0,0 +1,128 @@
+"""Store tests"""
+
+import asyncio
+
+from redis import Redis  # type: ignore
+from redis import asyncio as aioredis  # type: ignore
+
+from cbir.retrieval.store import AsyncStore, Store
+
+
+def test_get_many(redis_client: Redis) -> None:
+    """
+    Test that several keys are retrieved at once, in order.
+
+    Args:
+        redis_client (Redis): A Redis client instance.
+    """
+
+    store = Store("storage", redis_client)
+    store.set_many({"image.png": "0", "0": "image.png"})
+
+    assert store.get_many(["0", "1", "image.png"]) == ["image.png", None, "0"]
+    assert store.get_many([]) == []
+
+
+def test_pipeline(redis_client: Redis) -> None:
+    """
+    Test that the commands of a pipeline are sent when the block exits.
+
+    Args:
+        redis_client (Redis): A Redis client instance.
+    """
+
+    store = Store("storage", redis_client)
+    store.set("image.png", "0")
+
+    with store.pipeline() as pipeline:
+        pipeline.remove("image.png")
+        pipeline.set("last_id", "1")
+
+        assert store.contains("image.png")
+
+    assert not store.contains("image.png")
+    assert store.last() == 1
+
+
+def test_reserve(redis_client: Redis) -> None:
+    """
+    Test that the reserved ranges of IDs never overlap.
+
+    Args:
+        redis_client (Redis): A Redis client instance.
+    """
+
+    store = Store("storage", redis_client)
+    other = Store("storage", redis_client)
+
+    assert store.reserve(1) == 0
+    assert other.reserve(3) == 1
+    assert store.reserve(2) == 4
+    assert store.last() == 6
+
+
+def test_async_store() -> None:
+    """Test that the asynchronous store shares the keys of the store."""
+
+    async def run() -> None:
+        redis = aioredis.Redis(host="localhost", port=6379, db=1)
+        store = AsyncStore("storage", redis)
+
+        await store.set_many({"image.png": "0", "0": "image.png"})
+        assert await store.get_many(["0", "1"]) == ["image.png", None]
+        assert await store.reserve(2) == 0
+        assert await store.last() == 2
+
+        await store.remove("image.png")
+        assert not await store.contains("image.png")
+
+        await redis.close()
+
+    asyncio.run(run())
+
+
+def test_claim(redis_client: Redis) -> None:
+    """
+    Test that only the keys which do not exist yet are claimed.
+
+    Args:
+        redis_client (Redis): A Redis client instance.
+    """
+
+    store = Store("storage", redis_client)
+    store.set("taken.png", "0")
+
+    assert store.claim(["taken.png", "free.png", "free.png"], ["1", "2", "3"]) == [
+        False,
+        True,
+        False,
+    ]
+    assert store.get_many(["taken.png", "free.png"]) == ["0", "2"]
+    assert store.claim([], []) == []
+
+
+def test_async_claim() -> None:
+    """Test that the asynchronous store claims the keys and pipelines commands."""
+
+    async def run() -> None:
+        redis = aioredis.Redis(host="localhost", port=6379, db=1)
+        store = AsyncStore("storage", redis)
+        await store.set("taken.png", "0")
+
+        assert await store.claim(["taken.png", "free.png"], ["1", "2"]) == [
+            False,
+            True,
+        ]
+        assert await store.claim([], []) == []
+
+        async with store.pipeline() as pipeline:
+            await pipeline.remove("free.png")
+            await pipeline.set("2", "free.png")
+
+            assert await store.contains("free.png")
+
+        assert await store.get_many(["free.png", "2"]) == [None, "free.png"]
+
+        await redis.close()
+
+    asyncio.run(run())